@@ -0,0 +1,250 @@
+from __future__ import print_function
+"""Helpers shared by the benchmark runners: state isolation, peak RSS,
+subprocess counting and the JSON result/compare format."""
+
+import collections
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from pkgmgr import config, snapshot  # noqa: E402
+
+FORMAT_VERSION = 1
+_STATE_ATTRS = ("BASE_DIR", "DEFAULT_CONFIG_DIR", "DEFAULT_STATE_DIR", "DEFAULT_CACHE_DIR")
+
+
+def reset_peak_rss():
+    # Linux resets VmHWM to the current RSS when "5" is written to clear_refs
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except (IOError, OSError):
+        return False
+
+
+def peak_rss_kb(resettable):
+    if resettable:
+        try:
+            with open("/proc/self/status") as f:
+                for line in f:
+                    if line.startswith("VmHWM:"):
+                        return int(line.split()[1])
+        except (IOError, OSError, ValueError):
+            pass
+    # process-wide high-water mark; only an upper bound for the phase
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == "darwin" else peak
+
+
+@contextlib.contextmanager
+def quiet(verbose):
+    if verbose:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+@contextlib.contextmanager
+def isolated_state(base):
+    """Point every pkgmgr state/cache path at base; restores the old paths on exit."""
+    saved = dict((name, getattr(config, name)) for name in _STATE_ATTRS)
+    saved_snapshot = snapshot.STATE_DIR
+    config.BASE_DIR = base
+    config.DEFAULT_CONFIG_DIR = os.path.join(base, "config")
+    config.DEFAULT_STATE_DIR = os.path.join(base, "local", "state")
+    config.DEFAULT_CACHE_DIR = os.path.join(base, "cache")
+    snapshot.STATE_DIR = config.DEFAULT_STATE_DIR
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(config, name, value)
+        snapshot.STATE_DIR = saved_snapshot
+
+
+class SpawnCounter(object):
+    """
+    Count subprocesses by program name while active. subprocess.run,
+    check_output and call all construct subprocess.Popen, so swapping that
+    one name sees every spawn made through the subprocess module.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = collections.Counter()
+        self._saved = None
+
+    def __enter__(self):
+        counter = self
+        original = subprocess.Popen
+
+        class _CountingPopen(original):
+            def __init__(self, args, *rest, **kwargs):
+                counter._record(args)
+                super(_CountingPopen, self).__init__(args, *rest, **kwargs)
+
+        self._saved = original
+        subprocess.Popen = _CountingPopen
+        return self
+
+    def __exit__(self, *exc):
+        subprocess.Popen = self._saved
+        return False
+
+    def _record(self, args):
+        if isinstance(args, (list, tuple)):
+            program = str(args[0]) if args else ""
+        else:
+            program = str(args).split(" ", 1)[0]
+        with self.lock:
+            self.counts[os.path.basename(program)] += 1
+
+    def total(self):
+        return sum(self.counts.values())
+
+
+class Timer(object):
+    """Collects per-phase samples (wall time, work done, peak RSS, spawns)."""
+
+    def __init__(self, verbose=False, count_spawns=False):
+        self.verbose = verbose
+        self.count_spawns = count_spawns
+        self.samples = collections.OrderedDict()
+
+    def run(self, name, work, func, *args, **kwargs):
+        """
+        Time func(*args). work is the (files, bytes) the phase had to touch, or
+        a callable computing it from func's result.
+        """
+        resettable = reset_peak_rss()
+        spawns = SpawnCounter()
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(quiet(self.verbose))
+            if self.count_spawns:
+                stack.enter_context(spawns)
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            wall = time.perf_counter() - started
+        if callable(work):
+            work = work(result)
+        sample = {"wall": wall, "files": work[0], "bytes": work[1], "rss": peak_rss_kb(resettable)}
+        if self.count_spawns:
+            sample["spawns"] = dict(spawns.counts)
+        self.samples.setdefault(name, []).append(sample)
+        return result
+
+
+def phase_report(samples):
+    walls = [s["wall"] for s in samples]
+    wall = statistics.median(walls)
+    files = samples[-1]["files"]
+    size = samples[-1]["bytes"]
+    rate = max(wall, 1e-9)
+    report = {
+        "runs": len(samples),
+        "wall_s": round(wall, 6),
+        "wall_min_s": round(min(walls), 6),
+        "files": files,
+        "bytes": size,
+        "files_per_s": round(files / rate, 1),
+        "mb_per_s": round(size / rate / (1024.0 * 1024.0), 2),
+        "peak_rss_kb": max(s["rss"] for s in samples),
+    }
+    if "spawns" in samples[-1]:
+        report["spawns"] = samples[-1]["spawns"]
+        report["spawns_total"] = sum(samples[-1]["spawns"].values())
+    return report
+
+
+def git_commit():
+    try:
+        out = subprocess.check_output(
+            ["git", "-C", ROOT, "rev-parse", "HEAD"], stderr=subprocess.DEVNULL, universal_newlines=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.strip() or None
+
+
+def build_result(suite, params, timer):
+    return {
+        "version": FORMAT_VERSION,
+        "suite": suite,
+        "commit": git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "params": params,
+        "order": list(timer.samples),
+        "phases": dict((name, phase_report(samples)) for name, samples in timer.samples.items()),
+    }
+
+
+def format_report(result):
+    lines = ["suite=%s commit=%s %s" % (
+        result.get("suite", "-"),
+        (result.get("commit") or "-")[:12],
+        " ".join("%s=%s" % item for item in sorted(result.get("params", {}).items())),
+    )]
+    lines.append("%-34s %10s %12s %10s %12s %8s" % ("phase", "wall_s", "files/s", "MB/s", "peak_rss_kb", "spawns"))
+    for name in result.get("order") or sorted(result["phases"]):
+        phase = result["phases"][name]
+        lines.append("%-34s %10.3f %12.1f %10.2f %12d %8s" % (
+            name,
+            phase["wall_s"],
+            phase["files_per_s"],
+            phase["mb_per_s"],
+            phase["peak_rss_kb"],
+            phase.get("spawns_total", "-"),
+        ))
+    return "\n".join(lines)
+
+
+def compare(old, new):
+    """Side-by-side wall time of two result files; ratio < 1 means new is faster."""
+    lines = ["%s -> %s" % ((old.get("commit") or "-")[:12], (new.get("commit") or "-")[:12])]
+    if old.get("suite") != new.get("suite") or old.get("params") != new.get("params"):
+        lines.append("warning: suite or parameters differ; ratios are not comparable")
+    lines.append("%-34s %10s %10s %8s %14s" % ("phase", "old_s", "new_s", "ratio", "spawns"))
+    for name in new.get("order") or sorted(new.get("phases", {})):
+        a = old.get("phases", {}).get(name)
+        b = new["phases"][name]
+        if not a:
+            continue
+        ratio = b["wall_s"] / a["wall_s"] if a["wall_s"] else float("inf")
+        spawns = ""
+        if "spawns_total" in a or "spawns_total" in b:
+            spawns = "%s -> %s" % (a.get("spawns_total", "-"), b.get("spawns_total", "-"))
+        lines.append("%-34s %10.3f %10.3f %8.2f %14s" % (name, a["wall_s"], b["wall_s"], ratio, spawns))
+    return "\n".join(lines)
+
+
+def load_result(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_result(result, out_path=None):
+    text = json.dumps(result, indent=2, sort_keys=True)
+    if out_path:
+        with open(out_path, "w") as f:
+            f.write(text + "\n")
+        print(format_report(result), file=sys.stderr)
+        print("[bench] wrote %s" % out_path, file=sys.stderr)
+    else:
+        print(text)
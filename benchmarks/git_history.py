@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+from __future__ import print_function
+"""Time keyword collection and source-review export on a synthetic git history.
+
+The repository is built in one `git fast-import` run: a first commit adds
+--files files spread over --fanout directories, then --commits commits each
+edit --files-per-commit files; --keyword-density of them mention the
+keyword in their message and every --rename-every-th commit also renames a
+file. The same seed always builds the same history.
+
+Phases (fresh state and diff cache per repeat):
+
+    collect_git_hits                keyword scan (git log + git show per commit)
+    update_pkg                      the same through update_pkg, records the update
+    export_source_review.cold       review DOCX with an empty diff cache
+    export_source_review.warm       the same again, served from the diff cache
+
+Besides wall time and peak RSS every phase reports how many subprocesses it
+spawned, by program name, so fork-heavy regressions show up even when the
+machine hides them in wall time. The "files" column counts keyword commits
+for the first two phases and reviewed files for the export phases.
+
+
+    python benchmarks/git_history.py --commits 2000 --out before.json
+    python benchmarks/run.py --compare before.json after.json
+"""
+
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import common  # noqa: E402
+from pkgmgr import config, release  # noqa: E402
+
+PKG_ID = "GITBENCH"
+KEYWORD = "BENCH-1"
+_AUTHOR = "Bench <bench@example.invalid>"
+_EPOCH = 1700000000
+
+
+class HistorySpec(object):
+    def __init__(
+        self,
+        commits=500,
+        files=200,
+        fanout=8,
+        keyword_density=0.1,
+        rename_every=50,
+        files_per_commit=3,
+        lines=40,
+        seed=1,
+    ):
+        self.commits = max(1, int(commits))
+        self.files = max(1, int(files))
+        self.fanout = max(1, int(fanout))
+        self.keyword_density = max(0.0, min(1.0, float(keyword_density)))
+        self.rename_every = max(0, int(rename_every))
+        self.files_per_commit = max(1, int(files_per_commit))
+        self.lines = max(1, int(lines))
+        self.seed = int(seed)
+
+    def as_dict(self):
+        return {
+            "commits": self.commits,
+            "files": self.files,
+            "fanout": self.fanout,
+            "keyword_density": self.keyword_density,
+            "rename_every": self.rename_every,
+            "files_per_commit": self.files_per_commit,
+            "lines": self.lines,
+            "seed": self.seed,
+        }
+
+
+def _data(payload):
+    raw = payload.encode("utf-8")
+    return b"data %d\n%s\n" % (len(raw), raw)
+
+
+def _file_text(lines):
+    return "".join(line + "\n" for line in lines)
+
+
+def _stream(spec):
+    """Yield the fast-import stream for spec, one commit per chunk."""
+    rng = random.Random(spec.seed)
+    paths = ["src/d%d/file%05d.c" % (index % spec.fanout, index) for index in range(spec.files)]
+    contents = dict(
+        (path, ["/* %s line %d */" % (path, n) for n in range(spec.lines)]) for path in paths
+    )
+    ts = _EPOCH
+
+    out = [b"commit refs/heads/bench\nmark :1\n"]
+    out.append(b"committer %s %d +0000\n" % (_AUTHOR.encode("ascii"), ts))
+    out.append(_data("initial import"))
+    for path in paths:
+        out.append(b"M 100644 inline %s\n" % path.encode("ascii"))
+        out.append(_data(_file_text(contents[path])))
+    yield b"".join(out)
+
+    renamed = 0
+    for index in range(1, spec.commits + 1):
+        ts += 60
+        keyword = rng.random() < spec.keyword_density
+        subject = "%s change %d" % (KEYWORD, index) if keyword else "routine change %d" % index
+        out = [b"commit refs/heads/bench\nmark :%d\n" % (index + 1)]
+        out.append(b"committer %s %d +0000\n" % (_AUTHOR.encode("ascii"), ts))
+        out.append(_data("%s\n\nbody of commit %d\n" % (subject, index)))
+        out.append(b"from :%d\n" % index)
+        for path in rng.sample(paths, min(spec.files_per_commit, len(paths))):
+            lines = contents[path]
+            lines[rng.randrange(len(lines))] = "int v%d = %d;" % (index, rng.randrange(1 << 20))
+            lines.append("/* commit %d */" % index)
+            out.append(b"M 100644 inline %s\n" % path.encode("ascii"))
+            out.append(_data(_file_text(lines)))
+        if spec.rename_every and index % spec.rename_every == 0:
+            old = rng.choice(paths)
+            renamed += 1
+            new = "src/d%d/moved%05d.c" % (rng.randrange(spec.fanout), renamed)
+            out.append(b"R %s %s\n" % (old.encode("ascii"), new.encode("ascii")))
+            paths[paths.index(old)] = new
+            contents[new] = contents.pop(old)
+        yield b"".join(out)
+
+
+def build_repo(repo_dir, spec):
+    """Create repo_dir with spec's history checked out; returns the commit count."""
+    if not os.path.isdir(repo_dir):
+        os.makedirs(repo_dir)
+    env = dict(os.environ, GIT_CONFIG_NOSYSTEM="1")
+
+    def _git(*args, **kwargs):
+        subprocess.check_call(["git"] + list(args), cwd=repo_dir, env=env, **kwargs)
+
+    _git("init", "-q")
+    proc = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=repo_dir, env=env, stdin=subprocess.PIPE)
+    try:
+        for chunk in _stream(spec):
+            proc.stdin.write(chunk)
+        proc.stdin.close()
+    finally:
+        rc = proc.wait()
+    if rc != 0:
+        raise RuntimeError("git fast-import failed (exit %d)" % rc)
+    _git("symbolic-ref", "HEAD", "refs/heads/bench")
+    _git("reset", "-q", "--hard")
+    return spec.commits + 1
+
+
+def _review_plugin():
+    try:
+        from plugin import export_source_review
+    except ImportError:
+        return None
+    if export_source_review.Document is None:
+        return None
+    return export_source_review
+
+
+def run_scenario(work_dir, spec, timer):
+    """Run the phases once under work_dir; pkgmgr state must already be isolated."""
+    repo = os.path.join(work_dir, "repo")
+    pkg_root = os.path.join(work_dir, "pkgs")
+    pkg_dir = os.path.join(pkg_root, PKG_ID)
+    build_repo(repo, spec)
+    with common.quiet(timer.verbose):
+        config.write_pkg_template(
+            os.path.join(pkg_dir, "pkg.yaml"),
+            pkg_id=PKG_ID,
+            pkg_root=pkg_dir,
+            include_releases=[],
+            git_cfg={"repo_root": repo, "keywords": [KEYWORD]},
+        )
+    pkg_cfg = config.load_pkg_config(os.path.join(pkg_dir, "pkg.yaml"))
+    cfg = {"pkg_release_root": pkg_root}
+
+    # commit info is memoized per process; every phase starts cold
+    release._COMMIT_INFO_CACHE.clear()
+    git_info, git_files = timer.run(
+        "collect_git_hits", lambda found: (len(found[0]["commits"]), 0), release._collect_git_hits, pkg_cfg, pkg_dir
+    )
+    release._COMMIT_INFO_CACHE.clear()
+    timer.run("update_pkg", (len(git_info["commits"]), 0), release.update_pkg, cfg, PKG_ID)
+
+    review = _review_plugin()
+    if review is None:
+        print("[bench] python-docx not installed; skipping export_source_review", file=sys.stderr)
+        return
+    argv = ["--pkg-id", PKG_ID, "--docx", os.path.join(work_dir, "review.docx")]
+    for name in ("export_source_review.cold", "export_source_review.warm"):
+        rc = timer.run(name, (len(git_files), 0), review.main, argv, {"cfg": cfg})
+        if rc:
+            raise RuntimeError("export_source_review failed (exit %s)" % rc)
+
+
+def run(spec, repeat=1, work_dir=None, keep=False, verbose=False):
+    timer = common.Timer(verbose=verbose, count_spawns=True)
+    parent = work_dir or tempfile.mkdtemp(prefix="pkgmgr-gitbench-")
+    cwd = os.getcwd()
+    try:
+        for index in range(max(1, int(repeat))):
+            target = os.path.join(parent, "run%02d" % index)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            with common.isolated_state(os.path.join(target, "home")):
+                run_scenario(target, spec, timer)
+            if not keep:
+                shutil.rmtree(target, ignore_errors=True)
+    finally:
+        os.chdir(cwd)
+        if not keep and not work_dir:
+            shutil.rmtree(parent, ignore_errors=True)
+    params = spec.as_dict()
+    params["repeat"] = max(1, int(repeat))
+    return common.build_result("git_history", params, timer)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="pkgmgr git keyword/review benchmark on a synthetic history")
+    parser.add_argument("--commits", type=int, default=500, help="commits after the initial import (default 500)")
+    parser.add_argument("--files", type=int, default=200, help="files in the repository (default 200)")
+    parser.add_argument("--fanout", type=int, default=8, help="directories files are spread over (default 8)")
+    parser.add_argument(
+        "--keyword-density", type=float, default=0.1, help="fraction of commits mentioning the keyword (default 0.1)"
+    )
+    parser.add_argument("--rename-every", type=int, default=50, help="rename a file every N commits; 0 disables")
+    parser.add_argument("--files-per-commit", type=int, default=3, help="files edited per commit (default 3)")
+    parser.add_argument("--lines", type=int, default=40, help="initial lines per file (default 40)")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat the scenario N times; wall is the median")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", help="where to build repositories (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep generated repositories and state")
+    parser.add_argument("--verbose", action="store_true", help="show pkgmgr output while timing")
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    spec = HistorySpec(
+        commits=args.commits,
+        files=args.files,
+        fanout=args.fanout,
+        keyword_density=args.keyword_density,
+        rename_every=args.rename_every,
+        files_per_commit=args.files_per_commit,
+        lines=args.lines,
+        seed=args.seed,
+    )
+    result = run(spec, repeat=args.repeat, work_dir=args.work_dir, keep=args.keep, verbose=args.verbose)
+    common.write_result(result, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
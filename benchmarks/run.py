@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+from __future__ import print_function
+"""Time the core pkgmgr workflow on a synthetic package tree.
+
+Scenario (fresh state directory per repeat):
+
+    create_baseline       scan the generated tree
+    update_pkg.initial    first release bundle (every file)
+    finalize_pkg_release  move the bundle to HISTORY and tar it
+    (mutate --changed % of the files)
+    create_snapshot       rescan
+    diff_snapshots        baseline vs snapshot
+    update_pkg            incremental bundle (changed files)
+    finalize_pkg_release.incremental
+    cancel_pkg_release    undo the incremental release
+
+Each phase reports median/min wall time, files/s and MB/s over the files it
+had to touch, and peak RSS while it ran. Results are written as JSON tagged
+with the current commit so runs can be compared:
+
+    python benchmarks/run.py --files 5000 --out before.json
+    python benchmarks/run.py --files 5000 --out after.json
+    python benchmarks/run.py --compare before.json after.json
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks import common, synth  # noqa: E402
+from pkgmgr import config, release, snapshot  # noqa: E402
+
+PKG_ID = "BENCH"
+PHASES = (
+    "create_baseline",
+    "update_pkg.initial",
+    "finalize_pkg_release",
+    "create_snapshot",
+    "diff_snapshots",
+    "update_pkg",
+    "finalize_pkg_release.incremental",
+    "cancel_pkg_release",
+)
+
+
+def _bundle_work(out_path):
+    from pkgmgr import updates
+
+    files = 0
+    size = 0
+    for bundle in updates.load_update(out_path).get("release") or []:
+        release_dir = bundle.get("release_dir")
+        for rel in bundle.get("copied") or []:
+            files += 1
+            path = os.path.join(release_dir, rel) if release_dir else None
+            if path and os.path.isfile(path):
+                size += os.path.getsize(path)
+    return files, size
+
+
+def run_scenario(work_dir, spec, changed, timer):
+    """Run the workflow once under work_dir; pkgmgr state must already be isolated."""
+    pkg_root = os.path.join(work_dir, "pkgs")
+    pkg_dir = os.path.join(pkg_root, PKG_ID)
+    src = os.path.join(pkg_dir, "src")
+
+    entries = synth.generate_tree(src, spec)
+    everything = (len(entries), synth.total_bytes(entries))
+    with common.quiet(timer.verbose):
+        config.write_pkg_template(
+            os.path.join(pkg_dir, "pkg.yaml"),
+            pkg_id=PKG_ID,
+            pkg_root=pkg_dir,
+            include_releases=["src"],
+            git_cfg={"keywords": []},
+            collectors_enabled=["checksums"],
+        )
+    cfg = {"pkg_release_root": pkg_root, "sources": [src]}
+
+    base = timer.run("create_baseline", everything, snapshot.create_baseline, cfg)
+    out_path = timer.run("update_pkg.initial", everything, release.update_pkg, cfg, PKG_ID)
+    initial = _bundle_work(out_path)
+    timer.run("finalize_pkg_release", initial, release.finalize_pkg_release, cfg, PKG_ID)
+
+    delta = synth.mutate_tree(src, entries, changed, generation=1, seed=spec.seed)
+    delta_work = (len(delta), synth.total_bytes(delta))
+    latest = timer.run("create_snapshot", everything, snapshot.create_snapshot, cfg)
+    timer.run("diff_snapshots", everything, snapshot.diff_snapshots, base, latest)
+    # update records are keyed by the second; keep the two runs apart
+    time.sleep(max(0.0, 1.05 - (time.time() % 1.0)))
+    out_path = timer.run("update_pkg", delta_work, release.update_pkg, cfg, PKG_ID)
+    incremental = _bundle_work(out_path)
+    finalized = timer.run(
+        "finalize_pkg_release.incremental", incremental, release.finalize_pkg_release, cfg, PKG_ID
+    )
+    if finalized:
+        name = os.path.basename(finalized[0]).rsplit(".tar", 1)[0]
+        timer.run("cancel_pkg_release", incremental, release.cancel_pkg_release, cfg, PKG_ID, name)
+
+
+def run(spec, changed=10.0, repeat=1, work_dir=None, keep=False, verbose=False):
+    timer = common.Timer(verbose=verbose)
+    parent = work_dir or tempfile.mkdtemp(prefix="pkgmgr-bench-")
+    try:
+        for index in range(max(1, int(repeat))):
+            target = os.path.join(parent, "run%02d" % index)
+            if os.path.exists(target):
+                shutil.rmtree(target)
+            with common.isolated_state(os.path.join(target, "home")):
+                run_scenario(target, spec, changed, timer)
+            if not keep:
+                shutil.rmtree(target, ignore_errors=True)
+    finally:
+        if not keep and not work_dir:
+            shutil.rmtree(parent, ignore_errors=True)
+    params = spec.as_dict()
+    params.update({"changed_pct": changed, "repeat": max(1, int(repeat))})
+    return common.build_result("workflow", params, timer)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="pkgmgr workflow benchmark on a synthetic tree")
+    parser.add_argument("--files", type=int, default=1000, help="number of files (default 1000)")
+    parser.add_argument(
+        "--sizes", default=synth.DEFAULT_SIZES, help="size distribution size:weight,... (default %s)" % synth.DEFAULT_SIZES
+    )
+    parser.add_argument("--depth", type=int, default=3, help="directory depth (default 3)")
+    parser.add_argument("--fanout", type=int, default=8, help="directories per level (default 8)")
+    parser.add_argument("--changed", type=float, default=10.0, help="percent of files changed between runs (default 10)")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat the scenario N times; wall is the median")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--work-dir", help="where to build trees (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep generated trees and state")
+    parser.add_argument("--verbose", action="store_true", help="show pkgmgr output while timing")
+    parser.add_argument("--out", help="write the JSON result here (default: stdout)")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two result files and exit")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.compare:
+        print(common.compare(common.load_result(args.compare[0]), common.load_result(args.compare[1])))
+        return 0
+    spec = synth.TreeSpec(files=args.files, sizes=args.sizes, depth=args.depth, fanout=args.fanout, seed=args.seed)
+    result = run(spec, changed=args.changed, repeat=args.repeat, work_dir=args.work_dir, keep=args.keep, verbose=args.verbose)
+    common.write_result(result, args.out)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,131 @@
+from __future__ import print_function
+"""Deterministic synthetic package trees for the benchmark suite.
+
+A tree is described by a file count, a weighted size distribution
+("1k:60,16k:30,256k:10"), a directory depth and a fan-out per level. The same
+seed always produces the same paths, sizes and contents, so numbers taken on
+different commits measure the code and not the data.
+"""
+
+import os
+import random
+
+DEFAULT_SIZES = "1k:60,16k:30,256k:10"
+_UNITS = {"": 1, "b": 1, "k": 1024, "m": 1024 * 1024, "g": 1024 * 1024 * 1024}
+_POOL_SIZE = 4 * 1024 * 1024
+
+
+def parse_size(text):
+    text = str(text).strip().lower()
+    digits = text.rstrip("bkmg")
+    unit = text[len(digits):]
+    if not digits or unit not in _UNITS:
+        raise RuntimeError("invalid size: %s" % text)
+    return int(float(digits) * _UNITS[unit])
+
+
+def parse_sizes(spec):
+    """Parse "size:weight,..." into [(bytes, weight)]."""
+    dist = []
+    for part in (spec or DEFAULT_SIZES).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        size, _, weight = part.partition(":")
+        weight = float(weight) if weight else 1.0
+        if weight <= 0:
+            raise RuntimeError("invalid size weight: %s" % part)
+        dist.append((parse_size(size), weight))
+    if not dist:
+        raise RuntimeError("empty size distribution")
+    return dist
+
+
+class TreeSpec(object):
+    def __init__(self, files=1000, sizes=DEFAULT_SIZES, depth=3, fanout=8, seed=1):
+        self.files = int(files)
+        self.sizes = sizes
+        self.depth = max(0, int(depth))
+        self.fanout = max(1, int(fanout))
+        self.seed = int(seed)
+
+    def as_dict(self):
+        return {
+            "files": self.files,
+            "sizes": self.sizes,
+            "depth": self.depth,
+            "fanout": self.fanout,
+            "seed": self.seed,
+        }
+
+
+def _pool(seed):
+    # one random block sliced per file; cheap to produce and incompressible
+    return random.Random(seed).getrandbits(_POOL_SIZE * 8).to_bytes(_POOL_SIZE, "little")
+
+
+def _content(pool, tag, size, offset):
+    head = ("%s\n" % tag).encode("ascii")
+    if size <= len(head):
+        return head[:size]
+    body = bytearray(head)
+    remaining = size - len(head)
+    while remaining > 0:
+        start = offset % len(pool)
+        piece = pool[start:start + remaining]
+        body += piece
+        remaining -= len(piece)
+        offset += len(piece)
+    return bytes(body)
+
+
+def plan_tree(spec):
+    """Return [(relpath, size)] for spec without touching the disk."""
+    rng = random.Random(spec.seed)
+    dist = parse_sizes(spec.sizes)
+    sizes = [size for size, _ in dist]
+    weights = [weight for _, weight in dist]
+    entries = []
+    for index in range(spec.files):
+        parts = ["d%d" % rng.randrange(spec.fanout) for _ in range(spec.depth)]
+        parts.append("f%06d.dat" % index)
+        entries.append(("/".join(parts), rng.choices(sizes, weights)[0]))
+    return entries
+
+
+def generate_tree(root, spec):
+    """Write the tree for spec under root; returns [(relpath, size)]."""
+    entries = plan_tree(spec)
+    pool = _pool(spec.seed)
+    made = set()
+    for index, (rel, size) in enumerate(entries):
+        path = os.path.join(root, rel)
+        parent = os.path.dirname(path)
+        if parent not in made:
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            made.add(parent)
+        with open(path, "wb") as f:
+            f.write(_content(pool, "%s gen0" % rel, size, index * 7919))
+    return entries
+
+
+def mutate_tree(root, entries, percent, generation=1, seed=1):
+    """
+    Rewrite percent% of entries in place with new content of the same size.
+    Returns the [(relpath, size)] that changed.
+    """
+    count = int(round(len(entries) * max(0.0, min(100.0, float(percent))) / 100.0))
+    if count <= 0:
+        return []
+    rng = random.Random("%s:%s" % (seed, generation))
+    changed = sorted(rng.sample(entries, count))
+    pool = _pool(seed + generation)
+    for index, (rel, size) in enumerate(changed):
+        with open(os.path.join(root, rel), "wb") as f:
+            f.write(_content(pool, "%s gen%d" % (rel, generation), size, index * 104729))
+    return changed
+
+
+def total_bytes(entries):
+    return sum(size for _, size in entries)
@@ -11,6 +11,12 @@ __all__ = [
     "release",
     "watch",
     "points",
+    "summary",
+    "updates",
+    "retention",
+    "daemon",
+    "copier",
+    "metrics",
 ]
 
 __version__ = "0.1.2.dev1"
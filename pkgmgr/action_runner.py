@@ -0,0 +1,633 @@
+from __future__ import print_function
+"""Action execution: command/module entries scheduled as a dependency graph.
+
+An action is either a plain list of command entries (run in order, one action
+at a time, exactly as before) or a mapping:
+
+    export_cksum:
+      commands: [...]
+      depends_on: [build]   # ordering among actions of the same run
+      parallel: true        # may overlap with other parallel actions
+      timeout: 600          # seconds per shell command
+      inputs:               # optional: skip while these are unchanged
+        releases: true      # files under pkg.yaml include.releases (or a list of roots)
+        update: [git, checksums]   # sections of the latest update record
+        paths: [/data/template.xlsx]
+
+Non-parallel actions act as barriers in the requested order, so configs that
+never set `parallel` keep their sequential behaviour. Parallel actions run on a
+bounded thread pool (action_runner.max_workers) with their shell output captured
+to per-action log files. Results keep the historical shape: one
+{"name", "status", "rc"} dict per command, in the requested order.
+
+Actions with `inputs` record a fingerprint of those inputs (plus their own
+definition) after a successful run under <state>/pkg/<id>/actions/<name>.json
+and report status "unchanged" instead of running while it still matches.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import shlex
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+from . import config, updates
+
+_TIMEOUT_GRACE_SEC = 5
+# how long to let relayed output drain once the command is done
+_RELAY_JOIN_SEC = 5
+# statuses that count as success for depends_on
+_OK_STATUSES = ("ok", "unchanged")
+# in-process module entries share cwd/environ/stdout, so only one runs at a time
+_MODULE_LOCK = threading.Lock()
+
+
+def _render_action_value(value, context):
+    if not value or not context:
+        return value
+    text = str(value)
+    for key, val in context.items():
+        text = text.replace("{%s}" % key, str(val))
+    return text
+
+
+def _render_action_env(env, context):
+    if not env or not isinstance(env, dict):
+        return env
+    rendered = {}
+    for k, v in env.items():
+        rendered[k] = _render_action_value(v, context)
+    return rendered
+
+
+def _parse_action_entry(entry):
+    if isinstance(entry, dict):
+        cmd = entry.get("cmd")
+        cwd = entry.get("cwd")
+        env = entry.get("env")
+        return cmd, cwd, env
+    return entry, None, None
+
+
+def _module_args(value, context):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return [_render_action_value(str(v), context) for v in value]
+    return shlex.split(_render_action_value(str(value), context))
+
+
+def _accepts_context(func):
+    try:
+        import inspect
+
+        params = inspect.signature(func).parameters
+    except (TypeError, ValueError):
+        return False
+    return "context" in params or any(p.kind == p.VAR_KEYWORD for p in params.values())
+
+
+def _run_module_entry(entry, cfg, label, extra_args=None, config_path=None, context=None, log_path=None):
+    """
+    Run a `module:` action in this interpreter by calling <module>.main(argv).
+    The module is imported once per process (warm in `pkgmgr serve`); `args`
+    become argv, `cwd`/`env`/`path` apply only while it runs, and mains that
+    accept `context` receive the loaded config and pkg context directly.
+    Its stdout/stderr go to log_path when given, like a shell command's output.
+    A timeout cannot be enforced on code running in this process, so none is
+    applied. Callers hold _MODULE_LOCK.
+    """
+    import importlib
+
+    context = context or {}
+    module_name = str(entry.get("module"))
+    argv = _module_args(entry.get("args"), context) + [str(a) for a in (extra_args or [])]
+    cwd = _render_action_value(entry.get("cwd"), context)
+    env = dict(_render_action_env(entry.get("env"), context) or {})
+    if config_path:
+        env.setdefault("PKGMGR_CONFIG", config_path)
+    search_path = _render_action_value(entry.get("path"), context) or cwd
+    tag = " (%s)" % label if label else ""
+
+    saved_cwd = os.getcwd()
+    saved_env = {}
+    saved_streams = (sys.stdout, sys.stderr)
+    log_file = None
+    rc = 1
+    try:
+        if log_path:
+            log_file = open(log_path, "a")
+            log_file.write("$ module %s %s\n" % (module_name, " ".join(argv)))
+            log_file.flush()
+            sys.stdout = sys.stderr = log_file
+        for k, v in env.items():
+            if v is None:
+                continue
+            saved_env[str(k)] = os.environ.get(str(k))
+            os.environ[str(k)] = str(v)
+        if search_path:
+            # stays on sys.path: plugins may import lazily after main() returns
+            search_path = os.path.abspath(os.path.expanduser(search_path))
+            if search_path not in sys.path:
+                sys.path.insert(0, search_path)
+        if cwd:
+            os.chdir(os.path.expanduser(cwd))
+        module = importlib.import_module(module_name)
+        func = getattr(module, str(entry.get("function") or "main"), None)
+        if not callable(func):
+            raise RuntimeError("module %s has no callable %s" % (module_name, entry.get("function") or "main"))
+        if _accepts_context(func):
+            plugin_ctx = dict(context)
+            plugin_ctx.update({"cfg": cfg, "config_path": config_path})
+            rc = func(argv, context=plugin_ctx)
+        else:
+            rc = func(argv)
+        rc = 0 if rc is None else rc
+    except SystemExit as exc:
+        # argparse errors and explicit sys.exit() inside the plugin
+        rc = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+    except Exception as e:
+        print("[actions] error%s: %s: %s" % (tag, module_name, str(e)))
+        rc = 1
+    finally:
+        if log_file is not None:
+            sys.stdout, sys.stderr = saved_streams
+            log_file.close()
+        os.chdir(saved_cwd)
+        for k, v in saved_env.items():
+            if v is None:
+                os.environ.pop(k, None)
+            else:
+                os.environ[k] = v
+    if rc == 0:
+        print("[actions] module ok%s" % tag)
+    else:
+        print("[actions] module failed%s (rc=%s)" % (tag, rc))
+    return rc
+
+
+def _stdout_fileno():
+    try:
+        return sys.stdout.fileno()
+    except Exception:
+        return None
+
+
+def _kill_tree(p):
+    try:
+        os.killpg(p.pid, signal.SIGTERM)
+    except Exception:
+        p.terminate()
+    try:
+        p.wait(timeout=_TIMEOUT_GRACE_SEC)
+    except subprocess.TimeoutExpired:
+        try:
+            os.killpg(p.pid, signal.SIGKILL)
+        except Exception:
+            p.kill()
+        p.wait()
+
+
+def _relay_output(pipe, out):
+    try:
+        for line in iter(pipe.readline, b""):
+            out.write(line.decode("utf-8", errors="replace"))
+    except (OSError, ValueError):
+        pass
+    finally:
+        pipe.close()
+
+
+def _join_relay(relay, timeout=_RELAY_JOIN_SEC):
+    # a background child that inherited the pipe can hold it open; don't wait on it forever
+    if relay is not None:
+        relay.join(timeout)
+
+
+def _run_cmd(cmd, cwd=None, env=None, label=None, timeout=None, log_path=None, base_cwd=None, base_env=None):
+    """
+    Run one shell command. Returns (status, rc) with status ok/failed/timeout.
+    Output goes to log_path when given, else to this process's stdout.
+    base_cwd/base_env are the directory and environment the runner started
+    with; a relative cwd resolves against base_cwd. run_actions passes them so
+    an in-process module entry (which chdirs and edits os.environ while it
+    runs) on another thread can't leak into the command.
+    """
+    merged_env = dict(base_env) if base_env is not None else os.environ.copy()
+    if base_cwd:
+        cwd = os.path.join(base_cwd, os.path.expanduser(cwd)) if cwd else base_cwd
+    if env and isinstance(env, dict):
+        for k, v in env.items():
+            if v is None:
+                continue
+            merged_env[str(k)] = str(v)
+    prefix = "[actions]"
+    tag = " (%s)" % label if label else ""
+    log_file = None
+    relay = None
+    try:
+        # own process group so a timeout can stop the whole shell pipeline
+        popen_kwargs = {"shell": True, "cwd": cwd, "env": merged_env, "start_new_session": bool(timeout)}
+        if log_path:
+            log_file = open(log_path, "ab")
+            log_file.write(("$ %s\n" % cmd).encode("utf-8"))
+            log_file.flush()
+            p = subprocess.Popen(cmd, stdout=log_file, stderr=subprocess.STDOUT, **popen_kwargs)
+        elif _stdout_fileno() is None:
+            # stdout is not a real file (e.g. streamed to a `pkgmgr serve` client);
+            # relay the child's output through sys.stdout instead of fd 1
+            # on a reader thread, so the wait below still enforces the timeout
+            p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **popen_kwargs)
+            relay = threading.Thread(target=_relay_output, args=(p.stdout, sys.stdout), name="action-relay")
+            relay.daemon = True
+            relay.start()
+        else:
+            p = subprocess.Popen(cmd, **popen_kwargs)
+        try:
+            rc = p.wait(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            _kill_tree(p)
+            _join_relay(relay)
+            print("%s command timed out%s after %ss" % (prefix, tag, timeout))
+            return "timeout", None
+        _join_relay(relay)
+        if rc == 0:
+            print("%s command ok%s" % (prefix, tag))
+        else:
+            print("%s command failed%s (rc=%s)" % (prefix, tag, rc))
+    except Exception as e:
+        print("%s error%s: %s" % (prefix, tag, str(e)))
+        return "failed", 1
+    finally:
+        if log_file is not None:
+            log_file.close()
+    return ("ok" if rc == 0 else "failed"), rc
+
+
+def _action_spec(entries):
+    """Normalize an action value to {commands, depends_on, parallel, timeout}."""
+    if isinstance(entries, dict) and "commands" in entries:
+        commands = entries.get("commands") or []
+        if isinstance(commands, dict):
+            commands = [commands]
+        return {
+            "commands": commands,
+            "depends_on": [str(d) for d in (entries.get("depends_on") or [])],
+            "parallel": bool(entries.get("parallel")),
+            "timeout": entries.get("timeout"),
+            "inputs": entries.get("inputs") or None,
+        }
+    if isinstance(entries, dict):
+        entries = [entries]
+    return {"commands": entries, "depends_on": [], "parallel": False, "timeout": None, "inputs": None}
+
+
+def _fingerprint_state_path(name, pkg_id):
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", str(name))
+    if pkg_id:
+        return os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(pkg_id), "actions", "%s.json" % safe)
+    return os.path.join(config.DEFAULT_STATE_DIR, "actions", "%s.json" % safe)
+
+
+def _hash_stat(h, tag, path, rel):
+    try:
+        st = os.stat(path)
+    except OSError:
+        h.update(("%s\0%s\0missing\n" % (tag, rel)).encode("utf-8", errors="replace"))
+        return
+    h.update(("%s\0%s\0%d\0%d\n" % (tag, rel, st.st_size, st.st_mtime_ns)).encode("utf-8", errors="replace"))
+
+
+def _hash_tree(h, tag, target, base):
+    if os.path.isfile(target):
+        _hash_stat(h, tag, target, os.path.relpath(target, base))
+        return
+    for root, dirs, names in os.walk(target):
+        dirs.sort()
+        for fname in sorted(names):
+            path = os.path.join(root, fname)
+            _hash_stat(h, tag, path, os.path.relpath(path, base))
+
+
+def _input_fingerprint(spec, cfg, context, extra_args):
+    """
+    Fingerprint an action's declared inputs: file stats (size + mtime) for
+    release roots and paths, section contents of the latest update record.
+    Returns None when the inputs cannot be resolved (the action then runs).
+    """
+    inputs = spec.get("inputs")
+    if not inputs:
+        return None
+    pkg_id = context.get("pkg_id")
+    h = hashlib.sha256()
+    definition = {"commands": spec["commands"], "inputs": inputs, "extra_args": list(extra_args or [])}
+    h.update(json.dumps(definition, sort_keys=True, default=str).encode("utf-8"))
+
+    releases = inputs.get("releases")
+    if releases:
+        if not pkg_id or not cfg.get("pkg_release_root"):
+            return None
+        pkg_dir = os.path.join(os.path.expanduser(str(cfg["pkg_release_root"])), str(pkg_id))
+        try:
+            pkg_cfg = config.load_pkg_config(os.path.join(pkg_dir, "pkg.yaml"))
+        except Exception:
+            return None
+        wanted = None if releases is True else set(str(r).rstrip("/") for r in releases)
+        for rel in sorted(str(r).rstrip("/") for r in (pkg_cfg.get("include") or {}).get("releases") or []):
+            # resolve like release._collect_release_sources: absolute and ~ roots stay where they are
+            target = os.path.expanduser(rel)
+            if not os.path.isabs(target):
+                target = os.path.join(pkg_dir, target)
+            target = os.path.abspath(target)
+            name = os.path.relpath(target, pkg_dir)
+            if name.startswith(".."):
+                name = os.path.basename(target)
+            if wanted is not None and not wanted & set([rel, name, name.split("/", 1)[0]]):
+                continue
+            if not os.path.exists(target):
+                h.update(("R\0%s\0missing\n" % target).encode("utf-8", errors="replace"))
+                continue
+            _hash_tree(h, "R", target, pkg_dir)
+
+    sections = inputs.get("update") or []
+    if sections:
+        if not pkg_id:
+            return None
+        record = updates.open_latest(pkg_id)
+        for section in sections:
+            if record is None:
+                data = None
+            elif section == "git":
+                data = record.git(with_commits=False)
+            elif section == "release":
+                data = record.bundles()
+            else:
+                data = record.section(section)
+            h.update(("U\0%s\0" % section).encode("utf-8"))
+            h.update(json.dumps(data, sort_keys=True, default=str).encode("utf-8"))
+
+    for pattern in inputs.get("paths") or []:
+        pattern = os.path.expanduser(str(_render_action_value(pattern, context)))
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            h.update(("P\0%s\0missing\n" % pattern).encode("utf-8", errors="replace"))
+        for match in matches:
+            _hash_tree(h, "P", match, os.path.dirname(match))
+    return h.hexdigest()
+
+
+def _load_fingerprint(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    return data.get("fingerprint") if isinstance(data, dict) else None
+
+
+def _save_fingerprint(path, fingerprint):
+    parent = os.path.dirname(path)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    tmp_path = "%s.tmp.%d.%d" % (path, os.getpid(), threading.current_thread().ident or 0)
+    payload = {"fingerprint": fingerprint, "succeeded_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime())}
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _runner_settings(cfg):
+    runner = cfg.get("action_runner") or {}
+    max_workers = runner.get("max_workers") or 4
+    log_dir = runner.get("log_dir") or os.path.join(config.DEFAULT_STATE_DIR, "actions", "logs")
+    return max(1, int(max_workers)), os.path.abspath(os.path.expanduser(str(log_dir))), runner.get("timeout_sec")
+
+
+def _order_nodes(names, specs):
+    """
+    Stable topological order of the requested names: keeps the requested order
+    except where depends_on requires otherwise. Raises RuntimeError on cycles.
+    """
+    by_name = {}
+    for idx, name in enumerate(names):
+        by_name.setdefault(name, []).append(idx)
+    deps = {}
+    for idx, name in enumerate(names):
+        spec = specs.get(idx)
+        wanted = spec["depends_on"] if spec else []
+        deps[idx] = set(j for dep in wanted for j in by_name.get(dep, []) if j != idx)
+    order = []
+    done = set()
+    remaining = list(range(len(names)))
+    while remaining:
+        for idx in remaining:
+            if deps[idx] <= done:
+                order.append(idx)
+                done.add(idx)
+                remaining.remove(idx)
+                break
+        else:
+            cycle = ", ".join(sorted(set(names[i] for i in remaining)))
+            raise RuntimeError("action dependency cycle among: %s" % cycle)
+    return order, deps
+
+
+def _run_action(
+    name, spec, cfg, extra_args, extra_suffix, config_path, context, timeout, log_path, force=False, base=(None, None)
+):
+    fingerprint = None
+    state_path = None
+    if spec.get("inputs"):
+        try:
+            fingerprint = _input_fingerprint(spec, cfg, context, extra_args)
+        except Exception as e:
+            print("[actions] %s: cannot fingerprint inputs (%s); running" % (name, str(e)))
+        if fingerprint:
+            state_path = _fingerprint_state_path(name, context.get("pkg_id"))
+            if not force and _load_fingerprint(state_path) == fingerprint:
+                print("[actions] %s unchanged since last successful run; skipping" % name)
+                return [{"name": name, "status": "unchanged", "rc": 0}]
+    results = _run_commands(
+        name, spec, cfg, extra_args, extra_suffix, config_path, context, timeout, log_path, base=base
+    )
+    if state_path and results and all(r["status"] == "ok" for r in results):
+        _save_fingerprint(state_path, fingerprint)
+    return results
+
+
+def _run_commands(
+    name, spec, cfg, extra_args, extra_suffix, config_path, context, timeout, log_path, base=(None, None)
+):
+    results = []
+    commands = spec["commands"]
+    where = " -> %s" % log_path if log_path else ""
+    print("[actions] running %s (%d command(s))%s" % (name, len(commands), where))
+    for idx, entry in enumerate(commands):
+        label = "%s #%d" % (name, idx + 1)
+        if isinstance(entry, dict) and entry.get("module"):
+            if spec.get("timeout"):
+                print("[actions] %s: timeout does not apply to module entries" % label)
+            with _MODULE_LOCK:
+                rc = _run_module_entry(
+                    entry,
+                    cfg,
+                    label,
+                    extra_args=extra_args,
+                    config_path=config_path,
+                    context=context,
+                    log_path=log_path,
+                )
+            results.append({"name": name, "status": "ok" if rc == 0 else "failed", "rc": rc})
+            continue
+        cmd, cwd, env = _parse_action_entry(entry)
+        if not cmd:
+            print("[actions] skip empty cmd for %s" % label)
+            continue
+        cmd = _render_action_value(cmd, context)
+        cwd = _render_action_value(cwd, context)
+        env = _render_action_env(env, context)
+        if config_path:
+            env = dict(env or {})
+            env.setdefault("PKGMGR_CONFIG", config_path)
+        if extra_suffix:
+            cmd = "%s%s" % (cmd, extra_suffix)
+        status, rc = _run_cmd(
+            cmd, cwd=cwd, env=env, label=label, timeout=timeout, log_path=log_path, base_cwd=base[0], base_env=base[1]
+        )
+        results.append({"name": name, "status": status, "rc": rc})
+    return results
+
+
+def _log_path(log_dir, run_id, name):
+    safe = re.sub(r"[^A-Za-z0-9._-]+", "_", str(name))
+    return os.path.join(log_dir, "%s-%s.log" % (run_id, safe))
+
+
+def run_actions(cfg, names, extra_args=None, config_path=None, context=None, force=False):
+    """Run configured actions by name. Returns result list (force ignores input fingerprints)."""
+    actions = cfg.get("actions", {}) or {}
+    if not names:
+        print("[actions] no action names provided")
+        return []
+    extra_args = extra_args or []
+    extra_suffix = ""
+    if extra_args:
+        quoted = [shlex.quote(str(arg)) for arg in extra_args]
+        extra_suffix = " " + " ".join(quoted)
+    context = context or {}
+    names = [str(n) for n in names]
+    # taken before any module entry can chdir or touch os.environ
+    base = (os.getcwd(), os.environ.copy())
+
+    node_results = {}
+    specs = {}
+    for idx, name in enumerate(names):
+        entries = actions.get(name)
+        if not entries:
+            print("[actions] unknown action: %s" % name)
+            node_results[idx] = [{"name": name, "status": "missing", "rc": None}]
+            continue
+        if not isinstance(entries, (list, tuple, dict)):
+            print("[actions] invalid action format for %s" % name)
+            node_results[idx] = [{"name": name, "status": "invalid", "rc": None}]
+            continue
+        specs[idx] = _action_spec(entries)
+
+    order, deps = _order_nodes(names, specs)
+    max_workers, log_dir, default_timeout = _runner_settings(cfg)
+    run_id = time.strftime("%Y%m%dT%H%M%S", time.localtime())
+    use_pool = max_workers > 1 and sum(1 for s in specs.values() if s["parallel"]) > 1
+
+    def _blocked(idx):
+        failed = [
+            names[j]
+            for j in deps[idx]
+            if j in node_results and any(r["status"] not in _OK_STATUSES for r in node_results[j])
+        ]
+        if failed:
+            print("[actions] skip %s: dependency failed (%s)" % (names[idx], ", ".join(sorted(set(failed)))))
+            node_results[idx] = [{"name": names[idx], "status": "skipped", "rc": None}]
+            return True
+        return False
+
+    def _start(idx):
+        spec = specs[idx]
+        timeout = spec["timeout"] if spec["timeout"] is not None else default_timeout
+        log_path = None
+        if use_pool and spec["parallel"]:
+            if not os.path.isdir(log_dir):
+                os.makedirs(log_dir)
+            log_path = _log_path(log_dir, run_id, names[idx])
+        return _run_action(
+            names[idx],
+            spec,
+            cfg,
+            extra_args,
+            extra_suffix,
+            config_path,
+            context,
+            timeout,
+            log_path,
+            force=force,
+            base=base,
+        )
+
+    runnable = [idx for idx in order if idx in specs]
+    if not use_pool:
+        for idx in runnable:
+            if not _blocked(idx):
+                node_results[idx] = _start(idx)
+    else:
+        _run_graph(runnable, names, specs, deps, node_results, _blocked, _start, max_workers)
+
+    results = []
+    for idx in range(len(names)):
+        results.extend(node_results.get(idx) or [])
+    return results
+
+
+def _run_graph(runnable, names, specs, deps, node_results, blocked, start, max_workers):
+    """
+    Execute nodes on a thread pool. A node starts once its depends_on nodes
+    have finished; a non-parallel node additionally waits for everything
+    scheduled before it and holds back everything after it.
+    """
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    position = dict((idx, pos) for pos, idx in enumerate(runnable))
+    waits = {}
+    for idx in runnable:
+        before = [j for j in runnable if position[j] < position[idx]]
+        barrier = set(j for j in before if not specs[idx]["parallel"] or not specs[j]["parallel"])
+        waits[idx] = (deps[idx] & set(runnable)) | barrier
+
+    pending = list(runnable)
+    finished = set()
+    running = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            for idx in list(pending):
+                if not waits[idx] <= finished:
+                    continue
+                pending.remove(idx)
+                if blocked(idx):
+                    finished.add(idx)
+                    continue
+                running[pool.submit(start, idx)] = idx
+            if not running:
+                continue
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+            for future in done:
+                idx = running.pop(future)
+                try:
+                    node_results[idx] = future.result()
+                except Exception as e:
+                    print("[actions] error (%s): %s" % (names[idx], str(e)))
+                    node_results[idx] = [{"name": names[idx], "status": "failed", "rc": 1}]
+                finished.add(idx)
@@ -9,7 +9,10 @@ try:
 except Exception:
     argparse = None
 
-from . import config, snapshot, release, watch, __version__
+# only config is needed to build the parser; subcommand handlers import
+# release/snapshot/watch (tarfile, subprocess, collectors, ...) on demand so
+# short commands like --version, --help and `actions` stay cheap to start.
+from . import config, __version__
 
 
 def _add_make_config(sub):
@@ -46,6 +49,11 @@ def _add_snapshot(sub):
 
 def _add_actions(sub):
     p = sub.add_parser("actions", help="list actions or run a configured action")
+    p.add_argument(
+        "--force",
+        action="store_true",
+        help="run even if the action's declared inputs are unchanged",
+    )
     p.add_argument("name", nargs="?", help="action name to run (omit to list)")
     p.add_argument(
         "action_args",
@@ -175,6 +183,50 @@ def _add_point(sub):
     p.set_defaults(func=_handle_point)
 
 
+def _add_gc(sub):
+    p = sub.add_parser("gc", help="prune old updates/points/release history per retention policy")
+    p.add_argument("--pkg", action="append", dest="pkgs", help="limit gc to a package (repeatable)")
+    p.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="report what would be removed without deleting anything",
+    )
+    p.add_argument(
+        "--max-delete",
+        type=int,
+        default=None,
+        help="cap deletions for this run (default: gc.max_delete from config)",
+    )
+    p.add_argument(
+        "--config",
+        default=None,
+        help="config file path (default: auto-discover under %s)" % config.BASE_DIR,
+    )
+    p.set_defaults(func=_handle_gc)
+
+
+def _add_serve(sub):
+    p = sub.add_parser(
+        "serve", help="run a local daemon that keeps pkgmgr warm and answers CLI requests"
+    )
+    p.add_argument("--socket", default=None, help="unix socket path (default: <BASE_DIR>/run/pkgmgr.sock)")
+    p.add_argument("--watch", action="store_true", help="also run the watcher loop inside the daemon")
+    p.add_argument("--pkg", help="package id to scope the watcher (optional)")
+    p.add_argument(
+        "--auto-point",
+        action="store_true",
+        help="create a checkpoint automatically after watcher changes are handled",
+    )
+    p.add_argument("--status", action="store_true", help="report whether a daemon is listening and exit")
+    p.add_argument("--stop", action="store_true", help="ask a running daemon to exit")
+    p.add_argument(
+        "--config",
+        default=None,
+        help="config file path (default: auto-discover under %s)" % config.BASE_DIR,
+    )
+    p.set_defaults(func=_handle_serve)
+
+
 def build_parser():
     if argparse is None:
         raise RuntimeError("argparse not available; install argparse")
@@ -189,6 +241,18 @@ def build_parser():
         default=None,
         help="config file path (default: auto-discover under %s)" % config.BASE_DIR,
     )
+    parser.add_argument(
+        "--profile",
+        metavar="OUT",
+        default=None,
+        help="run the command under cProfile and write pstats to OUT (view: python -m pstats OUT)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="OUT.json",
+        default=None,
+        help="write Chrome trace-event spans (config, scan, git, hash, copy, tar, actions) to OUT.json",
+    )
     sub = parser.add_subparsers(dest="command")
 
     _add_make_config(sub)
@@ -197,6 +261,8 @@ def build_parser():
     _add_update_pkg(sub)
     _add_close_pkg(sub)
     _add_actions(sub)
+    _add_gc(sub)
+    _add_serve(sub)
     return parser
 
 
@@ -206,6 +272,8 @@ def _handle_make_config(args):
 
 
 def _handle_install(args):
+    from . import snapshot, release
+
     cfg = config.load_main(args.config)
     existing = []
     readme_path = os.path.join(config.BASE_DIR, "README.txt")
@@ -229,18 +297,24 @@ def _handle_install(args):
 
 
 def _handle_snapshot(args):
+    from . import snapshot
+
     cfg = config.load_main(args.config)
     snapshot.create_snapshot(cfg)
     return 0
 
 
 def _handle_create_pkg(args):
+    from . import release
+
     cfg = config.load_main(args.config)
     release.create_pkg(cfg, args.pkg_id)
     _run_auto_actions(cfg, "create_pkg", config_path=args.config, context={"pkg_id": args.pkg_id, "event": "create_pkg"})
     return 0
 
 def _handle_update_pkg(args):
+    from . import release
+
     cfg = config.load_main(args.config)
     if args.cancel_clean_history and not args.cancel:
         raise RuntimeError("--cancel-clean-history requires --cancel")
@@ -325,6 +399,8 @@ def _handle_update_pkg(args):
 
 
 def _handle_close_pkg(args):
+    from . import release
+
     cfg = config.load_main(args.config)
     release.close_pkg(cfg, args.pkg_id)
     _run_auto_actions(cfg, "close_pkg", config_path=args.config, context={"pkg_id": args.pkg_id, "event": "close_pkg"})
@@ -332,6 +408,8 @@ def _handle_close_pkg(args):
 
 
 def _handle_watch(args):
+    from . import watch
+
     cfg = config.load_main(args.config)
     watch.run(
         cfg,
@@ -344,11 +422,36 @@ def _handle_watch(args):
 
 
 def _handle_collect(args):
+    from . import release
+
     cfg = config.load_main(args.config)
     release.collect_for_pkg(cfg, args.pkg, args.collectors)
     return 0
 
 
+def _handle_gc(args):
+    from . import retention
+
+    cfg = config.load_main(args.config)
+    retention.run_gc(cfg, pkg_ids=args.pkgs, dry_run=args.dry_run, max_delete=args.max_delete)
+    return 0
+
+
+def _handle_serve(args):
+    from . import daemon
+
+    path = args.socket or daemon.socket_path()
+    if args.status:
+        running = daemon.ping(path)
+        print("[serve] %s on %s" % ("running" if running else "not running", path))
+        return 0 if running else 1
+    if args.stop:
+        return 0 if daemon.stop(path) else 1
+    watch_cfg = config.load_main(args.config) if args.watch else None
+    daemon.serve(path=path, watch_cfg=watch_cfg, watch_pkg=args.pkg, auto_point=args.auto_point)
+    return 0
+
+
 def _handle_actions(args):
     cfg = config.load_main(args.config)
     if not args.name:
@@ -358,8 +461,10 @@ def _handle_actions(args):
             return 0
         _print_actions(actions)
         return 0
+    from . import release
+
     release.run_actions(
-        cfg, [args.name], extra_args=args.action_args, config_path=args.config
+        cfg, [args.name], extra_args=args.action_args, config_path=args.config, force=args.force
     )
     return 0
 
@@ -369,6 +474,8 @@ def _run_auto_actions(cfg, event, config_path=None, context=None):
     names = auto_actions.get(event) or []
     if not names:
         return []
+    from . import release
+
     return release.run_actions(cfg, names, config_path=config_path, context=context)
 
 
@@ -377,7 +484,9 @@ def _print_actions(actions):
     print("[actions] available:")
     for idx, name in enumerate(ordered, 1):
         entries = actions.get(name) or []
-        if isinstance(entries, dict):
+        if isinstance(entries, dict) and "commands" in entries:
+            count = len(entries.get("commands") or [])
+        elif isinstance(entries, dict):
             count = 1
         else:
             count = len(entries)
@@ -385,6 +494,8 @@ def _print_actions(actions):
     return ordered
 
 def _handle_point(args):
+    from . import release
+
     cfg = config.load_main(args.config)
     if args.list:
         release.list_points(cfg, args.pkg)
@@ -395,6 +506,14 @@ def _handle_point(args):
 
 def main(argv=None):
     argv = argv if argv is not None else sys.argv[1:]
+    if argv:
+        from . import daemon
+
+        # hand the command to a running `pkgmgr serve` before doing any local work
+        if daemon.should_forward(argv):
+            rc = daemon.forward(argv)
+            if rc is not None:
+                return rc
     parser = build_parser()
     if not argv:
         parser.print_help()
@@ -404,11 +523,41 @@ def main(argv=None):
         parser.print_help()
         return 0
     try:
-        return args.func(args)
+        return _run_command(args)
     except RuntimeError as exc:
         print(str(exc), file=sys.stderr)
         return 1
 
 
+def _run_command(args):
+    """Run the subcommand, under cProfile and/or a trace when requested."""
+    if not args.profile and not args.trace:
+        return args.func(args)
+    import contextlib
+
+    from . import metrics
+
+    tracer = None
+    profiler = None
+    try:
+        with contextlib.ExitStack() as stack:
+            if args.trace:
+                tracer = stack.enter_context(metrics.tracing())
+            with metrics.phase("command", command=args.command):
+                if args.profile:
+                    import cProfile
+
+                    profiler = cProfile.Profile()
+                    return profiler.runcall(args.func, args)
+                return args.func(args)
+    finally:
+        if profiler is not None:
+            profiler.dump_stats(args.profile)
+            print("[profile] wrote %s (view: python -m pstats %s)" % (args.profile, args.profile), file=sys.stderr)
+        if tracer is not None:
+            spans = tracer.write(args.trace)
+            print("[trace] wrote %s (%d spans)" % (args.trace, spans), file=sys.stderr)
+
+
 if __name__ == "__main__":
     sys.exit(main())
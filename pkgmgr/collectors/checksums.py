@@ -4,6 +4,12 @@ from __future__ import print_function
 import hashlib
 import os
 
+try:
+    import zlib
+except Exception:
+    zlib = None
+
+from .. import metrics
 from .base import Collector, CollectorResult
 
 
@@ -24,12 +30,174 @@ class ChecksumsCollector(Collector):
         return res
 
 
+# (path, size, mtime_ns, inode) -> sha256; None unless a long-running process
+# (`pkgmgr serve`) opts in, since a cold CLI never hashes the same file twice.
+_cache = None
+_CACHE_MAX_ENTRIES = 200000
+
+
+def enable_cache():
+    global _cache
+    if _cache is None:
+        _cache = {}
+
+
+def disable_cache():
+    global _cache
+    _cache = None
+
+
 def sha256_of_file(path, chunk=1024 * 1024):
+    key = None
+    if _cache is not None:
+        st = os.stat(path)
+        key = (path, st.st_size, st.st_mtime_ns, st.st_ino)
+        hit = _cache.get(key)
+        if hit is not None:
+            metrics.count("hash.cache_hits")
+            return hit
     h = hashlib.sha256()
+    size = 0
+    with metrics.phase("hash"), open(path, "rb") as f:
+        while True:
+            b = f.read(chunk)
+            if not b:
+                break
+            size += len(b)
+            h.update(b)
+    metrics.count("hash.files")
+    metrics.count("hash.bytes", size)
+    digest = h.hexdigest()
+    if key is not None:
+        if len(_cache) >= _CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[key] = digest
+    return digest
+
+
+# POSIX `cksum` (coreutils default algorithm): MSB-first CRC-32, polynomial
+# 0x04C11DB7, init 0, the length appended as little-endian bytes, result
+# complemented. zlib.crc32 is the bit-reflected variant of the same polynomial,
+# so feeding it bit-reversed bytes and bit-reversing its register gives the
+# POSIX CRC at C speed; the byte table is the pure-Python fallback.
+_POSIX_POLY = 0x04C11DB7
+_BITREV = bytes(int("{:08b}".format(i)[::-1], 2) for i in range(256))
+_POSIX_TABLE = None
+
+
+def _posix_table():
+    global _POSIX_TABLE
+    if _POSIX_TABLE is None:
+        table = []
+        for i in range(256):
+            crc = i << 24
+            for _ in range(8):
+                crc = ((crc << 1) ^ _POSIX_POLY) if crc & 0x80000000 else (crc << 1)
+            table.append(crc & 0xFFFFFFFF)
+        _POSIX_TABLE = table
+    return _POSIX_TABLE
+
+
+def _rev32(value):
+    return int("{:032b}".format(value)[::-1], 2)
+
+
+def _length_bytes(length):
+    out = bytearray()
+    while length:
+        out.append(length & 0xFF)
+        length >>= 8
+    return bytes(out)
+
+
+class PosixCksum(object):
+    """Incremental POSIX cksum; update() with data, then digest() -> (crc, size)."""
+
+    def __init__(self):
+        self.size = 0
+        # zlib register (reflected domain) or the plain MSB-first register
+        self._state = 0xFFFFFFFF if zlib is not None else 0
+
+    def _feed(self, data):
+        if zlib is not None:
+            self._state = zlib.crc32(data.translate(_BITREV), self._state)
+            return
+        table = _posix_table()
+        crc = self._state
+        for byte in bytearray(data):
+            crc = ((crc << 8) & 0xFFFFFFFF) ^ table[((crc >> 24) ^ byte) & 0xFF]
+        self._state = crc
+
+    def update(self, data):
+        self.size += len(data)
+        self._feed(bytes(data))
+
+    def digest(self):
+        state = self._state
+        self._feed(_length_bytes(self.size))
+        if zlib is not None:
+            crc = _rev32(~self._state & 0xFFFFFFFF)
+        else:
+            crc = self._state
+        self._state = state
+        return (~crc & 0xFFFFFFFF), self.size
+
+
+def posix_cksum_bytes(data):
+    c = PosixCksum()
+    c.update(data)
+    return c.digest()
+
+
+def posix_cksum_of_file(path, chunk=1024 * 1024):
+    """Return (crc, size) exactly as printed by `cksum <path>`."""
+    c = PosixCksum()
     with open(path, "rb") as f:
+        while True:
+            b = f.read(chunk)
+            if not b:
+                break
+            c.update(b)
+    return c.digest()
+
+
+def file_digests(path, chunk=1024 * 1024):
+    """
+    One read pass over path -> {"sha256", "cksum", "size", "mtime_ns", "ino"}.
+    The stat is taken before reading, so a file modified mid-read no longer
+    matches the recorded stat and is recomputed by stat-checking consumers.
+    """
+    st = os.stat(path)
+    h = hashlib.sha256()
+    c = PosixCksum()
+    with metrics.phase("hash"), open(path, "rb") as f:
         while True:
             b = f.read(chunk)
             if not b:
                 break
             h.update(b)
-    return h.hexdigest()
+            c.update(b)
+    digest = h.hexdigest()
+    crc, size = c.digest()
+    metrics.count("hash.files")
+    metrics.count("hash.bytes", size)
+    if _cache is not None:
+        if len(_cache) >= _CACHE_MAX_ENTRIES:
+            _cache.clear()
+        _cache[(path, st.st_size, st.st_mtime_ns, st.st_ino)] = digest
+    return {"sha256": digest, "cksum": crc, "size": size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+
+
+def stat_matches(path, record):
+    """True when a recorded file_digests() entry still describes path on disk."""
+    if not isinstance(record, dict):
+        return False
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    return (
+        record.get("size") == st.st_size
+        and record.get("mtime_ns") == st.st_mtime_ns
+        and record.get("ino") in (None, st.st_ino)
+    )
@@ -2,10 +2,13 @@ from __future__ import print_function
 """Configuration helpers for the pkg manager scaffold."""
 
 import glob
+import hashlib
 import os
 import sys
 import textwrap
 
+from . import __version__, metrics
+
 # Default locations under the user's home directory.
 BASE_DIR = os.path.expanduser("~/pkgmgr")
 DEFAULT_CONFIG_DIR = os.path.join(BASE_DIR, "config")
@@ -18,10 +21,115 @@ HERE = os.path.dirname(os.path.abspath(__file__))
 TEMPLATE_DIR = os.path.join(HERE, "templates")
 
 
-try:
-    import yaml  # type: ignore
-except Exception:
-    yaml = None
+_yaml_module = False  # not imported yet; None once the import has failed
+
+
+def _yaml():
+    """Import PyYAML on first use (keeps CLI startup cheap). None if missing."""
+    global _yaml_module
+    if _yaml_module is False:
+        try:
+            import yaml  # type: ignore
+        except Exception:
+            yaml = None
+        _yaml_module = yaml
+    return _yaml_module
+
+
+def _safe_load(stream):
+    """yaml.safe_load, using the libyaml-backed CSafeLoader when available."""
+    yaml = _yaml()
+    loader = getattr(yaml, "CSafeLoader", None) or yaml.SafeLoader
+    return yaml.load(stream, Loader=loader)
+
+
+# Parsed/validated configs are pickled under DEFAULT_CACHE_DIR/config and
+# reused while the source file is unchanged (path + mtime + size + version).
+# Set PKGMGR_NO_CONFIG_CACHE=1 to always reparse.
+CONFIG_CACHE_ENV = "PKGMGR_NO_CONFIG_CACHE"
+# optional in-process layer over the pickle files; enabled by long-running
+# processes (`pkgmgr serve`) through enable_memo()
+_config_memo = None
+
+
+def enable_memo():
+    global _config_memo
+    if _config_memo is None:
+        _config_memo = {}
+
+
+def _config_cache_dir():
+    return os.path.join(DEFAULT_CACHE_DIR, "config")
+
+
+def _config_cache_key(kind, abs_path):
+    try:
+        st = os.stat(abs_path)
+    except OSError:
+        return None
+    return (__version__, kind, abs_path, st.st_mtime_ns, st.st_ctime_ns, st.st_size, st.st_ino)
+
+
+def _config_cache_path(kind, abs_path):
+    digest = hashlib.sha1(("%s\0%s" % (kind, abs_path)).encode("utf-8")).hexdigest()
+    return os.path.join(_config_cache_dir(), "%s-%s.pickle" % (kind, digest))
+
+
+def _read_config_cache(kind, abs_path):
+    if os.environ.get(CONFIG_CACHE_ENV):
+        return None
+    key = _config_cache_key(kind, abs_path)
+    if key is None:
+        return None
+    memo = _config_memo.get((kind, abs_path)) if _config_memo is not None else None
+    if memo is not None and memo[0] == key:
+        import copy
+
+        # callers may mutate the returned config; hand out a private copy
+        return copy.deepcopy(memo[1])
+    try:
+        import pickle
+
+        with open(_config_cache_path(kind, abs_path), "rb") as f:
+            cached = pickle.load(f)
+    except Exception:
+        return None
+    if not isinstance(cached, dict) or cached.get("key") != key:
+        return None
+    if _config_memo is not None:
+        import copy
+
+        _config_memo[(kind, abs_path)] = (key, copy.deepcopy(cached.get("data")))
+    return cached.get("data")
+
+
+def _write_config_cache(kind, abs_path, data):
+    if os.environ.get(CONFIG_CACHE_ENV):
+        return
+    key = _config_cache_key(kind, abs_path)
+    if key is None:
+        return
+    path = _config_cache_path(kind, abs_path)
+    tmp_path = "%s.tmp.%d" % (path, os.getpid())
+    try:
+        import pickle
+
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(tmp_path, "wb") as f:
+            pickle.dump({"key": key, "data": data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        if _config_memo is not None:
+            import copy
+
+            _config_memo[(kind, abs_path)] = (key, copy.deepcopy(data))
+    except Exception:
+        # the cache is an optimization only; never fail a command over it
+        if os.path.exists(tmp_path):
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
 
 
 MAIN_TEMPLATE = """\
@@ -69,21 +177,49 @@ actions:
     - cmd: python export_cksum.py --pkg-dir /path/to/pkg --excel /path/to/template.xlsx
       cwd: /app/script
       env: { APP_ENV: dev }
+  export_cksum_inproc:
+    # module: call <module>.main(args) inside pkgmgr (path = import root, default cwd)
+    - module: plugin.export_cksum
+      path: /app/pkgmgr
+      args: ["--pkg-id", "{pkg_id}", "--excel", "/path/to/template.xlsx"]
   export_world_dev:
-    - cmd: python dev_world.py
-      cwd: /app/script
+    # mapping form: parallel actions overlap on a pool; depends_on orders them
+    parallel: true
+    timeout: 600
+    # skip while release files and git hits are unchanged since the last success
+    inputs: { releases: true, update: [git, checksums] }
+    commands:
+      - cmd: python dev_world.py
+        cwd: /app/script
   export_world_security:
-    - cmd: python security_world.py
-      cwd: /app/script
+    parallel: true
+    commands:
+      - cmd: python security_world.py
+        cwd: /app/script
   noti_email:
-    - cmd: sh noti_email.sh
-      cwd: /app/script
+    depends_on: [export_world_dev, export_world_security]
+    commands:
+      - cmd: sh noti_email.sh
+        cwd: /app/script
+
+action_runner:
+  max_workers: 4
+  log_dir: null      # default: ~/pkgmgr/local/state/actions/logs
+  timeout_sec: null  # default per-command timeout
 
 auto_actions:
   create_pkg: []
   update_pkg: []
   update_pkg_release: []
   close_pkg: []
+
+gc:
+  # retention for `pkgmgr gc`; null disables a rule, all null keeps everything
+  updates: { keep_last: 50, keep_daily: 30, keep_weekly: 12 }
+  points: { keep_last: 20, keep_daily: 14, keep_weekly: 8 }
+  history: { keep_last: null, keep_daily: null, keep_weekly: null }
+  max_delete: 500   # deletions per run; rerun gc to continue
+  cache_max_age_days: 30   # drop source review diff cache entries unused this long; null keeps them
 """
 
 PKG_TEMPLATE = """\
@@ -114,6 +250,7 @@ MAIN_DEFAULTS = {
     "watch": {"interval_sec": 60, "on_change": []},
     "collectors": {"enabled": ["checksums"]},
     "actions": {},
+    "action_runner": {"max_workers": 4, "log_dir": None, "timeout_sec": None},
     "auto_actions": {
         "create_pkg": [],
         "update_pkg": [],
@@ -121,6 +258,13 @@ MAIN_DEFAULTS = {
         "cancel_pkg_release": [],
         "close_pkg": [],
     },
+    "gc": {
+        "updates": {"keep_last": 50, "keep_daily": 30, "keep_weekly": 12},
+        "points": {"keep_last": 20, "keep_daily": 14, "keep_weekly": 8},
+        "history": {"keep_last": None, "keep_daily": None, "keep_weekly": None},
+        "max_delete": 500,
+        "cache_max_age_days": 30,
+    },
 }
 
 
@@ -161,16 +305,103 @@ def _validate_actions(actions):
         raise RuntimeError("actions must be a mapping of name -> command list")
     validated = {}
     for name, entry in actions.items():
-        if isinstance(entry, dict):
+        spec = None
+        if isinstance(entry, dict) and "commands" in entry:
+            spec = _validate_action_spec(name, entry)
+            commands = spec["commands"]
+        elif isinstance(entry, dict):
             commands = [entry]
         elif isinstance(entry, (list, tuple)):
             commands = list(entry)
         else:
             raise RuntimeError("action %s must be a mapping or list" % name)
-        validated[name] = commands
+        if spec is not None and spec["timeout"] is not None and all(
+            isinstance(command, dict) and "module" in command for command in commands
+        ):
+            # module entries run inside pkgmgr and can't be killed on a deadline
+            raise RuntimeError("action %s: timeout does not apply to module entries" % name)
+        for command in commands:
+            if isinstance(command, dict) and "module" in command:
+                if not command.get("module") or not isinstance(command.get("module"), str):
+                    raise RuntimeError("action %s: module must be a dotted module name" % name)
+                if command.get("args") is not None and not isinstance(command.get("args"), (str, list)):
+                    raise RuntimeError("action %s: args must be a string or list" % name)
+        validated[name] = spec if spec is not None else commands
     return validated
 
 
+def _optional_seconds(value, field):
+    if value is None:
+        return None
+    try:
+        seconds = float(value)
+    except Exception:
+        raise RuntimeError("%s must be a positive number of seconds or null" % field)
+    if seconds <= 0:
+        raise RuntimeError("%s must be a positive number of seconds or null" % field)
+    return seconds
+
+
+def _validate_action_spec(name, entry):
+    commands = entry.get("commands")
+    if isinstance(commands, dict):
+        commands = [commands]
+    if not isinstance(commands, (list, tuple)) or not commands:
+        raise RuntimeError("action %s: commands must be a non-empty list" % name)
+    return {
+        "commands": list(commands),
+        "depends_on": _ensure_list_of_strings(entry.get("depends_on"), "actions.%s.depends_on" % name),
+        "parallel": bool(entry.get("parallel")),
+        "timeout": _optional_seconds(entry.get("timeout"), "actions.%s.timeout" % name),
+        "inputs": _validate_action_inputs(name, entry.get("inputs")),
+    }
+
+
+# update record parts an action can declare as inputs (header git/release + sidecars)
+ACTION_UPDATE_INPUTS = ("git", "release", "commits", "checksums", "bundle_files")
+
+
+def _validate_action_inputs(name, inputs):
+    if inputs is None:
+        return None
+    if not isinstance(inputs, dict):
+        raise RuntimeError("action %s: inputs must be a mapping" % name)
+    releases = inputs.get("releases")
+    if releases is not None and not isinstance(releases, bool):
+        releases = _ensure_list_of_strings(releases, "actions.%s.inputs.releases" % name)
+    update = _ensure_list_of_strings(inputs.get("update"), "actions.%s.inputs.update" % name)
+    for section in update:
+        if section not in ACTION_UPDATE_INPUTS:
+            raise RuntimeError(
+                "action %s: unknown update input %s (expected one of %s)"
+                % (name, section, ", ".join(ACTION_UPDATE_INPUTS))
+            )
+    validated = {
+        "releases": releases or False,
+        "update": update,
+        "paths": _ensure_list_of_strings(inputs.get("paths"), "actions.%s.inputs.paths" % name),
+    }
+    return validated if any(validated.values()) else None
+
+
+def _validate_action_runner(runner_cfg):
+    runner = runner_cfg if isinstance(runner_cfg, dict) else {}
+    defaults = MAIN_DEFAULTS["action_runner"]
+    max_workers = runner.get("max_workers", defaults["max_workers"])
+    try:
+        max_workers = int(max_workers)
+        if max_workers <= 0:
+            raise ValueError
+    except Exception:
+        raise RuntimeError("action_runner.max_workers must be a positive integer")
+    log_dir = runner.get("log_dir")
+    return {
+        "max_workers": max_workers,
+        "log_dir": str(log_dir) if log_dir else None,
+        "timeout_sec": _optional_seconds(runner.get("timeout_sec"), "action_runner.timeout_sec"),
+    }
+
+
 def _validate_watch(watch_cfg):
     watch = watch_cfg if isinstance(watch_cfg, dict) else {}
     interval = watch.get("interval_sec", MAIN_DEFAULTS["watch"]["interval_sec"])
@@ -195,6 +426,32 @@ def _validate_auto_actions(auto_actions):
     }
 
 
+def _optional_count(value, field):
+    if value is None:
+        return None
+    try:
+        count = int(value)
+    except Exception:
+        raise RuntimeError("%s must be a non-negative integer or null" % field)
+    if count < 0:
+        raise RuntimeError("%s must be a non-negative integer or null" % field)
+    return count
+
+
+def _validate_gc(gc_cfg):
+    cfg = gc_cfg if isinstance(gc_cfg, dict) else {}
+    validated = {}
+    for kind in ("updates", "points", "history"):
+        policy = cfg.get(kind) if isinstance(cfg.get(kind), dict) else {}
+        validated[kind] = {
+            key: _optional_count(policy.get(key), "gc.%s.%s" % (kind, key))
+            for key in ("keep_last", "keep_daily", "keep_weekly")
+        }
+    validated["max_delete"] = _optional_count(cfg.get("max_delete"), "gc.max_delete")
+    validated["cache_max_age_days"] = _optional_count(cfg.get("cache_max_age_days"), "gc.cache_max_age_days")
+    return validated
+
+
 def _validate_main_config(data):
     if not isinstance(data, dict):
         raise RuntimeError("main config must be a mapping")
@@ -233,7 +490,9 @@ def _validate_main_config(data):
     }
 
     cfg["actions"] = _validate_actions(cfg.get("actions"))
+    cfg["action_runner"] = _validate_action_runner(cfg.get("action_runner"))
     cfg["auto_actions"] = _validate_auto_actions(cfg.get("auto_actions"))
+    cfg["gc"] = _validate_gc(cfg.get("gc"))
 
     return cfg
 
@@ -278,6 +537,7 @@ def write_pkg_template(path, pkg_id=None, pkg_root=None, include_releases=None,
     if parent and not os.path.exists(parent):
         os.makedirs(parent)
 
+    yaml = _yaml()
     if pkg_id is None or pkg_root is None or yaml is None:
         content = _load_template_file("pkg.yaml.sample", PKG_TEMPLATE)
         with open(target, "w") as f:
@@ -301,13 +561,20 @@ def write_pkg_template(path, pkg_id=None, pkg_root=None, include_releases=None,
 
 def load_pkg_config(path):
     """Load a pkg.yaml file."""
+    yaml = _yaml()
     if yaml is None:
         raise RuntimeError("PyYAML not installed; cannot read %s" % path)
     abs_path = os.path.abspath(os.path.expanduser(path))
     if not os.path.exists(abs_path):
         raise RuntimeError("pkg config not found: %s" % abs_path)
-    with open(abs_path, "r") as f:
-        return yaml.safe_load(f) or {}
+    with metrics.phase("config", path=abs_path):
+        cached = _read_config_cache("pkg", abs_path)
+        if cached is not None:
+            return cached
+        with open(abs_path, "r") as f:
+            data = _safe_load(f) or {}
+        _write_config_cache("pkg", abs_path, data)
+    return data
 
 
 def discover_main_configs(base_dir=None):
@@ -389,6 +656,7 @@ def load_main(path=None, base_dir=None, allow_interactive=True):
     path = resolve_main_config(
         path=path, base_dir=base_dir, allow_interactive=allow_interactive
     )
+    yaml = _yaml()
     if yaml is None:
         raise RuntimeError(
             "PyYAML not installed; install it or keep using templates manually"
@@ -396,9 +664,15 @@ def load_main(path=None, base_dir=None, allow_interactive=True):
     abs_path = os.path.abspath(path)
     if not os.path.exists(abs_path):
         raise RuntimeError("config not found: %s" % abs_path)
-    with open(abs_path, "r", encoding="utf-8") as f:
-        data = yaml.safe_load(f) or {}
-    return _validate_main_config(data)
+    with metrics.phase("config", path=abs_path):
+        cached = _read_config_cache("main", abs_path)
+        if cached is not None:
+            return cached
+        with open(abs_path, "r", encoding="utf-8") as f:
+            data = _safe_load(f) or {}
+        cfg = _validate_main_config(data)
+        _write_config_cache("main", abs_path, cfg)
+    return cfg
 
 
 def describe_expected_fields():
@@ -417,8 +691,16 @@ def describe_expected_fields():
           - cmd: shell command string (required, often relative to cwd)
           - cwd: working directory (optional)
           - env: key/value env overrides for that command only (optional)
+          - or module/args/path: run <module>.main(args) in-process instead of cmd
+          or a mapping {commands: [...], depends_on: [...], parallel: bool, timeout: sec (cmd entries only),
+          inputs: {releases, update, paths}} (inputs: skip while unchanged since last success)
+        action_runner.max_workers/log_dir/timeout_sec: pool size, log dir for parallel
+          actions (default: <state>/actions/logs) and default per-command timeout
         auto_actions: mapping of lifecycle events to action names (create_pkg/update_pkg/update_pkg_release/close_pkg)
         git.repo_url: base repository URL for commit links (per system)
         git.keyword_prefix: commit prefix used with git.keywords (e.g. "DEV-CODE:")
+        gc.updates/points/history: retention (keep_last/keep_daily/keep_weekly; null = no rule)
+        gc.max_delete: cap on deletions per `pkgmgr gc` run (null = unlimited)
+        gc.cache_max_age_days: prune source review diff cache entries unused for N days (null = keep)
         """
     ).strip()
@@ -0,0 +1,296 @@
+from __future__ import print_function
+"""Bounded-concurrency file copy engine shared by the export plugins.
+
+Files are copied on a fixed pool of worker threads through the cheapest path
+the kernel offers: copy_file_range (in-kernel, server-side on NFS 4.2 and
+reflink-aware on some filesystems), then sendfile, then a pread/pwrite loop.
+Files larger than the chunk size are split into ranges copied by several
+workers at once; the last range to finish renames the temp file into place.
+When a sha256 is wanted the source is read once more for it, after the copy of
+a small file or alongside the ranges of a chunked one, so hashed copies keep
+the kernel copy paths.
+"""
+
+import errno
+import hashlib
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+DEFAULT_WORKERS = 4
+DEFAULT_CHUNK_SIZE = 64 * 1024 * 1024
+_IO_BLOCK = 1024 * 1024
+# errors that mean "this syscall cannot do this copy", not "the copy failed"
+_FALLBACK_ERRNOS = (errno.ENOSYS, errno.EXDEV, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF)
+_disabled = set()
+
+
+def _copy_file_range(src_fd, dst_fd, offset, length):
+    done = 0
+    while done < length:
+        n = os.copy_file_range(src_fd, dst_fd, length - done, offset + done, offset + done)
+        if n == 0:
+            break
+        done += n
+    return done
+
+
+def _sendfile(src_fd, dst_fd, offset, length):
+    # sendfile writes at the destination's file position
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    done = 0
+    while done < length:
+        n = os.sendfile(dst_fd, src_fd, offset + done, min(length - done, 0x7FFFF000))
+        if n == 0:
+            break
+        done += n
+    return done
+
+
+def _pread_pwrite(src_fd, dst_fd, offset, length):
+    done = 0
+    while done < length:
+        data = os.pread(src_fd, min(_IO_BLOCK, length - done), offset + done)
+        if not data:
+            break
+        view = memoryview(data)
+        while view:
+            written = os.pwrite(dst_fd, view, offset + done)
+            view = view[written:]
+            done += written
+    return done
+
+
+_METHODS = (
+    ("copy_file_range", _copy_file_range, hasattr(os, "copy_file_range")),
+    ("sendfile", _sendfile, hasattr(os, "sendfile")),
+    ("pread", _pread_pwrite, True),
+)
+
+
+def copy_range(src_fd, dst_fd, offset, length):
+    """Copy [offset, offset+length) between open fds; returns the method used."""
+    for name, func, available in _METHODS:
+        if not available or name in _disabled:
+            continue
+        try:
+            done = func(src_fd, dst_fd, offset, length)
+        except OSError as exc:
+            if exc.errno not in _FALLBACK_ERRNOS or name == "pread":
+                raise
+            if exc.errno == errno.ENOSYS:
+                _disabled.add(name)
+            continue
+        if done != length:
+            raise RuntimeError("short copy: %d of %d bytes" % (done, length))
+        return name
+    raise RuntimeError("no copy method available")
+
+
+class CopyStats(object):
+    """Per-run totals; updated from worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.files = 0
+        self.bytes = 0
+        self.chunks = 0
+        self.hashed = 0
+        self.hashed_bytes = 0
+        self.methods = {}
+
+    def add(self, nbytes, method, files=0):
+        with self.lock:
+            self.files += files
+            self.bytes += nbytes
+            self.chunks += 1
+            self.methods[method] = self.methods.get(method, 0) + 1
+
+    def add_hash(self, nbytes):
+        with self.lock:
+            self.hashed += 1
+            self.hashed_bytes += nbytes
+
+    def elapsed(self):
+        return time.time() - self.started
+
+    def summary(self):
+        elapsed = max(self.elapsed(), 1e-6)
+        methods = " ".join("%s=%d" % item for item in sorted(self.methods.items()))
+        # the rate covers the sha256 reads too; hashed= says how much of it that was
+        return "files=%d bytes=%d chunks=%d hashed=%d hashed_bytes=%d elapsed=%.2fs rate=%.1f MB/s%s" % (
+            self.files,
+            self.bytes,
+            self.chunks,
+            self.hashed,
+            self.hashed_bytes,
+            elapsed,
+            self.bytes / elapsed / (1024.0 * 1024.0),
+            (" " + methods) if methods else "",
+        )
+
+
+class _PendingFile(object):
+    """
+    Countdown over the jobs of one chunked file (its ranges, plus the source
+    hash when wanted); the last job to finish finalizes it.
+    """
+
+    def __init__(self, src, dst, tmp, jobs, future):
+        self.src = src
+        self.dst = dst
+        self.tmp = tmp
+        self.remaining = jobs
+        self.future = future
+        self.lock = threading.Lock()
+        self.error = None
+        self.digest = None
+
+    def range_done(self, error=None, digest=None):
+        with self.lock:
+            if error is not None and self.error is None:
+                self.error = error
+            if digest is not None:
+                self.digest = digest
+            self.remaining -= 1
+            last = self.remaining == 0
+        if not last:
+            return
+        if self.error is None:
+            try:
+                shutil.copystat(self.src, self.tmp)
+                os.replace(self.tmp, self.dst)
+            except Exception as exc:
+                self.error = exc
+        if self.error is not None:
+            _remove_quietly(self.tmp)
+            self.future.set_exception(self.error)
+        else:
+            self.future.set_result(self.digest)
+
+
+def _remove_quietly(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _temp_path(dst):
+    return "%s.tmp-%d-%d" % (dst, os.getpid(), threading.current_thread().ident or 0)
+
+
+def _ensure_parent(dst):
+    parent = os.path.dirname(dst)
+    if parent and not os.path.isdir(parent):
+        try:
+            os.makedirs(parent)
+        except OSError:
+            if not os.path.isdir(parent):
+                raise
+
+
+class CopyEngine(object):
+    """
+    Copy files on a bounded thread pool. submit() returns a Future resolving to
+    the sha256 hex digest when with_hash is set, else None. Destinations are
+    written to a temp name and renamed into place, with metadata copied like
+    shutil.copy2. Use as a context manager or call close() to wait for all copies.
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.workers = max(1, int(workers or 1))
+        self.chunk_size = max(_IO_BLOCK, int(chunk_size or DEFAULT_CHUNK_SIZE))
+        self.stats = CopyStats()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        return False
+
+    def close(self):
+        self._pool.shutdown(wait=True)
+
+    def submit(self, src, dst, with_hash=False):
+        size = os.path.getsize(src)
+        if size <= self.chunk_size or self.workers == 1:
+            return self._pool.submit(self._copy_whole, src, dst, size, with_hash)
+        return self._submit_chunked(src, dst, size, with_hash)
+
+    def copy_many(self, pairs, with_hash=False):
+        """Copy (src, dst) pairs; returns {dst: sha256-or-None}, raising the first error."""
+        futures = [(dst, self.submit(src, dst, with_hash=with_hash)) for src, dst in pairs]
+        return dict((dst, future.result()) for dst, future in futures)
+
+    def _copy_whole(self, src, dst, size, with_hash):
+        _ensure_parent(dst)
+        tmp = _temp_path(dst)
+        try:
+            with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+                method = copy_range(fsrc.fileno(), fdst.fileno(), 0, size) if size else "empty"
+            digest = self._hash_source(src) if with_hash else None
+            shutil.copystat(src, tmp)
+            os.replace(tmp, dst)
+        except BaseException:
+            _remove_quietly(tmp)
+            raise
+        self.stats.add(size, method, files=1)
+        return digest
+
+    def _hash_source(self, src):
+        h = hashlib.sha256()
+        size = 0
+        with open(src, "rb") as f:
+            for data in iter(lambda: f.read(_IO_BLOCK), b""):
+                h.update(data)
+                size += len(data)
+        self.stats.add_hash(size)
+        return h.hexdigest()
+
+    def _submit_chunked(self, src, dst, size, with_hash=False):
+        _ensure_parent(dst)
+        tmp = _temp_path(dst)
+        with open(tmp, "wb") as fdst:
+            fdst.truncate(size)
+        offsets = list(range(0, size, self.chunk_size))
+        future = Future()
+        future.set_running_or_notify_cancel()
+        pending = _PendingFile(src, dst, tmp, len(offsets) + (1 if with_hash else 0), future)
+        if with_hash:
+            # queued first so the sequential read overlaps the range copies
+            self._pool.submit(self._hash_job, pending)
+        for index, offset in enumerate(offsets):
+            length = min(self.chunk_size, size - offset)
+            self._pool.submit(self._copy_chunk, pending, offset, length, index == 0)
+        return future
+
+    def _hash_job(self, pending):
+        try:
+            digest = self._hash_source(pending.src)
+        except Exception as exc:
+            pending.range_done(exc)
+            return
+        pending.range_done(digest=digest)
+
+    def _copy_chunk(self, pending, offset, length, first):
+        error = None
+        try:
+            src_fd = os.open(pending.src, os.O_RDONLY)
+            try:
+                dst_fd = os.open(pending.tmp, os.O_WRONLY)
+                try:
+                    method = copy_range(src_fd, dst_fd, offset, length)
+                finally:
+                    os.close(dst_fd)
+            finally:
+                os.close(src_fd)
+            self.stats.add(length, method, files=1 if first else 0)
+        except Exception as exc:
+            error = exc
+        pending.range_done(error)
@@ -0,0 +1,353 @@
+from __future__ import print_function
+"""Long-running `pkgmgr serve` daemon and the CLI side that forwards to it.
+
+The daemon keeps one warm interpreter (imported modules, config memo, sha256
+and git commit-info caches, optional watcher thread) and answers CLI requests
+over a Unix domain socket. Protocol: the client sends one JSON line
+{"argv", "cwd", "env", "tty"}; the daemon streams back {"out": text} /
+{"err": text} lines and finishes with {"rc": code}. Requests are served one at
+a time because a command owns the process-wide stdout/cwd/environ while it runs.
+"""
+
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+
+from . import config
+
+NO_DAEMON_ENV = "PKGMGR_NO_DAEMON"
+# commands that never prompt and are safe to run inside the daemon
+FORWARD_COMMANDS = ("update-pkg", "close-pkg", "actions", "gc")
+_MAX_REQUEST_BYTES = 4 * 1024 * 1024
+# global options that take a separate value argument
+_VALUE_OPTIONS = ("--config", "--profile", "--trace")
+
+
+def socket_path():
+    return os.path.join(config.BASE_DIR, "run", "pkgmgr.sock")
+
+
+def _command_of(argv):
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg in _VALUE_OPTIONS:
+            skip_next = True
+            continue
+        if arg.startswith("-"):
+            continue
+        return arg
+    return None
+
+
+def should_forward(argv):
+    """True when argv is a non-interactive command the daemon can run."""
+    if os.environ.get(NO_DAEMON_ENV):
+        return False
+    command = _command_of(argv)
+    if command not in FORWARD_COMMANDS:
+        return False
+    if any(a in ("--profile", "--trace") or a.startswith(("--profile=", "--trace=")) for a in argv):
+        # profile/trace the local process, not a daemon round-trip
+        return False
+    if command == "update-pkg":
+        if "--cancel" in argv:
+            return False
+        if "--release" in argv and "--root" not in argv:
+            return False
+    if sys.stdin.isatty() and not any(a == "--config" or a.startswith("--config=") for a in argv):
+        # several configs would trigger the interactive picker; keep that local
+        if len(config.discover_main_configs()) > 1:
+            return False
+    return True
+
+
+def _connect(path, timeout=None):
+    if not os.path.exists(path):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    if timeout is not None:
+        sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except (OSError, socket.error):
+        sock.close()
+        return None
+    return sock
+
+
+def _send(sock, payload):
+    sock.sendall((json.dumps(payload, ensure_ascii=False) + "\n").encode("utf-8"))
+
+
+def _read_messages(sock):
+    buf = b""
+    while True:
+        chunk = sock.recv(65536)
+        if not chunk:
+            break
+        buf += chunk
+        while b"\n" in buf:
+            line, buf = buf.split(b"\n", 1)
+            if line.strip():
+                yield json.loads(line.decode("utf-8"))
+
+
+def forward(argv, path=None):
+    """
+    Run argv in the daemon when one is listening. Returns its exit code, or
+    None when no daemon is available and the caller should run locally.
+    """
+    sock = _connect(path or socket_path(), timeout=0.5)
+    if sock is None:
+        return None
+    sock.settimeout(None)
+    try:
+        _send(
+            sock,
+            {
+                "argv": list(argv),
+                "cwd": os.getcwd(),
+                "env": dict(os.environ),
+                "tty": sys.stdout.isatty(),
+            },
+        )
+        rc = None
+        for msg in _read_messages(sock):
+            if "out" in msg:
+                sys.stdout.write(msg["out"])
+                sys.stdout.flush()
+            elif "err" in msg:
+                sys.stderr.write(msg["err"])
+                sys.stderr.flush()
+            elif "rc" in msg:
+                rc = msg["rc"]
+                break
+    finally:
+        sock.close()
+    if rc is None:
+        print("[serve] daemon closed the connection without a result", file=sys.stderr)
+        return 1
+    return rc
+
+
+def ping(path=None):
+    sock = _connect(path or socket_path(), timeout=1.0)
+    if sock is None:
+        return False
+    try:
+        _send(sock, {"op": "ping"})
+        for msg in _read_messages(sock):
+            return msg.get("rc") == 0
+    except Exception:
+        return False
+    finally:
+        sock.close()
+    return False
+
+
+def stop(path=None):
+    sock = _connect(path or socket_path(), timeout=5.0)
+    if sock is None:
+        print("[serve] no daemon listening on %s" % (path or socket_path()))
+        return False
+    try:
+        _send(sock, {"op": "stop"})
+        for _ in _read_messages(sock):
+            break
+    finally:
+        sock.close()
+    print("[serve] stop requested")
+    return True
+
+
+class _StreamWriter(object):
+    """File-like stdout/stderr replacement that streams writes to the client."""
+
+    def __init__(self, sock, key, tty=False):
+        self._sock = sock
+        self._key = key
+        self._tty = tty
+        self.encoding = "utf-8"
+
+    def write(self, text):
+        if not text:
+            return 0
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", errors="replace")
+        try:
+            _send(self._sock, {self._key: text})
+        except (OSError, socket.error):
+            # client went away; keep running the command to completion
+            pass
+        return len(text)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return self._tty
+
+
+def _apply_tz():
+    # localtime() only sees a changed TZ once tzset() rereads it
+    if hasattr(time, "tzset"):
+        time.tzset()
+
+
+class Server(object):
+    def __init__(self, path=None, watch_cfg=None, watch_pkg=None, auto_point=False):
+        self.path = path or socket_path()
+        self.watch_cfg = watch_cfg
+        self.watch_pkg = watch_pkg
+        self.auto_point = auto_point
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.served = 0
+
+    def _bind(self):
+        parent = os.path.dirname(self.path)
+        if parent and not os.path.isdir(parent):
+            os.makedirs(parent, 0o700)
+        if os.path.exists(self.path):
+            if ping(self.path):
+                raise RuntimeError("pkgmgr daemon already running on %s" % self.path)
+            os.remove(self.path)
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        # the socket must never exist with looser permissions, even briefly
+        old_umask = os.umask(0o177)
+        try:
+            sock.bind(self.path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.path, 0o600)
+        sock.listen(16)
+        sock.settimeout(0.5)
+        return sock
+
+    def _warm_up(self):
+        from . import cli, release  # noqa: F401  (import once, reuse for every request)
+        from .collectors import checksums
+
+        checksums.enable_cache()
+        config.enable_memo()
+
+    def serve_forever(self):
+        listener = self._bind()
+        self._warm_up()
+        watcher = None
+        if self.watch_cfg is not None:
+            watcher = threading.Thread(target=self._watch_loop, name="pkgmgr-watch")
+            watcher.daemon = True
+            watcher.start()
+        print("[serve] listening on %s (pid=%d)" % (self.path, os.getpid()))
+        sys.stdout.flush()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    conn, _ = listener.accept()
+                except socket.timeout:
+                    continue
+                except KeyboardInterrupt:
+                    break
+                try:
+                    conn.settimeout(None)
+                    self._handle(conn)
+                except Exception as exc:
+                    print("[serve] request failed: %s" % str(exc))
+                finally:
+                    conn.close()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stopping.set()
+            listener.close()
+            if os.path.exists(self.path):
+                os.remove(self.path)
+            print("[serve] stopped after %d request(s)" % self.served)
+
+    def _read_request(self, conn):
+        buf = b""
+        while b"\n" not in buf:
+            chunk = conn.recv(65536)
+            if not chunk:
+                break
+            buf += chunk
+            if len(buf) > _MAX_REQUEST_BYTES:
+                raise RuntimeError("request too large")
+        line = buf.split(b"\n", 1)[0]
+        return json.loads(line.decode("utf-8")) if line.strip() else None
+
+    def _handle(self, conn):
+        request = self._read_request(conn)
+        if not isinstance(request, dict):
+            return
+        op = request.get("op")
+        if op == "ping":
+            _send(conn, {"rc": 0, "pid": os.getpid(), "served": self.served})
+            return
+        if op == "stop":
+            self.stopping.set()
+            _send(conn, {"rc": 0})
+            return
+        argv = [str(a) for a in request.get("argv") or []]
+        with self.lock:
+            rc = self._run(conn, argv, request)
+            self.served += 1
+        _send(conn, {"rc": rc})
+
+    def _run(self, conn, argv, request):
+        from . import cli
+
+        saved = (sys.stdout, sys.stderr, sys.stdin, os.getcwd(), dict(os.environ))
+        tty = bool(request.get("tty"))
+        env = dict(request.get("env") or saved[4])
+        # actions that call back into pkgmgr must not queue behind this request
+        env[NO_DAEMON_ENV] = "1"
+        try:
+            os.environ.clear()
+            os.environ.update(env)
+            _apply_tz()
+            os.chdir(request.get("cwd") or saved[3])
+            sys.stdout = _StreamWriter(conn, "out", tty=tty)
+            sys.stderr = _StreamWriter(conn, "err", tty=tty)
+            sys.stdin = io.StringIO("")
+            try:
+                rc = cli.main(argv)
+            except SystemExit as exc:
+                rc = exc.code if isinstance(exc.code, int) else (0 if exc.code is None else 1)
+            except Exception:
+                sys.stderr.write(traceback.format_exc())
+                rc = 1
+        finally:
+            sys.stdout, sys.stderr, sys.stdin = saved[0], saved[1], saved[2]
+            os.chdir(saved[3])
+            os.environ.clear()
+            os.environ.update(saved[4])
+            _apply_tz()
+        return rc if rc is not None else 0
+
+    def _watch_loop(self):
+        from . import watch
+
+        interval = (self.watch_cfg.get("watch") or {}).get("interval_sec", 60)
+        print("[serve] watcher enabled interval=%ss pkg=%s" % (interval, self.watch_pkg))
+        while not self.stopping.wait(interval):
+            with self.lock:
+                try:
+                    watch._tick(self.watch_cfg, pkg_id=self.watch_pkg, auto_point=self.auto_point)
+                except Exception as exc:
+                    print("[serve] watcher tick failed: %s" % str(exc))
+
+
+def serve(path=None, watch_cfg=None, watch_pkg=None, auto_point=False):
+    server = Server(path=path, watch_cfg=watch_cfg, watch_pkg=watch_pkg, auto_point=auto_point)
+    server.serve_forever()
+    return server
@@ -0,0 +1,192 @@
+from __future__ import print_function
+"""Lightweight per-run phase timers and counters.
+
+A command opens a Recorder with `recording()`; code anywhere below it marks
+work with `with metrics.phase("hash"):` and `metrics.count("hash.bytes", n)`.
+Both are no-ops when nothing is recording or tracing, so library calls made
+outside a command pay one global lookup.
+
+Phase times are exclusive: time spent in a nested phase is charged to the
+inner phase only, so the phases of one run add up to (at most) its wall time.
+
+`tracing()` additionally turns every phase into a Chrome trace-event span
+(load the written JSON in chrome://tracing or https://ui.perfetto.dev).
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_active = None
+_tracer = None
+_local = threading.local()
+# beyond this many spans a trace only counts what it dropped
+MAX_TRACE_EVENTS = 1000000
+
+
+class Recorder(object):
+    def __init__(self):
+        self.started = time.time()
+        self.phases = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        """JSON-ready snapshot: {"elapsed_sec", "phases": {name: sec}, "counters": {name: n}}."""
+        with self._lock:
+            return {
+                "elapsed_sec": round(time.time() - self.started, 3),
+                "phases": dict((name, round(sec, 3)) for name, sec in self.phases.items()),
+                "counters": dict(self.counters),
+            }
+
+
+class Tracer(object):
+    """Collects complete ("X") trace events; timestamps are microseconds from start."""
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.origin = time.perf_counter()
+        self.events = []
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def span(self, name, started, elapsed, args=None):
+        event = {
+            "name": name,
+            "cat": "pkgmgr",
+            "ph": "X",
+            "ts": round((started - self.origin) * 1e6, 1),
+            "dur": round(elapsed * 1e6, 1),
+            "pid": self.pid,
+            "tid": threading.current_thread().ident or 0,
+        }
+        if args:
+            event["args"] = args
+        with self._lock:
+            if len(self.events) >= MAX_TRACE_EVENTS:
+                self.dropped += 1
+                return
+            self.events.append(event)
+
+    def write(self, path):
+        with self._lock:
+            events = list(self.events)
+            dropped = self.dropped
+        names = [
+            {"name": "thread_name", "ph": "M", "pid": self.pid, "tid": thread.ident, "args": {"name": thread.name}}
+            for thread in threading.enumerate()
+            if thread.ident is not None
+        ]
+        payload = {"traceEvents": names + events, "displayTimeUnit": "ms", "otherData": {"dropped_events": dropped}}
+        tmp_path = "%s.tmp.%d" % (path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(payload, f)
+        os.replace(tmp_path, path)
+        return len(events)
+
+
+def active():
+    return _active
+
+
+@contextmanager
+def tracing():
+    """Emit a trace span for every phase in the enclosed block; yields the Tracer."""
+    global _tracer
+    previous = _tracer
+    tracer = Tracer()
+    _tracer = tracer
+    try:
+        yield tracer
+    finally:
+        _tracer = previous
+
+
+@contextmanager
+def recording():
+    """Collect phases/counters for the enclosed block; yields the Recorder."""
+    global _active
+    previous = _active
+    recorder = Recorder()
+    _active = recorder
+    try:
+        yield recorder
+    finally:
+        _active = previous
+
+
+def _stack():
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def phase(name, **args):
+    """Time the block as `name`; keyword args are attached to its trace span."""
+    recorder = _active
+    tracer = _tracer
+    if recorder is None and tracer is None:
+        yield
+        return
+    stack = _stack()
+    # [name, child seconds]; children report their elapsed time to the parent
+    frame = [name, 0.0]
+    stack.append(frame)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stack.pop()
+        if stack:
+            stack[-1][1] += elapsed
+        if recorder is not None:
+            recorder.add_time(name, max(0.0, elapsed - frame[1]))
+        if tracer is not None:
+            tracer.span(name, started, elapsed, args)
+
+
+def count(name, value=1):
+    recorder = _active
+    if recorder is not None:
+        recorder.count(name, value)
+
+
+def merge_summary(previous, current):
+    """
+    Fold one run's metrics into a pkg summary's running aggregate:
+    {"runs", "last", "mean_phases", "max_elapsed_sec"}.
+    """
+    previous = previous if isinstance(previous, dict) else {}
+    runs = int(previous.get("runs") or 0) + 1
+    means = dict(previous.get("mean_phases") or {})
+    for name in set(means) | set(current.get("phases") or {}):
+        value = (current.get("phases") or {}).get(name, 0.0)
+        means[name] = round(means.get(name, 0.0) + (value - means.get(name, 0.0)) / runs, 3)
+    return {
+        "runs": runs,
+        "last": current,
+        "mean_phases": means,
+        "max_elapsed_sec": max(float(previous.get("max_elapsed_sec") or 0.0), float(current.get("elapsed_sec") or 0.0)),
+    }
+
+
+def format_phases(data, limit=None):
+    """One-line "name=1.234s ..." rendering, slowest first."""
+    items = sorted((data.get("phases") or {}).items(), key=lambda item: (-item[1], item[0]))
+    if limit:
+        items = items[:limit]
+    return " ".join("%s=%.3fs" % item for item in items)
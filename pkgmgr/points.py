@@ -45,16 +45,25 @@ def create_point(cfg, pkg_id, label=None, actions_run=None, actions_result=None,
     return point_dir
 
 
+def list_point_ids(pkg_id):
+    """Return point ids (creation timestamps) for a pkg, oldest first."""
+    base = _points_root(pkg_id)
+    if not os.path.isdir(base):
+        return []
+    return sorted(d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d)))
+
+
+def latest_point_id(pkg_id):
+    ids = list_point_ids(pkg_id)
+    return ids[-1] if ids else None
+
+
 def load_latest_point(pkg_id):
     """Load latest point's meta and snapshot for a pkg. Returns (meta, snapshot) or (None, None)."""
-    base = _points_root(pkg_id)
-    if not os.path.exists(base):
-        return None, None
-    candidates = [d for d in os.listdir(base) if os.path.isdir(os.path.join(base, d))]
-    if not candidates:
+    latest = latest_point_id(pkg_id)
+    if not latest:
         return None, None
-    latest = sorted(candidates)[-1]
-    pdir = os.path.join(base, latest)
+    pdir = os.path.join(_points_root(pkg_id), latest)
     meta_path = os.path.join(pdir, "meta.json")
     snap_path = os.path.join(pdir, "snapshot.json")
     meta = None
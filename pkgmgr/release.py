@@ -5,14 +5,13 @@ import json
 import os
 import re
 import shutil
-import shlex
 import sys
 import time
 import tarfile
 import subprocess
 import glob
 
-from . import config, snapshot, shell_integration, points
+from . import config, metrics, snapshot, shell_integration, points, summary, updates
 from .collectors import checksums as checksums_module
 
 
@@ -37,10 +36,6 @@ def _pkg_state_path(pkg_id):
     return os.path.join(_pkg_state_dir(pkg_id), "state.json")
 
 
-def _pkg_summary_path():
-    return os.path.join(config.DEFAULT_STATE_DIR, "pkg-summary.json")
-
-
 def _pkg_release_history_dir(pkg_id):
     return os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(pkg_id), "release")
 
@@ -84,63 +79,61 @@ def _write_pkg_state(pkg_id, status, extra=None):
     return state
 
 
-def _parse_ts(value):
-    if not value:
-        return 0
-    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y%m%dT%H%M%S"):
-        try:
-            return int(time.mktime(time.strptime(str(value), fmt)))
-        except Exception:
-            continue
-    return 0
+def _find_latest_update(pkg_id):
+    return updates.latest_update(pkg_id)
 
 
-def _load_pkg_summary():
-    path = _pkg_summary_path()
-    if not os.path.exists(path):
-        return {"generated_at": _timestamp(), "pkgs": []}
-    try:
-        with open(path, "r") as f:
-            data = json.load(f)
-        if isinstance(data, dict) and isinstance(data.get("pkgs"), list):
-            return data
-    except Exception:
-        pass
-    return {"generated_at": _timestamp(), "pkgs": []}
+def _summarize_update(update_id, run_at, keywords, counts, bundles, run_metrics=None, previous=None):
+    """
+    Summary fields for one update run, built from header-level data only.
+    run_metrics is folded into the running aggregate of the previous fragment.
+    """
+    counts = counts or {}
+    bundles = bundles or []
+    previous_metrics = (previous or {}).get("metrics")
+    return {
+        "last_update_id": update_id,
+        "last_update_at": run_at,
+        "git": {
+            "keywords": keywords or [],
+            "commit_count": counts.get("commits", 0),
+        },
+        "release": {
+            "bundle_count": len(bundles),
+            "roots": sorted({b.get("root") for b in bundles if b.get("root")}),
+            "names": sorted({b.get("release_name") for b in bundles if b.get("release_name")}),
+        },
+        "artifacts": {
+            "git_files": counts.get("git_files", 0),
+            "release_files": counts.get("release_files", 0),
+        },
+        "metrics": metrics.merge_summary(previous_metrics, run_metrics) if run_metrics else (previous_metrics or {}),
+    }
 
 
-def _find_latest_update(pkg_id):
-    updates_dir = os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(pkg_id), "updates")
-    if not os.path.isdir(updates_dir):
-        return None, None
-    candidates = []
-    for name in os.listdir(updates_dir):
-        if not name.startswith("update-") or not name.endswith(".json"):
-            continue
-        ts = name[len("update-"):-len(".json")]
-        candidates.append((ts, name))
-    if not candidates:
-        return None, None
-    candidates.sort(key=lambda item: _parse_ts(item[0]))
-    latest_ts, latest_name = candidates[-1]
-    return os.path.join(updates_dir, latest_name), latest_ts
+def _summarize_latest_update(pkg_id):
+    # Legacy path: pkgs without a summary fragment are seeded once from their newest update header.
+    update_path, update_ts = _find_latest_update(pkg_id)
+    if not update_path:
+        return _summarize_update(None, None, [], {}, [])
+    try:
+        record = updates.open_update(update_path)
+    except Exception:
+        return _summarize_update(os.path.basename(update_path), update_ts, [], {}, [])
+    return _summarize_update(
+        os.path.basename(update_path),
+        update_ts,
+        record.git(with_commits=False).get("keywords"),
+        record.counts(),
+        record.bundles(),
+    )
 
 
-def _build_pkg_summary_entry(pkg_id):
+def _build_pkg_summary_entry(pkg_id, update_summary=None):
     state = _load_pkg_state(pkg_id) or {}
-    update_path, update_ts = _find_latest_update(pkg_id)
-    update_data = {}
-    if update_path:
-        try:
-            with open(update_path, "r") as f:
-                update_data = json.load(f) or {}
-        except Exception:
-            update_data = {}
-    git_info = update_data.get("git") or {}
-    release_info = update_data.get("release") or []
-    checksums = update_data.get("checksums") or {}
-    git_files = checksums.get("git_files") or {}
-    release_files = checksums.get("release_files") or {}
+    if update_summary is None:
+        previous = summary.load_fragment(pkg_id)
+        update_summary = previous if previous is not None else _summarize_latest_update(pkg_id)
 
     entry = {
         "pkg_id": str(pkg_id),
@@ -148,47 +141,18 @@ def _build_pkg_summary_entry(pkg_id):
         "opened_at": state.get("opened_at"),
         "updated_at": state.get("updated_at"),
         "closed_at": state.get("closed_at"),
-        "last_update_id": os.path.basename(update_path) if update_path else None,
-        "last_update_at": update_ts,
-        "git": {
-            "keywords": git_info.get("keywords") or [],
-            "commit_count": len(git_info.get("commits") or []),
-        },
-        "release": {
-            "bundle_count": len(release_info),
-            "roots": sorted({b.get("root") for b in release_info if b.get("root")}),
-            "names": sorted({b.get("release_name") for b in release_info if b.get("release_name")}),
-        },
-        "artifacts": {
-            "git_files": len(git_files),
-            "release_files": len(release_files),
-        },
+        "last_update_id": update_summary.get("last_update_id"),
+        "last_update_at": update_summary.get("last_update_at"),
+        "git": update_summary.get("git") or {"keywords": [], "commit_count": 0},
+        "release": update_summary.get("release") or {"bundle_count": 0, "roots": [], "names": []},
+        "artifacts": update_summary.get("artifacts") or {"git_files": 0, "release_files": 0},
+        "metrics": update_summary.get("metrics") or {},
     }
     return entry
 
 
-def _update_pkg_summary(pkg_id):
-    data = _load_pkg_summary()
-    pkgs = data.get("pkgs") or []
-    by_id = {p.get("pkg_id"): p for p in pkgs if isinstance(p, dict)}
-    entry = _build_pkg_summary_entry(pkg_id)
-    by_id[entry["pkg_id"]] = entry
-
-    def _sort_key(item):
-        status = item.get("status") or ""
-        updated_ts = max(_parse_ts(item.get("updated_at")), _parse_ts(item.get("last_update_at")))
-        return (0 if status == "open" else 1, -updated_ts)
-
-    ordered = sorted(by_id.values(), key=_sort_key)
-    data = {
-        "generated_at": _timestamp(),
-        "pkgs": ordered,
-    }
-    path = _pkg_summary_path()
-    if not os.path.exists(os.path.dirname(path)):
-        os.makedirs(os.path.dirname(path))
-    with open(path, "w") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+def _update_pkg_summary(pkg_id, update_summary=None):
+    summary.record(_build_pkg_summary_entry(pkg_id, update_summary=update_summary))
 
 
 def _write_release_history(pkg_id, run_at, bundles):
@@ -202,6 +166,8 @@ def _write_release_history(pkg_id, run_at, bundles):
         "run_at": run_at,
         "generated_at": _timestamp(),
         "bundles": bundles,
+        # checkpoint this release was built on; gc never prunes referenced points
+        "point": points.latest_point_id(pkg_id),
     }
     out_path = os.path.join(rel_dir, "release-%s.json" % run_at)
     with open(out_path, "w") as f:
@@ -286,105 +252,14 @@ def collect_for_pkg(cfg, pkg_id, collectors=None):
 
 
 
-def run_actions(cfg, names, extra_args=None, config_path=None, context=None):
+def run_actions(cfg, names, extra_args=None, config_path=None, context=None, force=False):
     """Run configured actions by name. Returns result list."""
-    actions = cfg.get("actions", {}) or {}
-    if not names:
-        print("[actions] no action names provided")
-        return []
-    extra_args = extra_args or []
-    extra_suffix = ""
-    if extra_args:
-        quoted = [shlex.quote(str(arg)) for arg in extra_args]
-        extra_suffix = " " + " ".join(quoted)
-    results = []
-    context = context or {}
-    for name in names:
-        entries = actions.get(name)
-        if not entries:
-            print("[actions] unknown action: %s" % name)
-            results.append({"name": name, "status": "missing", "rc": None})
-            continue
-        if isinstance(entries, dict):
-            entries = [entries]
-        if not isinstance(entries, (list, tuple)):
-            print("[actions] invalid action format for %s" % name)
-            results.append({"name": name, "status": "invalid", "rc": None})
-            continue
-        print("[actions] running %s (%d command(s))" % (name, len(entries)))
-        for idx, entry in enumerate(entries):
-            cmd, cwd, env = _parse_action_entry(entry)
-            if not cmd:
-                print("[actions] skip empty cmd for %s #%d" % (name, idx + 1))
-                continue
-            cmd = _render_action_value(cmd, context)
-            cwd = _render_action_value(cwd, context)
-            env = _render_action_env(env, context)
-            if config_path:
-                env = dict(env or {})
-                env.setdefault("PKGMGR_CONFIG", config_path)
-            if extra_suffix:
-                cmd = "%s%s" % (cmd, extra_suffix)
-            rc = _run_cmd(cmd, cwd=cwd, env=env, label="%s #%d" % (name, idx + 1))
-            results.append(
-                {
-                    "name": name,
-                    "status": "ok" if rc == 0 else "failed",
-                    "rc": rc,
-                }
-            )
-    return results
-
-
-def _render_action_value(value, context):
-    if not value or not context:
-        return value
-    text = str(value)
-    for key, val in context.items():
-        text = text.replace("{%s}" % key, str(val))
-    return text
-
-
-def _render_action_env(env, context):
-    if not env or not isinstance(env, dict):
-        return env
-    rendered = {}
-    for k, v in env.items():
-        rendered[k] = _render_action_value(v, context)
-    return rendered
-
-
-def _parse_action_entry(entry):
-    if isinstance(entry, dict):
-        cmd = entry.get("cmd")
-        cwd = entry.get("cwd")
-        env = entry.get("env")
-        return cmd, cwd, env
-    return entry, None, None
-
+    from . import action_runner
 
-def _run_cmd(cmd, cwd=None, env=None, label=None):
-    merged_env = os.environ.copy()
-    if env and isinstance(env, dict):
-        for k, v in env.items():
-            if v is None:
-                continue
-            merged_env[str(k)] = str(v)
-    try:
-        p = subprocess.Popen(cmd, shell=True, cwd=cwd, env=merged_env)
-        rc = p.wait()
-        prefix = "[actions]"
-        tag = " (%s)" % label if label else ""
-        if rc == 0:
-            print("%s command ok%s" % (prefix, tag))
-        else:
-            print("%s command failed%s (rc=%s)" % (prefix, tag, rc))
-    except Exception as e:
-        prefix = "[actions]"
-        tag = " (%s)" % label if label else ""
-        print("%s error%s: %s" % (prefix, tag, str(e)))
-        return 1
-    return rc
+    with metrics.phase("actions", names=list(names)):
+        return action_runner.run_actions(
+            cfg, names, extra_args=extra_args, config_path=config_path, context=context, force=force
+        )
 
 
 def create_point(cfg, pkg_id, label=None, actions_run=None, actions_result=None, snapshot_data=None):
@@ -399,6 +274,11 @@ def list_points(cfg, pkg_id):
     return points.list_points(pkg_id)
 
 
+def _check_output(cmd, **kwargs):
+    metrics.count("subprocesses")
+    return subprocess.check_output(cmd, **kwargs)
+
+
 def _git_repo_root(pkg_root, git_cfg):
     # Prefer explicit repo_root from pkg config; if relative, resolve from pkg_root.
     repo_root = (git_cfg or {}).get("repo_root")
@@ -412,7 +292,7 @@ def _git_repo_root(pkg_root, git_cfg):
             return repo_root
         print("[git] repo_root %s not found; falling back to git rev-parse" % repo_root)
     try:
-        out = subprocess.check_output(
+        out = _check_output(
             ["git", "rev-parse", "--show-toplevel"], stderr=subprocess.STDOUT, universal_newlines=True
         )
         return out.strip()
@@ -462,7 +342,7 @@ def _decode_git_output(raw, encodings):
 def _git_output_encoding(repo_root):
     for key in ("i18n.logOutputEncoding", "i18n.commitEncoding"):
         try:
-            out = subprocess.check_output(
+            out = _check_output(
                 ["git", "config", "--get", key],
                 cwd=repo_root,
                 stderr=subprocess.STDOUT,
@@ -475,6 +355,12 @@ def _git_output_encoding(repo_root):
     return "utf-8"
 
 
+# commit objects are immutable, so author/message lookups are memoized per
+# process; this pays off in `pkgmgr serve`, where update-pkg runs repeatedly.
+_COMMIT_INFO_CACHE = {}
+_COMMIT_INFO_CACHE_MAX = 50000
+
+
 def _collect_git_hits(pkg_cfg, pkg_root, main_git_cfg=None):
     git_cfg = pkg_cfg.get("git") or {}
     main_git_cfg = main_git_cfg or {}
@@ -516,7 +402,7 @@ def _collect_git_hits(pkg_cfg, pkg_root, main_git_cfg=None):
         if until:
             cmd.append("--until=%s" % until)
         try:
-            out_raw = subprocess.check_output(
+            out_raw = _check_output(
                 cmd,
                 cwd=repo_root,
                 stderr=subprocess.STDOUT,
@@ -549,23 +435,32 @@ def _collect_git_hits(pkg_cfg, pkg_root, main_git_cfg=None):
         # Provide stable, user-facing aliases.
         c["commit"] = c.get("hash")
         # fetch author and full commit message body for richer context
-        try:
-            info_raw = subprocess.check_output(
-                ["git", "show", "-s", "--format=%an\t%ae\t%ad%n%s%n%b", c["hash"]],
-                cwd=repo_root,
-                stderr=subprocess.STDOUT,
-                universal_newlines=False,
-            )
-            info = _decode_git_output(info_raw, [output_encoding])
-            header, _, body = info.partition("\n")
-            parts = header.split("\t")
-            c["author_name"] = parts[0] if len(parts) > 0 else ""
-            c["author_email"] = parts[1] if len(parts) > 1 else ""
-            c["authored_at"] = parts[2] if len(parts) > 2 else ""
-            c["message"] = body.rstrip("\n")
-        except Exception as e:
-            print("[git] show failed for %s: %s" % (c["hash"], str(e)))
-            c["message"] = c.get("subject", "")
+        cache_key = (repo_root, c["hash"], output_encoding)
+        info_fields = _COMMIT_INFO_CACHE.get(cache_key)
+        if info_fields is None:
+            try:
+                info_raw = _check_output(
+                    ["git", "show", "-s", "--format=%an\t%ae\t%ad%n%s%n%b", c["hash"]],
+                    cwd=repo_root,
+                    stderr=subprocess.STDOUT,
+                    universal_newlines=False,
+                )
+                info = _decode_git_output(info_raw, [output_encoding])
+                header, _, body = info.partition("\n")
+                parts = header.split("\t")
+                info_fields = {
+                    "author_name": parts[0] if len(parts) > 0 else "",
+                    "author_email": parts[1] if len(parts) > 1 else "",
+                    "authored_at": parts[2] if len(parts) > 2 else "",
+                    "message": body.rstrip("\n"),
+                }
+                if len(_COMMIT_INFO_CACHE) >= _COMMIT_INFO_CACHE_MAX:
+                    _COMMIT_INFO_CACHE.clear()
+                _COMMIT_INFO_CACHE[cache_key] = info_fields
+            except Exception as e:
+                print("[git] show failed for %s: %s" % (c["hash"], str(e)))
+                info_fields = {"message": c.get("subject", "")}
+        c.update(info_fields)
         if c.get("author_name") or c.get("author_email"):
             if c.get("author_email"):
                 c["author"] = "%s <%s>" % (c.get("author_name", ""), c.get("author_email", ""))
@@ -604,6 +499,27 @@ def _hash_paths(paths):
     return checksums
 
 
+def _hash_release_paths(paths):
+    """
+    sha256 plus POSIX cksum/size of release files from a single read per file.
+    Returns (release_files, release_cksums); the latter lets export_cksum skip
+    files whose stat is unchanged since update-pkg.
+    """
+    hashes = {}
+    cksums = {}
+    for path in sorted(set(paths)):
+        if not os.path.exists(path) or not os.path.isfile(path):
+            continue
+        try:
+            entry = checksums_module.file_digests(path)
+        except Exception as e:
+            print("[update-pkg] failed to hash %s: %s" % (path, str(e)))
+            continue
+        hashes[path] = entry.pop("sha256")
+        cksums[path] = entry
+    return hashes, cksums
+
+
 _REL_VER_RE = re.compile(r"release\.v(\d+)\.(\d+)\.(\d+)$")
 _PKG_NOTE_NAME = "PKG_NOTE"
 _PKG_LIST_NAME = "PKG_LIST"
@@ -865,12 +781,15 @@ def _prepare_release(pkg_dir, pkg_cfg):
         if not os.path.exists(release_dir):
             os.makedirs(release_dir)
 
-        for src, rel in to_copy:
-            dest = os.path.join(release_dir, rel)
-            dest_parent = os.path.dirname(dest)
-            if dest_parent and not os.path.exists(dest_parent):
-                os.makedirs(dest_parent)
-            shutil.copy2(src, dest)
+        with metrics.phase("copy"):
+            for src, rel in to_copy:
+                dest = os.path.join(release_dir, rel)
+                dest_parent = os.path.dirname(dest)
+                if dest_parent and not os.path.exists(dest_parent):
+                    os.makedirs(dest_parent)
+                shutil.copy2(src, dest)
+                metrics.count("copy.files")
+                metrics.count("copy.bytes", os.path.getsize(dest))
         for rel in sorted(removed):
             abspath = os.path.join(release_dir, rel)
             if os.path.isfile(abspath):
@@ -973,12 +892,13 @@ def _sync_baseline_root(root_dir, entries):
         os.makedirs(baseline_dir)
     expected = set(rel for _, rel in entries)
 
-    for src, rel in entries:
-        dest = os.path.join(baseline_dir, rel)
-        dest_parent = os.path.dirname(dest)
-        if dest_parent and not os.path.exists(dest_parent):
-            os.makedirs(dest_parent)
-        shutil.copy2(src, dest)
+    with metrics.phase("copy", dest=baseline_dir):
+        for src, rel in entries:
+            dest = os.path.join(baseline_dir, rel)
+            dest_parent = os.path.dirname(dest)
+            if dest_parent and not os.path.exists(dest_parent):
+                os.makedirs(dest_parent)
+            shutil.copy2(src, dest)
 
     for base, _, names in os.walk(baseline_dir):
         for name in names:
@@ -1004,7 +924,7 @@ def _finalize_release_root(root_dir):
     release_name = _format_version(latest_ver)
     tar_path = os.path.join(root_dir, "%s.tar" % release_name)
 
-    with tarfile.open(tar_path, "w") as tar:
+    with metrics.phase("tar", path=tar_path), tarfile.open(tar_path, "w") as tar:
         tar.add(latest_path, arcname=release_name)
 
     history_dir = os.path.join(root_dir, "HISTORY")
@@ -1347,38 +1267,59 @@ def update_pkg(cfg, pkg_id):
     pkg_dir = _pkg_dir(cfg, pkg_id)
     if not os.path.exists(pkg_dir):
         raise RuntimeError("pkg dir not found: %s" % pkg_dir)
-    pkg_cfg_path = os.path.join(pkg_dir, "pkg.yaml")
-    pkg_cfg = config.load_pkg_config(pkg_cfg_path)
-
-    ts = time.strftime("%Y%m%dT%H%M%S", time.localtime())
-    updates_dir = os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(pkg_id), "updates")
-    if not os.path.exists(updates_dir):
-        os.makedirs(updates_dir)
-
-    main_git_cfg = cfg.get("git") or {}
-    git_info, git_files = _collect_git_hits(pkg_cfg, pkg_dir, main_git_cfg)
-    repo_url = main_git_cfg.get("repo_url")
-    if repo_url:
-        git_info["repo_url"] = repo_url
-    release_files = _collect_release_files(pkg_dir, pkg_cfg)
-
-    release_bundle = _prepare_release(pkg_dir, pkg_cfg)
-
-    data = {
-        "pkg_id": str(pkg_id),
-        "run_at": ts,
-        "git": git_info,
-        "checksums": {
-            "git_files": _hash_paths(git_files),
-            "release_files": _hash_paths(release_files),
-        },
-        "release": release_bundle,
-    }
 
-    out_path = os.path.join(updates_dir, "update-%s.json" % ts)
-    with open(out_path, "w") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
-    print("[update-pkg] wrote %s" % out_path)
-    _write_release_history(pkg_id, ts, release_bundle)
-    _update_pkg_summary(pkg_id)
+    with metrics.recording() as recorder:
+        pkg_cfg = config.load_pkg_config(os.path.join(pkg_dir, "pkg.yaml"))
+
+        ts = time.strftime("%Y%m%dT%H%M%S", time.localtime())
+        started = time.time()
+
+        main_git_cfg = cfg.get("git") or {}
+        with metrics.phase("git"):
+            git_info, git_files = _collect_git_hits(pkg_cfg, pkg_dir, main_git_cfg)
+        repo_url = main_git_cfg.get("repo_url")
+        if repo_url:
+            git_info["repo_url"] = repo_url
+        with metrics.phase("inventory"):
+            release_files = _collect_release_files(pkg_dir, pkg_cfg)
+        metrics.count("inventory.files", len(release_files))
+
+        with metrics.phase("release"):
+            release_bundle = _prepare_release(pkg_dir, pkg_cfg)
+        release_hashes, release_cksums = _hash_release_paths(release_files)
+        git_hashes = _hash_paths(git_files)
+
+        data = {
+            "pkg_id": str(pkg_id),
+            "run_at": ts,
+            "git": git_info,
+            "checksums": {
+                "git_files": git_hashes,
+                "release_files": release_hashes,
+                "release_cksums": release_cksums,
+            },
+            "release": release_bundle,
+            "elapsed_sec": round(time.time() - started, 3),
+            # the record cannot time its own write; the summary's copy includes it
+            "metrics": recorder.as_dict(),
+        }
+
+        with metrics.phase("write"):
+            out_path = updates.write_update(pkg_id, ts, data)
+            print("[update-pkg] wrote %s" % out_path)
+            _write_release_history(pkg_id, ts, release_bundle)
+        run_metrics = recorder.as_dict()
+    print("[update-pkg] timings %s" % metrics.format_phases(run_metrics))
+    _update_pkg_summary(
+        pkg_id,
+        update_summary=_summarize_update(
+            os.path.basename(out_path),
+            ts,
+            git_info.get("keywords"),
+            updates.section_counts(data),
+            release_bundle,
+            run_metrics=run_metrics,
+            previous=summary.load_fragment(pkg_id),
+        ),
+    )
     return out_path
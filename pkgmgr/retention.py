@@ -0,0 +1,281 @@
+from __future__ import print_function
+"""Retention/garbage collection for per-pkg state (updates, points, release history) and caches."""
+
+import datetime
+import json
+import os
+import shutil
+import time
+
+from . import config, points, summary, updates
+
+_RUN_FMT = "%Y%m%dT%H%M%S"
+
+
+def _pkg_root(pkg_id):
+    return os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(pkg_id))
+
+
+def _history_dir(pkg_id):
+    return os.path.join(_pkg_root(pkg_id), "release")
+
+
+def list_state_pkg_ids():
+    base = os.path.join(config.DEFAULT_STATE_DIR, "pkg")
+    if not os.path.isdir(base):
+        return []
+    return sorted(name for name in os.listdir(base) if os.path.isdir(os.path.join(base, name)))
+
+
+def _parse_run(run_id):
+    try:
+        return datetime.datetime.strptime(str(run_id), _RUN_FMT)
+    except Exception:
+        return None
+
+
+def select_keep(run_ids, keep_last=None, keep_daily=None, keep_weekly=None):
+    """
+    Return the set of run ids to keep (ids are %Y%m%dT%H%M%S stamps).
+    - keep_last: newest N runs
+    - keep_daily: newest run of each of the N most recent days
+    - keep_weekly: newest run of each of the N most recent ISO weeks
+    With every rule unset nothing is pruned; unparseable ids are always kept.
+    """
+    ordered = sorted(run_ids, reverse=True)
+    if keep_last is None and keep_daily is None and keep_weekly is None:
+        return set(ordered)
+    keep = set(ordered[: keep_last or 0])
+    days = set()
+    weeks = set()
+    for run_id in ordered:
+        stamp = _parse_run(run_id)
+        if stamp is None:
+            keep.add(run_id)
+            continue
+        day = stamp.date()
+        if keep_daily and day not in days and len(days) < keep_daily:
+            days.add(day)
+            keep.add(run_id)
+        week = day.isocalendar()[:2]
+        if keep_weekly and week not in weeks and len(weeks) < keep_weekly:
+            weeks.add(week)
+            keep.add(run_id)
+    return keep
+
+
+def _path_size(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for base, _, names in os.walk(path):
+        for name in names:
+            try:
+                total += os.path.getsize(os.path.join(base, name))
+            except OSError:
+                continue
+    return total
+
+
+def _remove_paths(paths, dry_run):
+    reclaimed = 0
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        reclaimed += _path_size(path)
+        if dry_run:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    return reclaimed
+
+
+def _referenced_points(pkg_id, point_ids):
+    """
+    Points release history still depends on. Records written before releases
+    noted their "point" can't say which one they used, so from the point in
+    effect at the oldest such record onward everything is kept.
+    """
+    referenced = set()
+    history_dir = _history_dir(pkg_id)
+    if not os.path.isdir(history_dir):
+        return referenced
+    oldest_legacy = None
+    for name in os.listdir(history_dir):
+        if not name.startswith("release-") or not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(history_dir, name), "rb") as f:
+                payload = json.loads(f.read().decode("utf-8", errors="replace"))
+        except Exception:
+            continue
+        if not isinstance(payload, dict):
+            continue
+        if "point" in payload:
+            if payload["point"]:
+                referenced.add(str(payload["point"]))
+            continue
+        run_at = str(payload.get("run_at") or name[len("release-"):-len(".json")])
+        if oldest_legacy is None or run_at < oldest_legacy:
+            oldest_legacy = run_at
+    if oldest_legacy is not None:
+        older = [point_id for point_id in point_ids if point_id <= oldest_legacy]
+        since = older[-1] if older else None
+        referenced.update(point_id for point_id in point_ids if since is None or point_id >= since)
+    return referenced
+
+
+def _history_runs(pkg_id):
+    history_dir = _history_dir(pkg_id)
+    if not os.path.isdir(history_dir):
+        return []
+    runs = []
+    for name in os.listdir(history_dir):
+        if name.startswith("release-") and name.endswith(".json"):
+            runs.append(name[len("release-"):-len(".json")])
+    return sorted(runs)
+
+
+class _Budget(object):
+    """Per-run deletion cap so large backlogs are pruned across several gc runs."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+
+    def take(self, candidates):
+        if self.limit is None:
+            picked = list(candidates)
+        else:
+            picked = list(candidates)[: max(0, self.limit - self.used)]
+        self.used += len(picked)
+        return picked
+
+
+def _gc_updates(pkg_id, policy, budget, dry_run):
+    runs = updates.list_runs(pkg_id)
+    if not runs:
+        return {"removed": 0, "pending": 0, "bytes": 0}
+    keep = select_keep([run_at for run_at, _ in runs], **policy)
+    # the latest pointer must always resolve
+    keep.add(runs[-1][0])
+    candidates = [name for run_at, name in runs if run_at not in keep]
+    picked = budget.take(candidates)
+    reclaimed = 0
+    for name in picked:
+        reclaimed += _remove_paths(updates.record_paths(pkg_id, name), dry_run)
+    if not dry_run:
+        updates.forget_runs(pkg_id, picked)
+    return {"removed": len(picked), "pending": len(candidates) - len(picked), "bytes": reclaimed}
+
+
+def _gc_points(pkg_id, policy, budget, dry_run):
+    ids = points.list_point_ids(pkg_id)
+    if not ids:
+        return {"removed": 0, "pending": 0, "bytes": 0}
+    keep = select_keep(ids, **policy)
+    keep.add(ids[-1])
+    keep |= _referenced_points(pkg_id, ids)
+    candidates = [point_id for point_id in ids if point_id not in keep]
+    picked = budget.take(candidates)
+    reclaimed = 0
+    for point_id in picked:
+        reclaimed += _remove_paths([os.path.join(points._points_root(pkg_id), point_id)], dry_run)
+    return {"removed": len(picked), "pending": len(candidates) - len(picked), "bytes": reclaimed}
+
+
+def _gc_history(pkg_id, policy, budget, dry_run):
+    runs = _history_runs(pkg_id)
+    if not runs:
+        return {"removed": 0, "pending": 0, "bytes": 0}
+    keep = select_keep(runs, **policy)
+    candidates = [run_at for run_at in runs if run_at not in keep]
+    picked = budget.take(candidates)
+    reclaimed = 0
+    for run_at in picked:
+        reclaimed += _remove_paths([os.path.join(_history_dir(pkg_id), "release-%s.json" % run_at)], dry_run)
+    return {"removed": len(picked), "pending": len(candidates) - len(picked), "bytes": reclaimed}
+
+
+def _gc_cache(max_age_days, budget, dry_run):
+    """Drop source review diff cache entries not read or written for max_age_days, oldest first."""
+    root = os.path.join(config.DEFAULT_CACHE_DIR, "source_review")
+    if max_age_days is None or not os.path.isdir(root):
+        return {"removed": 0, "pending": 0, "bytes": 0}
+    cutoff = time.time() - max_age_days * 86400
+    stale = []
+    for base, _, names in os.walk(root):
+        for name in names:
+            path = os.path.join(base, name)
+            try:
+                mtime = os.path.getmtime(path)
+            except OSError:
+                continue
+            if mtime < cutoff:
+                stale.append((mtime, path))
+    candidates = [path for _, path in sorted(stale)]
+    picked = budget.take(candidates)
+    reclaimed = _remove_paths(picked, dry_run)
+    return {"removed": len(picked), "pending": len(candidates) - len(picked), "bytes": reclaimed}
+
+
+def _format_bytes(count):
+    if count < 1024:
+        return "%d B" % count
+    value = float(count)
+    for unit in ("KB", "MB", "GB"):
+        value /= 1024.0
+        if value < 1024 or unit == "GB":
+            break
+    return "%.1f %s" % (value, unit)
+
+
+def run_gc(cfg, pkg_ids=None, dry_run=False, max_delete=None):
+    """
+    Prune state according to cfg["gc"]. Oldest candidates go first and at most
+    max_delete entries are removed per run (cfg gc.max_delete when not given),
+    so a long backlog is worked off incrementally. Returns a report dict.
+    """
+    gc_cfg = cfg.get("gc") or config.MAIN_DEFAULTS["gc"]
+    limit = max_delete if max_delete is not None else gc_cfg.get("max_delete")
+    budget = _Budget(limit)
+    report = {"pkgs": {}, "bytes": 0, "removed": 0, "pending": 0, "dry_run": bool(dry_run)}
+    tag = "[gc]" + (" (dry-run)" if dry_run else "")
+    for pkg_id in pkg_ids or list_state_pkg_ids():
+        # history first: removing release records can unpin points in the same run
+        pkg_report = {
+            "history": _gc_history(pkg_id, gc_cfg.get("history") or {}, budget, dry_run),
+            "updates": _gc_updates(pkg_id, gc_cfg.get("updates") or {}, budget, dry_run),
+            "points": _gc_points(pkg_id, gc_cfg.get("points") or {}, budget, dry_run),
+        }
+        report["pkgs"][str(pkg_id)] = pkg_report
+        for kind in ("updates", "points", "history"):
+            item = pkg_report[kind]
+            report["bytes"] += item["bytes"]
+            report["removed"] += item["removed"]
+            report["pending"] += item["pending"]
+            if item["removed"] or item["pending"]:
+                print(
+                    "%s pkg=%s %s: removed=%d pending=%d reclaimed=%s"
+                    % (tag, pkg_id, kind, item["removed"], item["pending"], _format_bytes(item["bytes"]))
+                )
+    if not pkg_ids:
+        # caches are shared across pkgs; only a full gc prunes them
+        item = _gc_cache(gc_cfg.get("cache_max_age_days"), budget, dry_run)
+        report["cache"] = item
+        report["bytes"] += item["bytes"]
+        report["removed"] += item["removed"]
+        report["pending"] += item["pending"]
+        if item["removed"] or item["pending"]:
+            print(
+                "%s cache source_review: removed=%d pending=%d reclaimed=%s"
+                % (tag, item["removed"], item["pending"], _format_bytes(item["bytes"]))
+            )
+    if not dry_run and os.path.exists(summary.log_path()):
+        summary.compact()
+    print("%s removed=%d reclaimed=%s" % (tag, report["removed"], _format_bytes(report["bytes"])))
+    if report["pending"]:
+        print("%s %d entries left over the per-run limit; run gc again to continue" % (tag, report["pending"]))
+    return report
@@ -8,7 +8,7 @@ import fnmatch
 import time
 import sys
 
-from . import config
+from . import config, metrics
 
 STATE_DIR = config.DEFAULT_STATE_DIR
 
@@ -124,28 +124,29 @@ def _scan(root, exclude, progress=None, label=None):
     if not os.path.exists(root_abs):
         print("[snap] skip missing root: %s" % root_abs)
         return res
-    if progress and label:
-        total = _count_files(root_abs, exclude)
-        progress.start(label, total)
-    for base, _, files in os.walk(root_abs):
-        for name in files:
-            abspath = os.path.join(base, name)
-            rel = os.path.relpath(abspath, root_abs).replace("\\", "/")
-            if _should_skip(rel, exclude):
-                continue
-            try:
-                st = os.stat(abspath)
-                res[rel] = {
-                    "hash": _sha256(abspath),
-                    "size": int(st.st_size),
-                    "mtime": int(st.st_mtime),
-                }
-            except Exception as e:
-                print("[snap] warn skip %s: %s" % (abspath, str(e)))
-            if progress:
-                progress.advance()
-    if progress and label:
-        progress.finish()
+    with metrics.phase("scan", root=root_abs):
+        if progress and label:
+            total = _count_files(root_abs, exclude)
+            progress.start(label, total)
+        for base, _, files in os.walk(root_abs):
+            for name in files:
+                abspath = os.path.join(base, name)
+                rel = os.path.relpath(abspath, root_abs).replace("\\", "/")
+                if _should_skip(rel, exclude):
+                    continue
+                try:
+                    st = os.stat(abspath)
+                    res[rel] = {
+                        "hash": _sha256(abspath),
+                        "size": int(st.st_size),
+                        "mtime": int(st.st_mtime),
+                    }
+                except Exception as e:
+                    print("[snap] warn skip %s: %s" % (abspath, str(e)))
+                if progress:
+                    progress.advance()
+        if progress and label:
+            progress.finish()
     return res
 
 
@@ -0,0 +1,161 @@
+from __future__ import print_function
+"""Incremental maintenance of pkg-summary.json.
+
+Every lifecycle command writes a small per-pkg fragment
+(state/pkg/<id>/summary.json) and appends the same entry to pkg-summary.log.
+The combined pkg-summary.json is rebuilt from the log only when the log grows
+past COMPACT_LOG_BYTES (or on demand), so a single command touches O(1) data.
+"""
+
+import json
+import os
+import time
+
+from . import config
+
+SUMMARY_NAME = "pkg-summary.json"
+LOG_NAME = "pkg-summary.log"
+FRAGMENT_NAME = "summary.json"
+# compact the append log into pkg-summary.json once it grows past this size
+COMPACT_LOG_BYTES = 256 * 1024
+
+
+def _state_root(state_dir=None):
+    return state_dir or config.DEFAULT_STATE_DIR
+
+
+def summary_path(state_dir=None):
+    return os.path.join(_state_root(state_dir), SUMMARY_NAME)
+
+
+def log_path(state_dir=None):
+    return os.path.join(_state_root(state_dir), LOG_NAME)
+
+
+def fragment_path(pkg_id, state_dir=None):
+    return os.path.join(_state_root(state_dir), "pkg", str(pkg_id), FRAGMENT_NAME)
+
+
+def _timestamp():
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime())
+
+
+def _parse_ts(value):
+    if not value:
+        return 0
+    for fmt in ("%Y-%m-%dT%H:%M:%S", "%Y%m%dT%H%M%S"):
+        try:
+            return int(time.mktime(time.strptime(str(value), fmt)))
+        except Exception:
+            continue
+    return 0
+
+
+def _sort_key(item):
+    status = item.get("status") or ""
+    updated_ts = max(_parse_ts(item.get("updated_at")), _parse_ts(item.get("last_update_at")))
+    return (0 if status == "open" else 1, -updated_ts)
+
+
+def _write_json_atomic(path, payload, indent=None):
+    parent = os.path.dirname(path)
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent)
+    tmp_path = "%s.tmp.%d" % (path, os.getpid())
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False, indent=indent, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def load_fragment(pkg_id, state_dir=None):
+    """Return the last recorded summary entry for a pkg, or None."""
+    path = fragment_path(pkg_id, state_dir=state_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _load_base(path):
+    if not os.path.exists(path):
+        return {"generated_at": _timestamp(), "pkgs": []}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if isinstance(data, dict) and isinstance(data.get("pkgs"), list):
+            return data
+    except Exception:
+        pass
+    return {"generated_at": _timestamp(), "pkgs": []}
+
+
+def _read_log(path):
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except Exception:
+                # a torn trailing write from an interrupted command; skip it
+                continue
+            if isinstance(entry, dict) and entry.get("pkg_id"):
+                entries.append(entry)
+    return entries
+
+
+def _merge(base, entries):
+    by_id = {p.get("pkg_id"): p for p in base.get("pkgs") or [] if isinstance(p, dict)}
+    for entry in entries:
+        by_id[entry["pkg_id"]] = entry
+    return {
+        "generated_at": _timestamp(),
+        "pkgs": sorted(by_id.values(), key=_sort_key),
+    }
+
+
+def record(entry, state_dir=None):
+    """Persist one pkg summary entry: write its fragment and append to the log."""
+    pkg_id = str(entry["pkg_id"])
+    _write_json_atomic(fragment_path(pkg_id, state_dir=state_dir), entry, indent=2)
+    path = log_path(state_dir)
+    parent = os.path.dirname(path)
+    if parent and not os.path.exists(parent):
+        os.makedirs(parent)
+    line = json.dumps(entry, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+    if not os.path.exists(summary_path(state_dir)) or os.path.getsize(path) >= COMPACT_LOG_BYTES:
+        compact(state_dir=state_dir)
+
+
+def load_summary(state_dir=None):
+    """Return the merged summary (pkg-summary.json plus pending log entries)."""
+    base = _load_base(summary_path(state_dir))
+    entries = _read_log(log_path(state_dir))
+    if not entries:
+        return base
+    return _merge(base, entries)
+
+
+def compact(state_dir=None):
+    """Fold pkg-summary.log into pkg-summary.json. Returns the merged summary."""
+    path = log_path(state_dir)
+    pending = "%s.%d" % (path, os.getpid())
+    if os.path.exists(path):
+        # rotate first so concurrent appends land in a fresh log instead of being lost
+        os.replace(path, pending)
+    entries = _read_log(pending)
+    data = _merge(_load_base(summary_path(state_dir)), entries)
+    _write_json_atomic(summary_path(state_dir), data, indent=2)
+    if os.path.exists(pending):
+        os.remove(pending)
+    return data
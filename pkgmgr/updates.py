@@ -0,0 +1,387 @@
+from __future__ import print_function
+"""Update run storage: compact update records, sidecars, a latest pointer and a run index.
+
+Layout under state/pkg/<id>/updates/:
+  update-<ts>.json  compact header (ids, counts, timings and metrics, bundle metadata)
+  update-<ts>/      sidecars loaded on demand: commits.json, checksums.json,
+                    bundle_files.json (per-bundle file/change lists and notes)
+  latest.json       atomically replaced pointer to the newest record
+  index.txt         append-only "<ts>\t<name>" lines in run order
+
+The pointer answers "latest update" without listing the directory and the
+index answers "N most recent" by reading only the tail of one file. Both are
+rebuilt from a directory scan when missing (state written by older versions).
+Records written before sidecars existed are a single JSON file; UpdateRecord
+reads both shapes.
+"""
+
+import json
+import os
+
+from . import config
+
+LATEST_NAME = "latest.json"
+INDEX_NAME = "index.txt"
+FORMAT_VERSION = 2
+SECTIONS = ("commits", "checksums", "bundle_files")
+_PREFIX = "update-"
+_SUFFIX = ".json"
+# bulky per-bundle values kept out of the header
+_BUNDLE_LIST_KEYS = ("files", "copied", "skipped", "added", "updated", "removed")
+_BUNDLE_SIDECAR_KEYS = _BUNDLE_LIST_KEYS + ("note",)
+
+
+def updates_dir(pkg_id, state_dir=None):
+    return os.path.join(state_dir or config.DEFAULT_STATE_DIR, "pkg", str(pkg_id), "updates")
+
+
+def record_name(run_at):
+    return "%s%s%s" % (_PREFIX, run_at, _SUFFIX)
+
+
+def run_at_from_name(name):
+    if not name.startswith(_PREFIX) or not name.endswith(_SUFFIX):
+        return None
+    return name[len(_PREFIX):-len(_SUFFIX)]
+
+
+def sidecar_dir(record_path):
+    return record_path[: -len(_SUFFIX)]
+
+
+def _write_json_atomic(path, payload):
+    tmp_path = "%s.tmp.%d" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _scan_runs(base):
+    runs = []
+    if not os.path.isdir(base):
+        return runs
+    for name in os.listdir(base):
+        run_at = run_at_from_name(name)
+        if run_at is None or not os.path.isfile(os.path.join(base, name)):
+            continue
+        runs.append((run_at, name))
+    # run ids are fixed-width %Y%m%dT%H%M%S stamps, so lexical order is run order
+    runs.sort()
+    return runs
+
+
+def _write_latest(base, run_at, name):
+    _write_json_atomic(os.path.join(base, LATEST_NAME), {"run_at": run_at, "name": name})
+
+
+def _write_index(base, runs):
+    path = os.path.join(base, INDEX_NAME)
+    tmp_path = "%s.tmp.%d" % (path, os.getpid())
+    with open(tmp_path, "w") as f:
+        for run_at, name in runs:
+            f.write("%s\t%s\n" % (run_at, name))
+    os.replace(tmp_path, path)
+
+
+def rebuild_index(pkg_id, state_dir=None):
+    """Rebuild index.txt and latest.json from a directory scan. Returns the run list."""
+    base = updates_dir(pkg_id, state_dir=state_dir)
+    runs = _scan_runs(base)
+    if not os.path.isdir(base):
+        return runs
+    _write_index(base, runs)
+    latest_path = os.path.join(base, LATEST_NAME)
+    if runs:
+        _write_latest(base, runs[-1][0], runs[-1][1])
+    elif os.path.exists(latest_path):
+        os.remove(latest_path)
+    return runs
+
+
+def _read_latest(base):
+    try:
+        with open(os.path.join(base, LATEST_NAME), "r") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    if not isinstance(data, dict) or not data.get("name"):
+        return None
+    return data
+
+
+def section_counts(data):
+    """Counts recorded in the header so readers never load sidecars just to count."""
+    git_info = data.get("git") or {}
+    checksums = data.get("checksums") or {}
+    counts = {
+        "commits": len(git_info.get("commits") or []),
+        "bundles": len(data.get("release") or []),
+    }
+    for name, entries in checksums.items():
+        counts[name] = len(entries or {})
+    return counts
+
+
+def _split_record(name, data):
+    git_info = dict(data.get("git") or {})
+    commits = git_info.pop("commits", None) or []
+    git_info["commit_ids"] = [c.get("hash") for c in commits]
+    bundles = []
+    bundle_files = []
+    for bundle in data.get("release") or []:
+        head = {k: v for k, v in bundle.items() if k not in _BUNDLE_SIDECAR_KEYS}
+        head["counts"] = dict((k, len(bundle.get(k) or [])) for k in _BUNDLE_LIST_KEYS)
+        bundles.append(head)
+        bundle_files.append(dict((k, bundle.get(k)) for k in _BUNDLE_SIDECAR_KEYS if k in bundle))
+    header = {k: v for k, v in data.items() if k not in ("git", "checksums", "release")}
+    header.update(
+        {
+            "format": FORMAT_VERSION,
+            "git": git_info,
+            "counts": section_counts(data),
+            "release": bundles,
+            "sections": dict((section, "%s/%s.json" % (name[: -len(_SUFFIX)], section)) for section in SECTIONS),
+        }
+    )
+    sidecars = {
+        "commits": commits,
+        "checksums": data.get("checksums") or {},
+        "bundle_files": bundle_files,
+    }
+    return header, sidecars
+
+
+def write_update(pkg_id, run_at, data, state_dir=None):
+    """Write an update record (header + sidecars) and advance the latest pointer/index."""
+    base = updates_dir(pkg_id, state_dir=state_dir)
+    if not os.path.exists(base):
+        os.makedirs(base)
+    if not os.path.exists(os.path.join(base, INDEX_NAME)):
+        rebuild_index(pkg_id, state_dir=state_dir)
+    name = record_name(run_at)
+    out_path = os.path.join(base, name)
+    header, sidecars = _split_record(name, data)
+    side_dir = sidecar_dir(out_path)
+    if not os.path.exists(side_dir):
+        os.makedirs(side_dir)
+    for section, payload in sidecars.items():
+        _write_json_atomic(os.path.join(side_dir, "%s.json" % section), payload)
+    # header last: a readable header implies its sidecars are complete
+    tmp_path = "%s.tmp.%d" % (out_path, os.getpid())
+    with open(tmp_path, "w") as f:
+        json.dump(header, f, ensure_ascii=False, indent=2, sort_keys=True)
+    os.replace(tmp_path, out_path)
+    latest = _read_latest(base)
+    if not latest or latest.get("name") != name:
+        # two runs within the same second share a record; index it once
+        with open(os.path.join(base, INDEX_NAME), "a") as f:
+            f.write("%s\t%s\n" % (run_at, name))
+    _write_latest(base, run_at, name)
+    return out_path
+
+
+def latest_update(pkg_id, state_dir=None):
+    """Return (path, run_at) of the newest update record, or (None, None)."""
+    base = updates_dir(pkg_id, state_dir=state_dir)
+    latest = _read_latest(base)
+    if latest:
+        path = os.path.join(base, latest["name"])
+        if os.path.isfile(path):
+            return path, latest.get("run_at") or run_at_from_name(latest["name"])
+    if not os.path.isdir(base):
+        return None, None
+    runs = rebuild_index(pkg_id, state_dir=state_dir)
+    if not runs:
+        return None, None
+    run_at, name = runs[-1]
+    return os.path.join(base, name), run_at
+
+
+def _tail_lines(path, count, block=8192):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0 and data.count(b"\n") <= count:
+            step = min(block, pos)
+            pos -= step
+            f.seek(pos)
+            data = f.read(step) + data
+    lines = data.decode("utf-8", errors="replace").splitlines()
+    if pos > 0:
+        # the first line may be cut at the block boundary
+        lines = lines[1:]
+    return lines[-count:] if count else []
+
+
+def recent_updates(pkg_id, count, state_dir=None):
+    """Return up to `count` (path, run_at) pairs, newest first."""
+    base = updates_dir(pkg_id, state_dir=state_dir)
+    index_path = os.path.join(base, INDEX_NAME)
+    if not os.path.exists(index_path):
+        if not os.path.isdir(base):
+            return []
+        rebuild_index(pkg_id, state_dir=state_dir)
+    result = []
+    seen = set()
+    for line in reversed(_tail_lines(index_path, count)):
+        run_at, _, name = line.partition("\t")
+        if not name or name in seen:
+            continue
+        seen.add(name)
+        result.append((os.path.join(base, name), run_at))
+    return result
+
+
+def list_runs(pkg_id, state_dir=None):
+    """Return every indexed (run_at, name) pair in run order."""
+    base = updates_dir(pkg_id, state_dir=state_dir)
+    index_path = os.path.join(base, INDEX_NAME)
+    if not os.path.exists(index_path):
+        return rebuild_index(pkg_id, state_dir=state_dir)
+    runs = []
+    seen = set()
+    with open(index_path, "r") as f:
+        for line in f:
+            run_at, _, name = line.strip().partition("\t")
+            if not name or name in seen:
+                continue
+            seen.add(name)
+            runs.append((run_at, name))
+    return runs
+
+
+def record_paths(pkg_id, name, state_dir=None):
+    """Return the on-disk paths (header file, sidecar dir) that make up one record."""
+    path = os.path.join(updates_dir(pkg_id, state_dir=state_dir), name)
+    return [path, sidecar_dir(path)]
+
+
+def forget_runs(pkg_id, names, state_dir=None):
+    """Drop runs from index.txt after their records were deleted. The latest run cannot be dropped."""
+    names = set(names or [])
+    if not names:
+        return
+    runs = list_runs(pkg_id, state_dir=state_dir)
+    if runs and runs[-1][1] in names:
+        raise RuntimeError("refusing to drop the latest update record: %s" % runs[-1][1])
+    _write_index(updates_dir(pkg_id, state_dir=state_dir), [run for run in runs if run[1] not in names])
+
+
+def _read_json(path):
+    with open(path, "rb") as f:
+        raw = f.read()
+    for encoding in ("utf-8", "euc-kr", "cp949"):
+        try:
+            return json.loads(raw.decode(encoding))
+        except Exception:
+            continue
+    return json.loads(raw.decode("utf-8", errors="replace"))
+
+
+class UpdateRecord(object):
+    """Lazy view of one update record: the header is read up front, sidecars on first use."""
+
+    def __init__(self, path):
+        self.path = path
+        self.header = _read_json(path) or {}
+        self.legacy = self.header.get("format") is None
+        self._sections = {}
+
+    def section(self, name):
+        """Return a sidecar section (commits, checksums or bundle_files)."""
+        if name not in SECTIONS:
+            raise KeyError(name)
+        if name in self._sections:
+            return self._sections[name]
+        if self.legacy:
+            value = self._legacy_section(name)
+        else:
+            rel = (self.header.get("sections") or {}).get(name)
+            path = os.path.join(os.path.dirname(self.path), rel) if rel else None
+            value = _read_json(path) if path and os.path.exists(path) else None
+            if value is None:
+                value = {} if name == "checksums" else []
+        self._sections[name] = value
+        return value
+
+    def _legacy_section(self, name):
+        if name == "commits":
+            return (self.header.get("git") or {}).get("commits") or []
+        if name == "checksums":
+            return self.header.get("checksums") or {}
+        return [dict((k, b.get(k)) for k in _BUNDLE_SIDECAR_KEYS if k in b) for b in self.header.get("release") or []]
+
+    def counts(self):
+        if self.legacy:
+            return section_counts(self.header)
+        return self.header.get("counts") or {}
+
+    def commits(self):
+        return self.section("commits")
+
+    def metrics(self):
+        """Phase timings/counters of the run ({} for records written before they existed)."""
+        return self.header.get("metrics") or {}
+
+    def checksums(self):
+        return self.section("checksums")
+
+    def git(self, with_commits=True):
+        git_info = dict(self.header.get("git") or {})
+        if self.legacy:
+            git_info["commit_ids"] = [c.get("hash") for c in git_info.get("commits") or []]
+            if not with_commits:
+                git_info.pop("commits", None)
+        elif with_commits:
+            git_info["commits"] = self.commits()
+        return git_info
+
+    def bundles(self, with_files=False):
+        heads = []
+        for bundle in self.header.get("release") or []:
+            head = dict(bundle)
+            if self.legacy:
+                for key in _BUNDLE_SIDECAR_KEYS:
+                    head.pop(key, None)
+                head["counts"] = dict((k, len(bundle.get(k) or [])) for k in _BUNDLE_LIST_KEYS)
+            heads.append(head)
+        if not with_files:
+            return heads
+        for head, extra in zip(heads, self.section("bundle_files")):
+            head.update(extra)
+        return heads
+
+    def to_dict(self):
+        """Return the full record in the single-file shape (all sections loaded)."""
+        data = {
+            k: v
+            for k, v in self.header.items()
+            if k not in ("git", "checksums", "release", "counts", "sections", "format")
+        }
+        git_info = self.git(with_commits=True)
+        git_info.pop("commit_ids", None)
+        data["git"] = git_info
+        data["checksums"] = self.checksums()
+        data["release"] = []
+        for bundle in self.bundles(with_files=True):
+            bundle.pop("counts", None)
+            data["release"].append(bundle)
+        return data
+
+
+def open_update(path):
+    return UpdateRecord(path)
+
+
+def load_update(path):
+    """Load a whole update record (header plus every sidecar) as one dict."""
+    return UpdateRecord(path).to_dict()
+
+
+def open_latest(pkg_id, state_dir=None):
+    """Return an UpdateRecord for the newest run, or None."""
+    path, _ = latest_update(pkg_id, state_dir=state_dir)
+    if not path:
+        return None
+    return UpdateRecord(path)
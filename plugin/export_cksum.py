@@ -3,18 +3,26 @@
 import argparse
 import os
 import re
-import subprocess
 import sys
+import threading
 import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from copy import copy
+from itertools import islice
 
 try:
     import openpyxl
 except Exception:
     openpyxl = None
 
-from pkgmgr import config
-from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+from pkgmgr import config, updates
+from pkgmgr.collectors import checksums
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+# release roots checksummed ahead of the one being written
+_ROOTS_IN_FLIGHT = 4
 
 
 def _load_pkg_yaml(pkg_dir):
@@ -23,14 +31,15 @@ def _load_pkg_yaml(pkg_dir):
     return os.path.join(pkg_dir, "pkg.yaml")
 
 
-def _resolve_pkg_dir(pkg_id, config_path=None):
-    try:
-        if config_path:
-            main_cfg = config.load_main(path=config_path, allow_interactive=False)
-        else:
-            main_cfg = config.load_main(allow_interactive=False)
-    except Exception:
-        return None
+def _resolve_pkg_dir(pkg_id, config_path=None, main_cfg=None):
+    if main_cfg is None:
+        try:
+            if config_path:
+                main_cfg = config.load_main(path=config_path, allow_interactive=False)
+            else:
+                main_cfg = config.load_main(allow_interactive=False)
+        except Exception:
+            return None
     release_root = main_cfg.get("pkg_release_root")
     if not release_root:
         return None
@@ -85,17 +94,112 @@ def _collect_files(root_dir, entries):
 
 
 def _cksum(path):
+    """Return (crc, size, path) as `cksum` prints them, computed in-process."""
     try:
-        out = subprocess.check_output(["cksum", path], stderr=subprocess.STDOUT)
+        crc, size = checksums.posix_cksum_of_file(path)
     except Exception as e:
         print("[export_cksum] cksum failed: %s (%s)" % (path, str(e)))
         return None
-    line = out.decode("utf-8", errors="replace").strip()
-    parts = line.split()
-    if len(parts) < 3:
-        print("[export_cksum] invalid cksum output: %s" % line)
-        return None
-    return parts[0], parts[1], " ".join(parts[2:])
+    return str(crc), str(size), path
+
+
+def _default_jobs():
+    return min(8, os.cpu_count() or 1)
+
+
+def _recorded_cksums(pkg_id):
+    """POSIX cksum entries recorded by the latest update-pkg run (path -> entry)."""
+    try:
+        record = updates.open_latest(pkg_id)
+        if record is None:
+            return {}
+        return record.checksums().get("release_cksums") or {}
+    except Exception as e:
+        print("[export_cksum] recorded checksums unavailable: %s" % str(e))
+        return {}
+
+
+def _cksum_rows(root_dir, files, jobs, recorded=None, pool=None):
+    """
+    cksum every regular file on a thread pool; rows are (crc, size, relpath).
+    Entries recorded by update-pkg are reused when the file stat still matches.
+    A shared `pool` is used instead of a private one when given.
+    Returns (rows, reused_count).
+    """
+    recorded = recorded or {}
+    paths = [path for path in sorted(files) if os.path.isfile(path)]
+    reused = []
+
+    def _row(path):
+        entry = recorded.get(os.path.abspath(path))
+        if entry is not None and checksums.stat_matches(path, entry):
+            reused.append(path)
+            cksum_row = (str(entry["cksum"]), str(entry["size"]), path)
+        else:
+            cksum_row = _cksum(path)
+        if not cksum_row:
+            return None
+        try:
+            relpath = os.path.relpath(path, root_dir)
+        except Exception:
+            relpath = os.path.basename(path)
+        return (cksum_row[0], cksum_row[1], relpath)
+
+    if pool is not None:
+        rows = list(pool.map(_row, paths))
+    elif jobs > 1 and len(paths) > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as own_pool:
+            rows = list(own_pool.map(_row, paths))
+    else:
+        rows = [_row(path) for path in paths]
+    rows = [row for row in rows if row]
+    rows.sort(key=lambda r: r[2])
+    return rows, len(reused)
+
+
+def _collect_roots(pkg_dir, grouped, jobs, recorded=None, window=_ROOTS_IN_FLIGHT):
+    """
+    Walk and checksum release roots concurrently and yield (root, rows, reused)
+    in sorted root order. One light coordinator thread per root walks its tree
+    and feeds files to a single shared pool of `jobs` workers, so total I/O
+    concurrency stays at `jobs`. At most `window` roots are in flight and a
+    root's rows are dropped once yielded, so --stream holds only that many
+    roots' rows at a time. Workbook assembly consumes the results serially and
+    can start on the first root while later ones are still being checksummed.
+    """
+    roots = sorted(grouped)
+    total = len(roots)
+    window = max(1, min(int(window or 1), total or 1))
+    started = time.time()
+    progress = {"done": 0}
+    lock = threading.Lock()
+
+    def _root(pool, root):
+        root_dir = os.path.join(pkg_dir, root)
+        files = _collect_files(root_dir, grouped[root])
+        rows, reused = _cksum_rows(root_dir, files, jobs, recorded=recorded, pool=pool)
+        with lock:
+            progress["done"] += 1
+            print(
+                "[export_cksum] [%d/%d] root=%s files=%d reused=%d %.2fs"
+                % (progress["done"], total, root, len(rows), reused, time.time() - started)
+            )
+        return rows, reused
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        with ThreadPoolExecutor(max_workers=window) as coordinators:
+            pending = deque()
+            queued = iter(roots)
+            for root in islice(queued, window):
+                pending.append((root, coordinators.submit(_root, pool, root)))
+            while pending:
+                root, future = pending.popleft()
+                rows, reused = future.result()
+                del future
+                for next_root in islice(queued, 1):
+                    pending.append((next_root, coordinators.submit(_root, pool, next_root)))
+                yield root, rows, reused
+                del rows
 
 
 def _normalize_excel_template(excel_arg, pkg_dir):
@@ -306,8 +410,214 @@ def _write_sheet(ws, rows, ensure_format, template_ws=None):
     _configure_page(ws, end_row + 1, template_ws=template_ws)
 
 
-def main(argv=None):
+# --stream: write-only workbook. Every distinct cell style is registered once as
+# a named style and rows are appended as WriteOnlyCells referencing it, so memory
+# stays flat and the cost per row is constant however large the root is.
+_HEADER_ROWS = 4
+_DATA_COLS = (2, 3, 4, 5)
+
+
+class _StyleBook(object):
+    """Registers each distinct (font, border, fill, ...) combination once per workbook."""
+
+    def __init__(self, wb):
+        self.wb = wb
+        self.names = {}
+
+    def name_for(self, font=None, border=None, fill=None, number_format="General", alignment=None, protection=None):
+        key = (font, border, fill, number_format, alignment, protection)
+        name = self.names.get(key)
+        if name is None:
+            name = "pkgmgr_cksum_%d" % (len(self.names) + 1)
+            style = NamedStyle(name=name, number_format=number_format)
+            for attr, value in (
+                ("font", font),
+                ("border", border),
+                ("fill", fill),
+                ("alignment", alignment),
+                ("protection", protection),
+            ):
+                if value is not None:
+                    setattr(style, attr, copy(value))
+            self.wb.add_named_style(style)
+            self.names[key] = name
+        return name
+
+    def name_of(self, cell):
+        if not cell.has_style:
+            return None
+        # style attributes of a loaded cell are unhashable proxies; key on copies
+        return self.name_for(
+            copy(cell.font),
+            copy(cell.border),
+            copy(cell.fill),
+            cell.number_format,
+            copy(cell.alignment),
+            copy(cell.protection),
+        )
+
+
+def _template_layout(book, template_ws):
+    """Header rows, data-row styles and dimensions captured once from the template sheet."""
+    max_col = max(template_ws.max_column, 6)
+    header = []
+    for row in range(1, _HEADER_ROWS + 1):
+        cells = []
+        for col in range(1, max_col + 1):
+            cell = template_ws.cell(row=row, column=col)
+            cells.append((cell.value, book.name_of(cell)))
+        header.append(cells)
+    data = dict((col, book.name_of(template_ws.cell(row=5, column=col))) for col in _DATA_COLS)
+    widths = {}
+    for letter, dim in template_ws.column_dimensions.items():
+        if dim.width:
+            widths[letter] = dim.width
+    heights = {}
+    for row in range(1, _HEADER_ROWS + 1):
+        if template_ws.row_dimensions[row].height is not None:
+            heights[row] = template_ws.row_dimensions[row].height
+    merges = [
+        str(rng) for rng in template_ws.merged_cells.ranges if rng.max_row <= _HEADER_ROWS
+    ]
+    return {
+        "header": header,
+        "data": data,
+        "last": data,
+        "widths": widths,
+        "heights": heights,
+        "data_height": template_ws.row_dimensions[5].height,
+        "merges": merges,
+        "template_ws": template_ws,
+    }
+
+
+def _default_layout(book):
+    """Same look as _init_sheet/_write_sheet/_apply_table_border with ensure_format."""
+    styles = _default_styles()
+    medium, hair = styles["medium"], styles["hair"]
+    center = Alignment(horizontal="center", vertical="center")
+    vcenter = Alignment(vertical="center")
+
+    def edge(col, inner):
+        return (medium if col == 2 else inner), (medium if col == 5 else inner)
+
+    header = [[(None, None)] * 6 for _ in range(_HEADER_ROWS)]
+    for col in _DATA_COLS:
+        header[1][col - 1] = (
+            None,
+            book.name_for(styles["bold_font"], _border(medium, medium, medium, medium), styles["header_fill"], alignment=center),
+        )
+        left, right = edge(col, hair)
+        header[2][col - 1] = (
+            None,
+            book.name_for(styles["base_font"], _border(left, right, medium, hair), styles["sub_fill"], alignment=center),
+        )
+        header[3][col - 1] = (
+            None,
+            book.name_for(styles["base_font"], _border(left, right, hair, hair), styles["sub_fill"], alignment=center),
+        )
+    data = {}
+    last = {}
+    for col in _DATA_COLS:
+        left, right = edge(col, hair)
+        data[col] = book.name_for(styles["base_font"], _border(left, right, hair, None), alignment=vcenter)
+        last[col] = book.name_for(styles["base_font"], _border(left, right, hair, medium), alignment=vcenter)
+    return {
+        "header": header,
+        "data": data,
+        "last": last,
+        "widths": {"B": 16.75, "C": 12.75, "D": 45.875, "E": 12.75, "F": 13.0},
+        "heights": {2: 17.25},
+        "data_height": None,
+        "merges": ["B2:E2", "B3:E3", "B4:C4"],
+        "template_ws": None,
+    }
+
+
+def _stream_cell(ws, value, style_name):
+    cell = WriteOnlyCell(ws, value=value)
+    if style_name:
+        cell.style = style_name
+    return cell
+
+
+def _write_stream_sheet(wb, layout, sheet_name, release_path, rows):
+    ws = wb.create_sheet(title=sheet_name)
+    for letter, width in layout["widths"].items():
+        ws.column_dimensions[letter].width = width
+    for rng in layout["merges"]:
+        ws.merged_cells.add(rng)
+    overrides = {
+        (2, 2): sheet_name,
+        (3, 2): release_path,
+        (4, 2): "Check Sum",
+        (4, 4): "File Name",
+        (4, 5): "비고",
+    }
+    for row_idx, cells in enumerate(layout["header"], 1):
+        if row_idx in layout["heights"]:
+            ws.row_dimensions[row_idx].height = layout["heights"][row_idx]
+        values = []
+        for col_idx, (value, style_name) in enumerate(cells, 1):
+            value = overrides.get((row_idx, col_idx), value)
+            if value is None and style_name is None:
+                values.append(None)
+            else:
+                values.append(_stream_cell(ws, value, style_name))
+        ws.append(values)
+    # an empty root still gets one closing (bottom-bordered) row, like _write_sheet
+    body = rows or [("", "", "")]
+    end_row = _HEADER_ROWS + len(body)
+    data, last = layout["data"], layout["last"]
+    for idx, (cksum, size, path) in enumerate(body, _HEADER_ROWS + 1):
+        styles = last if idx == end_row else data
+        if layout["data_height"] is not None:
+            ws.row_dimensions[idx].height = layout["data_height"]
+        ws.append(
+            [
+                None,
+                _stream_cell(ws, cksum, styles[2]),
+                _stream_cell(ws, size, styles[3]),
+                _stream_cell(ws, path, styles[4]),
+                _stream_cell(ws, "", styles[5]),
+            ]
+        )
+    _configure_page(ws, end_row + 1, template_ws=layout["template_ws"])
+    return ws
+
+
+def _export_stream(out_path, template_path, rows_by_root):
+    """
+    Write every root sheet through a write-only workbook. Only rows 1-4 and the
+    row-5 styles of the template (the root-named sheet, else the first) are
+    reused; other template content is not carried over in this mode.
+    """
+    wb = openpyxl.Workbook(write_only=True)
+    book = _StyleBook(wb)
+    template_wb = None
+    if template_path and os.path.exists(template_path):
+        template_wb = openpyxl.load_workbook(template_path)
+        print("[export_cksum] template loaded (stream): %s" % template_path)
+    layouts = {}
+    for root, rows in rows_by_root:
+        if template_wb is not None:
+            source = template_wb[root] if root in template_wb.sheetnames else template_wb.worksheets[0]
+            key = source.title
+            if key not in layouts:
+                layouts[key] = _template_layout(book, source)
+        else:
+            key = None
+            if key not in layouts:
+                layouts[key] = _default_layout(book)
+        _write_stream_sheet(wb, layouts[key], root, "PKG Release 경로 작성 필요", rows)
+        print("[export_cksum] sheet=%s rows=%d (stream)" % (root, len(rows)))
+    wb.save(out_path)
+
+
+def main(argv=None, context=None):
+    """Entry point; `context` is passed by pkgmgr module actions (cfg, pkg_id, ...)."""
     argv = argv if argv is not None else sys.argv[1:]
+    context = context or {}
     parser = argparse.ArgumentParser(description="Export cksum results into an Excel template.")
     parser.add_argument("--config", help="pkgmgr main config path")
     parser.add_argument("--pkg-id", required=True, help="pkg id (resolved via pkg_release_root)")
@@ -317,6 +627,22 @@ def main(argv=None):
         help="output xlsx path (supports {YYYYMMDD}/{date} and {version})",
     )
     parser.add_argument("--template", help="xlsx template path (optional)")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=_default_jobs(),
+        help="parallel cksum workers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="write-only workbook with shared named styles (bounded memory for huge roots)",
+    )
+    parser.add_argument(
+        "--recompute",
+        action="store_true",
+        help="ignore cksum values recorded by update-pkg and read every file",
+    )
     args = parser.parse_args(argv)
 
     if openpyxl is None:
@@ -326,7 +652,7 @@ def main(argv=None):
     pkg_dir = None
     config_path = args.config or os.environ.get("PKGMGR_CONFIG")
     if args.pkg_id:
-        pkg_dir = _resolve_pkg_dir(args.pkg_id, config_path=config_path)
+        pkg_dir = _resolve_pkg_dir(args.pkg_id, config_path=config_path, main_cfg=context.get("cfg"))
     pkg_yaml = _load_pkg_yaml(pkg_dir)
     if not pkg_yaml:
         print("[export_cksum] pkg.yaml not specified; use --pkg-id")
@@ -341,8 +667,23 @@ def main(argv=None):
         print("[export_cksum] no release entries found in %s" % pkg_yaml)
         return 1
 
+    recorded = {} if args.recompute else _recorded_cksums(args.pkg_id)
+
     excel_path = _resolve_excel_path(args.excel, pkg_dir)
     template_path = args.template or excel_path
+    out_path = excel_path
+    if not out_path.lower().endswith(".xlsx"):
+        out_path = out_path + ".xlsx"
+    out_dir = os.path.dirname(os.path.abspath(out_path))
+    if out_dir and not os.path.exists(out_dir):
+        os.makedirs(out_dir)
+
+    if args.stream:
+        root_rows = ((root, rows) for root, rows, _ in _collect_roots(pkg_dir, grouped, args.jobs, recorded))
+        _export_stream(out_path, template_path, root_rows)
+        print("[export_cksum] wrote %s" % out_path)
+        return 0
+
     template_available = template_path and os.path.exists(template_path)
     if template_available:
         wb = openpyxl.load_workbook(template_path)
@@ -355,23 +696,8 @@ def main(argv=None):
     template_ws = wb[wb.sheetnames[0]] if wb.sheetnames else None
     template_title = template_ws.title if template_ws is not None else None
     roots = []
-    for root, entries in sorted(grouped.items()):
+    for root, rows, reused in _collect_roots(pkg_dir, grouped, args.jobs, recorded):
         roots.append(root)
-        root_dir = os.path.join(pkg_dir, root)
-        files = _collect_files(root_dir, entries)
-        rows = []
-        for path in files:
-            if not os.path.isfile(path):
-                continue
-            try:
-                relpath = os.path.relpath(path, root_dir)
-            except Exception:
-                relpath = os.path.basename(path)
-            cksum_row = _cksum(path)
-            if not cksum_row:
-                continue
-            rows.append((cksum_row[0], cksum_row[1], relpath))
-        rows.sort(key=lambda r: r[2])
 
         ensure_format = not template_available
         if root in wb.sheetnames:
@@ -383,16 +709,10 @@ def main(argv=None):
             ws = wb.create_sheet(title=root)
         _init_sheet(ws, root, "PKG Release 경로 작성 필요", ensure_format)
         _write_sheet(ws, rows, ensure_format, template_ws=template_ws)
-        print("[export_cksum] sheet=%s rows=%d" % (root, len(rows)))
+        print("[export_cksum] sheet=%s rows=%d reused=%d" % (root, len(rows), reused))
     if template_title and template_title not in roots and template_title in wb.sheetnames:
         wb.remove(wb[template_title])
 
-    out_path = excel_path
-    if not out_path.lower().endswith(".xlsx"):
-        out_path = out_path + ".xlsx"
-    out_dir = os.path.dirname(os.path.abspath(out_path))
-    if out_dir and not os.path.exists(out_dir):
-        os.makedirs(out_dir)
     wb.save(out_path)
     print("[export_cksum] wrote %s" % out_path)
     return 0
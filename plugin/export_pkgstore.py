@@ -1,12 +1,19 @@
 from __future__ import print_function
 
 import argparse
+import hashlib
+import io
+import json
 import os
 import shutil
 import sys
 import socket
 import subprocess
+import tarfile
 import tempfile
+import time
+
+from pkgmgr import config, copier, summary
 
 
 def _default_src():
@@ -14,20 +21,22 @@ def _default_src():
     return os.path.join(home, "pkgmgr", "local", "state")
 
 
-def _copy_tree(src, dest):
-    for base, dirs, files in os.walk(src):
+MANIFEST_NAME = ".pkgstore-manifest.json"
+PUSH_STATE_PREFIX = ".pkgstore-push-"
+_MANIFEST_VERSION = 1
+
+
+def _tree_items(src, prefix):
+    """(dest relpath, source path) for every file under src, placed under prefix."""
+    items = []
+    for base, _, files in os.walk(src):
         rel = os.path.relpath(base, src)
-        dest_dir = dest if rel == "." else os.path.join(dest, rel)
-        if not os.path.exists(dest_dir):
-            os.makedirs(dest_dir)
         for name in files:
-            s = os.path.join(base, name)
-            d = os.path.join(dest_dir, name)
-            shutil.copy2(s, d)
-        for name in dirs:
-            d = os.path.join(dest_dir, name)
-            if not os.path.exists(d):
-                os.makedirs(d)
+            dest_rel = name if rel == "." else os.path.join(rel, name)
+            if prefix:
+                dest_rel = os.path.join(prefix, dest_rel)
+            items.append((dest_rel, os.path.join(base, name)))
+    return items
 
 
 def _default_release_root():
@@ -42,30 +51,34 @@ def _list_pkg_ids(src_state_root):
     return sorted([name for name in os.listdir(pkg_dir) if os.path.isdir(os.path.join(pkg_dir, name))])
 
 
-def _copy_export_dirs(release_root, dest_state_root, allowed_pkg_ids=None):
+def _release_pkg_dirs(release_root, allowed_pkg_ids=None):
     if not os.path.isdir(release_root):
-        return
-    pkg_root = os.path.join(dest_state_root, "pkg")
-    if not os.path.exists(pkg_root):
-        os.makedirs(pkg_root)
-    for name in os.listdir(release_root):
+        return []
+    dirs = []
+    for name in sorted(os.listdir(release_root)):
         pkg_dir = os.path.join(release_root, name)
         if not os.path.isdir(pkg_dir):
             continue
         if allowed_pkg_ids is not None and name not in allowed_pkg_ids:
             continue
+        dirs.append((name, pkg_dir))
+    return dirs
+
+
+def _export_dir_items(release_root, allowed_pkg_ids=None):
+    items = []
+    for name, pkg_dir in _release_pkg_dirs(release_root, allowed_pkg_ids):
         export_dir = os.path.join(pkg_dir, "export")
-        if not os.path.isdir(export_dir):
-            continue
-        dest_export = os.path.join(pkg_root, name, "export")
-        _copy_tree(export_dir, dest_export)
+        if os.path.isdir(export_dir):
+            items.extend(_tree_items(export_dir, os.path.join("pkg", name, "export")))
+    return items
 
 
 def _prune_empty_dirs(root_dir):
     for base, dirs, files in os.walk(root_dir, topdown=False):
         if files:
             continue
-        if not dirs and base != root_dir:
+        if not os.listdir(base) and base != root_dir:
             os.rmdir(base)
 
 
@@ -81,39 +94,15 @@ def _list_release_tars(release_dir):
     return items
 
 
-def _copy_release_tars(release_root, dest_state_root, allowed_pkg_ids=None):
-    if not os.path.isdir(release_root):
-        return
-    pkg_root = os.path.join(dest_state_root, "pkg")
-    if not os.path.exists(pkg_root):
-        os.makedirs(pkg_root)
-    for name in os.listdir(release_root):
-        pkg_dir = os.path.join(release_root, name)
-        if not os.path.isdir(pkg_dir):
-            continue
-        if allowed_pkg_ids is not None and name not in allowed_pkg_ids:
-            continue
+def _release_tar_items(release_root, allowed_pkg_ids=None):
+    items = []
+    for name, pkg_dir in _release_pkg_dirs(release_root, allowed_pkg_ids):
         release_dir = os.path.join(pkg_dir, "release")
-        expected = set()
-        if os.path.isdir(release_dir):
-            for src, rel in _list_release_tars(release_dir):
-                expected.add(rel)
-                dest_tar = os.path.join(pkg_root, name, "release_artifacts", rel)
-                dest_parent = os.path.dirname(dest_tar)
-                if not os.path.exists(dest_parent):
-                    os.makedirs(dest_parent)
-                shutil.copy2(src, dest_tar)
-        dest_artifacts = os.path.join(pkg_root, name, "release_artifacts")
-        if os.path.isdir(dest_artifacts):
-            for base, _, files in os.walk(dest_artifacts):
-                for fname in files:
-                    if not fname.endswith(".tar"):
-                        continue
-                    rel = os.path.relpath(os.path.join(base, fname), dest_artifacts)
-                    if rel in expected:
-                        continue
-                    os.remove(os.path.join(base, fname))
-            _prune_empty_dirs(dest_artifacts)
+        if not os.path.isdir(release_dir):
+            continue
+        for src, rel in _list_release_tars(release_dir):
+            items.append((os.path.join("pkg", name, "release_artifacts", rel), src))
+    return items
 
 
 def _list_readmes(pkg_dir):
@@ -131,72 +120,575 @@ def _list_readmes(pkg_dir):
     return readmes
 
 
-def _copy_readme_files(release_root, dest_state_root, system_name, allowed_pkg_ids=None):
-    if not os.path.isdir(release_root):
-        return
-    pkg_root = os.path.join(dest_state_root, "pkg")
-    if not os.path.exists(pkg_root):
-        os.makedirs(pkg_root)
-    for name in os.listdir(release_root):
-        pkg_dir = os.path.join(release_root, name)
-        if not os.path.isdir(pkg_dir):
-            continue
-        if allowed_pkg_ids is not None and name not in allowed_pkg_ids:
+def _readme_items(release_root, allowed_pkg_ids=None):
+    items = []
+    for name, pkg_dir in _release_pkg_dirs(release_root, allowed_pkg_ids):
+        for root, src in sorted(_list_readmes(pkg_dir).items()):
+            items.append((os.path.join("pkg", name, "readme", root, "README.txt"), src))
+    return items
+
+
+def build_plan(src, release_root=None):
+    """
+    Map every pkgstore path (relative to the destination state dir) to its
+    source file: the state tree, then pkg export dirs, finalized release tars
+    and README.txt files. Later sources win on the same path.
+    """
+    plan = {}
+    for rel, path in _tree_items(src, ""):
+        plan[rel] = path
+    if release_root:
+        allowed_pkg_ids = _list_pkg_ids(src)
+        for items in (
+            _export_dir_items(release_root, allowed_pkg_ids),
+            _release_tar_items(release_root, allowed_pkg_ids),
+            _readme_items(release_root, allowed_pkg_ids),
+        ):
+            for rel, path in items:
+                plan[rel] = path
+    plan.pop(MANIFEST_NAME, None)
+    return plan
+
+
+def _load_manifest(dest):
+    path = os.path.join(dest, MANIFEST_NAME)
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception:
+        return {}
+    if not isinstance(data, dict) or data.get("version") != _MANIFEST_VERSION:
+        return {}
+    files = data.get("files")
+    return files if isinstance(files, dict) else {}
+
+
+def _write_json_atomic(path, payload):
+    tmp = "%s.tmp-%d" % (path, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(payload, f, ensure_ascii=False, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _save_manifest(dest, files):
+    _write_json_atomic(os.path.join(dest, MANIFEST_NAME), {"version": _MANIFEST_VERSION, "files": files})
+
+
+LINK_MODES = ("copy", "hardlink", "reflink", "auto")
+# linux/fs.h FICLONE = _IOW(0x94, 9, int): share extents (btrfs, xfs, ...)
+_FICLONE = 0x40049409
+
+
+def _reflink(src, tmp):
+    import fcntl
+
+    with open(src, "rb") as fsrc, open(tmp, "wb") as fdst:
+        fcntl.ioctl(fdst.fileno(), _FICLONE, fsrc.fileno())
+    shutil.copystat(src, tmp)
+
+
+def _link_file(src, dest, mode):
+    """
+    Place dest as a reflink or hardlink of src (metadata-only). Returns the method
+    used, or None when linking is not possible (other filesystem, no support) and
+    the caller should copy. Hardlinks share the inode, so they are only used for
+    files that are never rewritten in place (finalized release tars).
+    """
+    parent = os.path.dirname(dest)
+    if not os.path.isdir(parent):
+        os.makedirs(parent)
+    tmp = "%s.tmp-%d" % (dest, os.getpid())
+    methods = ("reflink", "hardlink") if mode == "auto" else (mode,)
+    for method in methods:
+        try:
+            if method == "reflink":
+                _reflink(src, tmp)
+            else:
+                os.link(src, tmp)
+            os.replace(tmp, dest)
+            return method
+        except (OSError, IOError, ImportError):
+            if os.path.lexists(tmp):
+                os.remove(tmp)
+    return None
+
+
+def _is_release_tar(rel):
+    parts = rel.split(os.sep)
+    return len(parts) > 3 and parts[0] == "pkg" and parts[2] == "release_artifacts" and rel.endswith(".tar")
+
+
+def _unchanged(entry, st, dest):
+    if not isinstance(entry, dict):
+        return False
+    if entry.get("size") != st.st_size or entry.get("mtime_ns") != st.st_mtime_ns:
+        return False
+    try:
+        return os.path.getsize(dest) == st.st_size
+    except OSError:
+        return False
+
+
+def _stale_release_tars(dest, plan):
+    """Tars under release_artifacts that no longer have a source (pre-manifest exports)."""
+    stale = []
+    pkg_root = os.path.join(dest, "pkg")
+    if not os.path.isdir(pkg_root):
+        return stale
+    for name in os.listdir(pkg_root):
+        artifacts = os.path.join(pkg_root, name, "release_artifacts")
+        for rel, _ in _tree_items(artifacts, os.path.join("pkg", name, "release_artifacts")):
+            if rel.endswith(".tar") and rel not in plan:
+                stale.append(rel)
+    return stale
+
+
+def _format_bytes(count):
+    if count < 1024:
+        return "%d B" % count
+    value = float(count)
+    for unit in ("KB", "MB", "GB"):
+        value /= 1024.0
+        if value < 1024 or unit == "GB":
+            break
+    return "%.1f %s" % (value, unit)
+
+
+def sync_plan(plan, dest, link_mode="copy", engine=None, with_hash=True):
+    """
+    Bring dest in line with plan using the manifest from the previous export:
+    copy new files and files whose source size/mtime changed, remove files the
+    previous export wrote that have no source any more. With a link_mode other
+    than "copy", release tars are staged as reflinks/hardlinks when possible.
+    Copies run on `engine` (a copier.CopyEngine); with_hash=False skips the
+    manifest sha256 (the extra read of each copied source). Unchanged files keep
+    the sha256 already in the manifest.
+    Returns a report with the changed/removed relpaths ("copied" lists every
+    placed path, linked ones included).
+    """
+    if link_mode not in LINK_MODES:
+        raise RuntimeError("invalid link mode: %s" % link_mode)
+    if engine is None:
+        with copier.CopyEngine() as own_engine:
+            return sync_plan(plan, dest, link_mode=link_mode, engine=own_engine, with_hash=with_hash)
+    previous = _load_manifest(dest)
+    manifest = {}
+    report = {"copied": [], "removed": [], "unchanged": 0, "bytes": 0, "linked": 0}
+    pending = []
+    for rel in sorted(plan):
+        src = plan[rel]
+        try:
+            st = os.stat(src)
+        except OSError:
             continue
-        readmes = _list_readmes(pkg_dir)
-        if not readmes:
+        target = os.path.join(dest, rel)
+        entry = previous.get(rel)
+        if _unchanged(entry, st, target):
+            manifest[rel] = entry
+            report["unchanged"] += 1
             continue
-        for root, src in readmes.items():
-            dest_readme = os.path.join(pkg_root, name, "readme", root, "README.txt")
-            dest_parent = os.path.dirname(dest_readme)
-            if not os.path.exists(dest_parent):
-                os.makedirs(dest_parent)
-            shutil.copy2(src, dest_readme)
+        method = None
+        if link_mode != "copy" and _is_release_tar(rel):
+            method = _link_file(src, target, link_mode)
+        if method:
+            manifest[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": None, "link": method}
+            report["linked"] += 1
+        else:
+            manifest[rel] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": None}
+            pending.append((rel, engine.submit(src, target, with_hash=with_hash)))
+            report["bytes"] += st.st_size
+        report["copied"].append(rel)
+    for rel, future in pending:
+        manifest[rel]["sha256"] = future.result()
+    gone = set(rel for rel in previous if rel not in manifest)
+    gone.update(_stale_release_tars(dest, manifest))
+    for rel in sorted(gone):
+        target = os.path.join(dest, rel)
+        if os.path.isfile(target):
+            os.remove(target)
+        report["removed"].append(rel)
+    if gone:
+        _prune_empty_dirs(os.path.join(dest, "pkg"))
+    _save_manifest(dest, manifest)
+    return report
 
 
-def export_pkgstore(src, dest, clean=False, release_root=None, system_name=None):
+def export_pkgstore(
+    src,
+    dest,
+    clean=False,
+    release_root=None,
+    system_name=None,
+    link_mode="copy",
+    jobs=copier.DEFAULT_WORKERS,
+    with_hash=True,
+):
     if not os.path.isdir(src):
         raise RuntimeError("source not found: %s" % src)
     if clean and os.path.exists(dest):
         shutil.rmtree(dest)
     if not os.path.exists(dest):
         os.makedirs(dest)
-    _copy_tree(src, dest)
-    if release_root:
-        allowed_pkg_ids = _list_pkg_ids(src)
-        _copy_export_dirs(release_root, dest, allowed_pkg_ids=allowed_pkg_ids)
-        _copy_release_tars(release_root, dest, allowed_pkg_ids=allowed_pkg_ids)
-        _copy_readme_files(release_root, dest, system_name, allowed_pkg_ids=allowed_pkg_ids)
+    if os.path.exists(summary.log_path(src)):
+        # fold pending summary entries so pkgstore receives a current pkg-summary.json
+        summary.compact(state_dir=src)
+    with copier.CopyEngine(workers=jobs) as engine:
+        report = sync_plan(
+            build_plan(src, release_root=release_root),
+            dest,
+            link_mode=link_mode,
+            engine=engine,
+            with_hash=with_hash,
+        )
+    if engine.stats.files:
+        print("[export_pkgstore] copy %s" % engine.stats.summary())
+    print(
+        "[export_pkgstore] copied=%d (%s) linked=%d unchanged=%d removed=%d"
+        % (
+            len(report["copied"]) - report["linked"],
+            _format_bytes(report["bytes"]),
+            report["linked"],
+            report["unchanged"],
+            len(report["removed"]),
+        )
+    )
+    return report
+
+
+def _push_state_path(dest_state, target):
+    key = hashlib.sha1(target.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(dest_state, PUSH_STATE_PREFIX + key + ".json")
+
+
+def _load_push_state(path):
+    try:
+        with open(path, "r") as f:
+            data = json.load(f)
+    except Exception:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def _entry_key(entry):
+    if not isinstance(entry, dict):
+        return None
+    return (entry.get("size"), entry.get("mtime_ns"), entry.get("sha256"))
+
+
+def _changed_since(shipped, manifest):
+    """
+    (changed, deleted) relpaths of manifest relative to the manifest a target
+    last received, so syncs that ran in between (e.g. --dest only) are included.
+    """
+    changed = sorted(rel for rel, entry in manifest.items() if _entry_key(shipped.get(rel)) != _entry_key(entry))
+    deleted = sorted(rel for rel in shipped if rel not in manifest)
+    return changed, deleted
+
+
+def _shipped_manifest(state):
+    # push state from before "shipped" was recorded can't say what the target has
+    shipped = state.get("shipped") if isinstance(state, dict) else None
+    return shipped if isinstance(shipped, dict) else None
+
+
+def push(dest_state, host, remote_state, identity=None):
+    """
+    rsync dest_state to host:remote_state. Paths that differ from the manifest
+    as of the last successful push to this target are sent through --files-from
+    (deletions via --delete-missing-args); without push state for the target the
+    whole tree is sent once with --delete. The shipped manifest is only advanced
+    after rsync succeeds, so a failed push is retried in full next time.
+    """
+    target = "%s:%s" % (host, remote_state)
+    state_path = _push_state_path(dest_state, target)
+    shipped = _shipped_manifest(_load_push_state(state_path))
+    manifest = _load_manifest(dest_state)
+    paths = None
+    if shipped is not None:
+        changed, deleted = _changed_since(shipped, manifest)
+        paths = changed + deleted
+        if not paths:
+            print("[export_pkgstore] remote up to date: %s" % remote_state)
+            return
+    subprocess.check_call(["ssh", host, "mkdir", "-p", remote_state])
+    rsync_cmd = ["rsync", "-avz"]
+    if identity:
+        rsync_cmd.extend(["-e", "ssh -i %s" % identity])
+    src_dir = dest_state.rstrip("/") + "/"
+    list_path = None
+    try:
+        if paths is None:
+            rsync_cmd.extend(["--delete", "--exclude", "/.pkgstore-*"])
+            print("[export_pkgstore] rsync (full) -> %s" % remote_state)
+        else:
+            fd, list_path = tempfile.mkstemp(prefix="pkgstore_files_", suffix=".txt")
+            with os.fdopen(fd, "w") as f:
+                for rel in sorted(paths):
+                    f.write(rel + "\n")
+            rsync_cmd.extend(["--files-from", list_path, "--delete-missing-args"])
+            print("[export_pkgstore] rsync %d path(s) -> %s" % (len(paths), remote_state))
+        rsync_cmd.extend([src_dir, target])
+        subprocess.check_call(rsync_cmd)
+    finally:
+        if list_path and os.path.exists(list_path):
+            os.remove(list_path)
+    _write_json_atomic(state_path, {"target": target, "shipped": manifest})
+
+
+ARCHIVE_INDEX_NAME = ".pkgstore-index.json"
+APPLIED_NAME = ".pkgstore-applied.json"
+_ARCHIVE_TARGET = "archive"
+
+
+def _ensure_dir(path):
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    return path
+
+
+def _state_dir_for(root, system_name):
+    if system_name:
+        return os.path.join(root, "state", "systems", system_name)
+    return os.path.join(root, "state")
+
+
+def write_archive(dest_state, out_path, system_name=None):
+    """
+    Write the entries that differ from the manifest as of the previous archive
+    as one tar whose last member is an index (ARCHIVE_INDEX_NAME): sequence
+    numbers, the files with size/sha256 and the deleted paths. The first archive
+    for a staging dir is a full snapshot. The tar is written in stream mode, so
+    the receiver can apply it from a pipe; the archived manifest is only advanced
+    once the archive is complete.
+    """
+    state_path = _push_state_path(dest_state, _ARCHIVE_TARGET)
+    state = _load_push_state(state_path) or {}
+    shipped = _shipped_manifest(state)
+    manifest = _load_manifest(dest_state)
+    base = int(state["seq"]) if state.get("seq") else None
+    seq = (base or 0) + 1
+    if shipped is None:
+        # first archive, or state from before the archived manifest was kept
+        full = True
+        base = None
+        paths = sorted(manifest)
+        deleted = []
+    else:
+        full = False
+        paths, deleted = _changed_since(shipped, manifest)
+    index = {
+        "version": _MANIFEST_VERSION,
+        "system": system_name,
+        "seq": seq,
+        "base": base,
+        "full": full,
+        "created": time.strftime("%Y%m%dT%H%M%S", time.localtime()),
+        "files": [],
+        "deleted": deleted,
+    }
+    parent = os.path.dirname(os.path.abspath(out_path))
+    if parent and not os.path.isdir(parent):
+        os.makedirs(parent)
+    tmp = "%s.tmp-%d" % (out_path, os.getpid())
+    try:
+        with open(tmp, "wb") as f:
+            with tarfile.open(fileobj=f, mode="w|", format=tarfile.PAX_FORMAT) as tar:
+                for rel in paths:
+                    path = os.path.join(dest_state, rel)
+                    tar.add(path, arcname=rel, recursive=False)
+                    entry = manifest.get(rel) or {}
+                    index["files"].append({"path": rel, "size": os.path.getsize(path), "sha256": entry.get("sha256")})
+                payload = json.dumps(index, ensure_ascii=False, sort_keys=True).encode("utf-8")
+                info = tarfile.TarInfo(ARCHIVE_INDEX_NAME)
+                info.size = len(payload)
+                info.mtime = int(time.time())
+                tar.addfile(info, io.BytesIO(payload))
+        os.replace(tmp, out_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    _write_json_atomic(state_path, {"target": _ARCHIVE_TARGET, "seq": seq, "shipped": manifest})
+    print(
+        "[export_pkgstore] archive seq=%d%s files=%d deleted=%d -> %s"
+        % (seq, " (full)" if full else "", len(paths), len(deleted), out_path)
+    )
+    return index
+
+
+def _safe_member_path(name):
+    rel = os.path.normpath(name)
+    if os.path.isabs(rel) or rel == ".." or rel.startswith(".." + os.sep):
+        raise RuntimeError("unsafe archive path: %s" % name)
+    return rel
+
+
+def _read_archive_into(fileobj, stage):
+    index = None
+    with tarfile.open(fileobj=fileobj, mode="r|") as tar:
+        for member in tar:
+            if member.name == ARCHIVE_INDEX_NAME:
+                index = json.loads(tar.extractfile(member).read().decode("utf-8"))
+                continue
+            if not member.isfile():
+                raise RuntimeError("unexpected archive member: %s" % member.name)
+            target = os.path.join(stage, _safe_member_path(member.name))
+            parent = os.path.dirname(target)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            src = tar.extractfile(member)
+            with open(target, "wb") as out:
+                shutil.copyfileobj(src, out, 1024 * 1024)
+            os.utime(target, (member.mtime, member.mtime))
+    return index
+
+
+def _verify_staged(stage, index):
+    for entry in index.get("files") or []:
+        path = os.path.join(stage, _safe_member_path(entry["path"]))
+        if not os.path.isfile(path) or os.path.getsize(path) != entry.get("size"):
+            raise RuntimeError("archive entry missing or truncated: %s" % entry["path"])
+        if entry.get("sha256"):
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(chunk)
+            if h.hexdigest() != entry["sha256"]:
+                raise RuntimeError("archive entry checksum mismatch: %s" % entry["path"])
+
+
+def apply_archive(archive, dest_root, force=False):
+    """
+    Apply an archive from write_archive() under dest_root (the pkgstore root; the
+    system dir comes from the index). Every member is staged and verified inside
+    the target dir first, so a truncated or out-of-order archive changes nothing;
+    files are then renamed into place and deletions applied. Archives must be
+    applied in sequence unless they are full snapshots (or force is set).
+    """
+    stream = archive if hasattr(archive, "read") else None
+    probe = tempfile.mkdtemp(prefix=".pkgstore-apply-", dir=_ensure_dir(dest_root))
+    try:
+        if stream is None:
+            with open(archive, "rb") as f:
+                index = _read_archive_into(f, probe)
+        else:
+            index = _read_archive_into(stream, probe)
+        if not isinstance(index, dict):
+            raise RuntimeError("archive has no index footer (truncated?)")
+        _verify_staged(probe, index)
+        target = _state_dir_for(dest_root, index.get("system"))
+        applied_path = os.path.join(target, APPLIED_NAME)
+        applied = _load_push_state(applied_path) or {}
+        if not index.get("full") and not force and applied.get("seq") != index.get("base"):
+            raise RuntimeError(
+                "archive seq=%s expects base=%s but %s is at seq=%s"
+                % (index.get("seq"), index.get("base"), target, applied.get("seq"))
+            )
+        tracked = set(applied.get("files") or [])
+        written = [entry["path"] for entry in index.get("files") or []]
+        removed = list(index.get("deleted") or [])
+        if index.get("full"):
+            removed.extend(sorted(tracked - set(written)))
+            tracked = set()
+        _ensure_dir(target)
+        for rel in written:
+            dest = os.path.join(target, _safe_member_path(rel))
+            _ensure_dir(os.path.dirname(dest))
+            os.replace(os.path.join(probe, _safe_member_path(rel)), dest)
+        for rel in removed:
+            dest = os.path.join(target, _safe_member_path(rel))
+            if os.path.isfile(dest):
+                os.remove(dest)
+        if removed and os.path.isdir(os.path.join(target, "pkg")):
+            _prune_empty_dirs(os.path.join(target, "pkg"))
+        tracked.update(written)
+        tracked.difference_update(removed)
+        _write_json_atomic(
+            applied_path,
+            {"seq": index.get("seq"), "system": index.get("system"), "files": sorted(tracked)},
+        )
+    finally:
+        shutil.rmtree(probe, ignore_errors=True)
+    print(
+        "[export_pkgstore] applied seq=%s files=%d deleted=%d -> %s"
+        % (index.get("seq"), len(written), len(removed), target)
+    )
+    return index
 
 
-def main(argv=None):
+def _default_staging():
+    return os.path.join(config.DEFAULT_CACHE_DIR, "pkgstore")
+
+
+def main(argv=None, context=None):
+    """Entry point; `context` is passed by pkgmgr module actions (cfg, pkg_id, ...)."""
+    cfg = (context or {}).get("cfg") or {}
+    default_release_root = cfg.get("pkg_release_root") or _default_release_root()
     parser = argparse.ArgumentParser(description="Export pkgmgr state into a pkgstore directory.")
     parser.add_argument("--src", default=_default_src(), help="pkgmgr state root (default: ~/pkgmgr/local/state)")
     parser.add_argument("--dest", help="pkgstore destination root (will create /state)")
     parser.add_argument("--clean", action="store_true", help="clean destination state before export")
-    parser.add_argument("--release-root", default=_default_release_root(), help="PKG/RELEASE root (default: ~/PKG/RELEASE)")
+    parser.add_argument(
+        "--release-root",
+        default=default_release_root,
+        help="PKG/RELEASE root (default: pkg_release_root when run as an action, else ~/PKG/RELEASE)",
+    )
     parser.add_argument("--system", help="system identifier (writes to pkgstore/state/systems/<system>)")
     parser.add_argument("--push", help="rsync target like user@host (pushes to remote)")
     parser.add_argument("--remote-dest", default="~/data/pkgstore", help="remote pkgstore root (default: ~/data/pkgstore)")
     parser.add_argument("--identity", help="ssh private key path for rsync (optional)")
+    parser.add_argument(
+        "--link-mode",
+        choices=LINK_MODES,
+        help="how release tars are staged: copy, hardlink, reflink or auto (reflink, then hardlink, "
+        "then copy). Default: auto for --push staging, copy for --dest",
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=copier.DEFAULT_WORKERS,
+        help="parallel copy workers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-hash",
+        action="store_true",
+        help="skip manifest sha256 (saves one read of every copied file)",
+    )
+    parser.add_argument(
+        "--staging",
+        help="staging root used with --push when --dest is not set (default: ~/pkgmgr/cache/pkgstore)",
+    )
+    parser.add_argument(
+        "--archive",
+        help="also write the entries changed since the previous archive into one tar (index footer)",
+    )
+    parser.add_argument(
+        "--apply",
+        help="apply an archive written by --archive under --dest ('-' reads stdin) and exit",
+    )
+    parser.add_argument("--force", action="store_true", help="with --apply: ignore the archive sequence check")
     parser.add_argument("--debug", action="store_true", help="print debug info about source contents")
     args = parser.parse_args(argv)
-    if not args.dest and not args.push:
-        parser.error("--dest is required when --push is not set")
+    if args.apply:
+        if not args.dest:
+            parser.error("--dest is required with --apply")
+        dest_root = os.path.abspath(os.path.expanduser(args.dest))
+        archive = sys.stdin.buffer if args.apply == "-" else os.path.abspath(os.path.expanduser(args.apply))
+        apply_archive(archive, dest_root, force=args.force)
+        return 0
+    if not args.dest and not args.push and not args.archive:
+        parser.error("--dest is required when --push/--archive is not set")
 
     src = os.path.abspath(os.path.expanduser(args.src))
-    tmp_root = None
     if args.dest:
         dest_root = os.path.abspath(os.path.expanduser(args.dest))
     else:
-        tmp_root = tempfile.mkdtemp(prefix="pkgstore_")
-        dest_root = tmp_root
+        # persistent staging keeps the manifest, so repeated pushes stay incremental
+        dest_root = os.path.abspath(os.path.expanduser(args.staging or _default_staging()))
     system_name = args.system or socket.gethostname()
-    if system_name:
-        dest_state = os.path.join(dest_root, "state", "systems", system_name)
-    else:
-        dest_state = os.path.join(dest_root, "state")
+    dest_state = _state_dir_for(dest_root, system_name)
     release_root = os.path.abspath(os.path.expanduser(args.release_root)) if args.release_root else None
+    link_mode = args.link_mode or ("copy" if args.dest else "auto")
 
     if args.debug:
         try:
@@ -204,14 +696,19 @@ def main(argv=None):
         except Exception:
             items = []
         print("[export_pkgstore] src=%s pkg=%s" % (src, ", ".join(items) or "-"))
-    export_pkgstore(
+    report = export_pkgstore(
         src,
         dest_state,
         clean=args.clean,
         release_root=release_root,
         system_name=system_name,
+        link_mode=link_mode,
+        jobs=args.jobs,
+        with_hash=not args.no_hash,
     )
     print("[export_pkgstore] synced %s -> %s" % (src, dest_state))
+    if args.archive:
+        write_archive(dest_state, os.path.abspath(os.path.expanduser(args.archive)), system_name=system_name)
 
     if args.push:
         remote_root = args.remote_dest.rstrip("/")
@@ -219,20 +716,9 @@ def main(argv=None):
             remote_state = "%s/state/systems/%s" % (remote_root, system_name)
         else:
             remote_state = "%s/state" % remote_root
-        src_dir = dest_state.rstrip("/") + "/"
-        subprocess.check_call(
-            ["ssh", args.push, "mkdir", "-p", remote_state]
-        )
-        rsync_cmd = ["rsync", "-avzc", "--delete"]
-        if args.identity:
-            rsync_cmd.extend(["-e", "ssh -i %s" % args.identity])
-        rsync_cmd.extend([src_dir, "%s:%s" % (args.push, remote_state)])
-        print("[export_pkgstore] rsync -> %s" % (remote_state,))
-        subprocess.check_call(rsync_cmd)
+        push(dest_state, args.push, remote_state, identity=args.identity)
     else:
         print("[export_pkgstore] push skipped (no --push)")
-    if tmp_root:
-        shutil.rmtree(tmp_root)
     return 0
 
 
@@ -1,22 +1,29 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 import argparse
-import json
+import collections
+import hashlib
 import os
+import re
 import subprocess
 import sys
+import threading
 import time
 import fnmatch
+import glob
+from concurrent.futures import ThreadPoolExecutor
+from xml.sax.saxutils import escape as xml_escape
 
-from pkgmgr import config
+from pkgmgr import config, updates
 
 try:
     from docx import Document
-    from docx.shared import Pt, RGBColor
+    from docx.oxml import parse_xml
+    from docx.oxml.ns import nsdecls
 except Exception:
     Document = None
-    Pt = None
-    RGBColor = None
+    parse_xml = None
+    nsdecls = None
 
 
 def _load_pkg_yaml(pkg_dir, pkg_yaml):
@@ -27,26 +34,9 @@ def _load_pkg_yaml(pkg_dir, pkg_yaml):
     return os.path.join(pkg_dir, "pkg.yaml")
 
 
-def _read_update_json(path):
-    with open(path, "rb") as f:
-        raw = f.read()
-    for encoding in ("utf-8", "euc-kr", "cp949"):
-        try:
-            return json.loads(raw.decode(encoding))
-        except Exception:
-            continue
-    return json.loads(raw.decode("utf-8", errors="replace"))
-
-
 def _find_latest_update(pkg_id):
-    updates_dir = os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(pkg_id), "updates")
-    if not os.path.isdir(updates_dir):
-        return None
-    candidates = [name for name in os.listdir(updates_dir) if name.startswith("update-") and name.endswith(".json")]
-    if not candidates:
-        return None
-    candidates.sort()
-    return os.path.join(updates_dir, candidates[-1])
+    path, _ = updates.latest_update(pkg_id)
+    return path
 
 
 def _decode_output(raw):
@@ -92,7 +82,7 @@ def _git_log_first_commit(repo_root, keyword):
     return lines[0].strip() if lines else None
 
 
-def _resolve_repo_root(pkg_cfg, pkg_dir, update_data):
+def _resolve_repo_root(pkg_cfg, pkg_dir, record):
     repo_root = (pkg_cfg.get("git") or {}).get("repo_root") if pkg_cfg else None
     if repo_root:
         repo_root = os.path.expanduser(repo_root)
@@ -100,7 +90,8 @@ def _resolve_repo_root(pkg_cfg, pkg_dir, update_data):
             repo_root = os.path.abspath(os.path.join(pkg_dir or os.getcwd(), repo_root))
         if os.path.isdir(repo_root):
             return repo_root
-    git_files = list(((update_data.get("checksums") or {}).get("git_files") or {}).keys())
+    # only now pay for the checksums sidecar
+    git_files = list((record.checksums().get("git_files") or {}).keys())
     for path in git_files:
         base = os.path.dirname(path)
         root = _git_rev_parse(base, ["--show-toplevel"])
@@ -110,20 +101,18 @@ def _resolve_repo_root(pkg_cfg, pkg_dir, update_data):
     return root
 
 
-def _resolve_pkg_output_dir(pkg_id, pkg_cfg, config_path=None):
+def _resolve_pkg_output_dir(pkg_id, pkg_cfg, config_path=None, main_cfg=None):
     if pkg_cfg:
         pkg_block = pkg_cfg.get("pkg") or {}
         root = pkg_block.get("root")
         if root:
             return os.path.abspath(os.path.expanduser(str(root)))
-    if config_path:
+    if main_cfg is None:
         try:
-            main_cfg = config.load_main(path=config_path, allow_interactive=False)
-        except Exception:
-            main_cfg = None
-    else:
-        try:
-            main_cfg = config.load_main(allow_interactive=False)
+            if config_path:
+                main_cfg = config.load_main(path=config_path, allow_interactive=False)
+            else:
+                main_cfg = config.load_main(allow_interactive=False)
         except Exception:
             main_cfg = None
     if not main_cfg:
@@ -358,6 +347,165 @@ def _git_diff(repo_root, start_commit, path):
         return "[export_source_review] git diff failed for %s: %s" % (path, str(exc))
 
 
+# Diff cache: `git diff -U3 -M -C <start> HEAD -- <path>` only depends on the
+# path's blob and mode at <start> and at HEAD, so results are stored under
+# DEFAULT_CACHE_DIR/source_review keyed by those (not the HEAD commit); an
+# unrelated commit leaves every other file's entry valid. Hits refresh the
+# entry's mtime and `pkgmgr gc` drops entries unused for gc.cache_max_age_days.
+_DIFF_OPTIONS = ("-U3", "-M", "-C")
+_DIFF_CACHE_VERSION = "2"
+
+
+def _git_tree_blobs(repo_root, rev):
+    """{path: (mode, blob id)} for every entry in rev (one ls-tree call instead of cat-file per path)."""
+    cmd = ["git", "ls-tree", "-r", "-z", "--full-tree", rev]
+    try:
+        out = subprocess.check_output(cmd, cwd=repo_root, stderr=subprocess.PIPE)
+    except Exception:
+        return {}
+    blobs = {}
+    for item in out.split(b"\0"):
+        if not item or b"\t" not in item:
+            continue
+        meta, path = item.split(b"\t", 1)
+        parts = meta.split()
+        if len(parts) >= 3:
+            blobs[path.decode("utf-8", errors="surrogateescape")] = (parts[0].decode("ascii"), parts[2].decode("ascii"))
+    return blobs
+
+
+class DiffCache(object):
+    def __init__(self, root=None):
+        self.root = root or os.path.join(config.DEFAULT_CACHE_DIR, "source_review")
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def key(self, repo_root, start_commit, path, start_blob, head_blob):
+        """start_blob/head_blob are (mode, blob id) entries from _git_tree_blobs, or None."""
+        raw = "\0".join(
+            [
+                _DIFF_CACHE_VERSION,
+                os.path.abspath(repo_root),
+                start_commit,
+                path,
+                " ".join(start_blob) if start_blob else "-",
+                " ".join(head_blob) if head_blob else "-",
+                " ".join(_DIFF_OPTIONS),
+            ]
+        )
+        return hashlib.sha1(raw.encode("utf-8", errors="surrogateescape")).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key + ".diff")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                text = f.read().decode("utf-8")
+        except (IOError, OSError, UnicodeDecodeError):
+            self._count(False)
+            return None
+        try:
+            # gc prunes by mtime; entries still in use stay fresh
+            os.utime(path, None)
+        except OSError:
+            pass
+        self._count(True)
+        return text
+
+    def put(self, key, text):
+        path = self._path(key)
+        parent = os.path.dirname(path)
+        try:
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            tmp = "%s.tmp-%d-%d" % (path, os.getpid(), threading.current_thread().ident or 0)
+            with open(tmp, "wb") as f:
+                f.write(text.encode("utf-8"))
+            os.replace(tmp, path)
+        except (IOError, OSError):
+            pass
+
+
+def _cached_diff(cache, repo_root, start_commit, path, start_blobs, head_blobs):
+    """_git_diff() through the cache; only results fully determined by the two blobs are stored."""
+    head_blob = head_blobs.get(path)
+    start_blob = start_blobs.get(path)
+    if cache is None or not head_blob:
+        return _git_diff(repo_root, start_commit, path)
+    key = cache.key(repo_root, start_commit, path, start_blob, head_blob)
+    hit = cache.get(key)
+    if hit is not None:
+        return hit
+    diff_text = _git_diff(repo_root, start_commit, path)
+    failed = diff_text.startswith("[export_source_review] git diff failed")
+    # an empty diff for a path missing at <start> falls back to the worktree; keep that uncached
+    if not failed and (start_blob or diff_text.strip()):
+        cache.put(key, diff_text)
+    return diff_text
+
+
+# Diff bodies are emitted as one paragraph built from XML text in bulk: runs
+# carry one of three pre-built property sets and consecutive lines of the same
+# kind share a run (joined by <w:br/>), instead of one python-docx Run object
+# with font/colour set per line.
+_RPR_BASE = '<w:rFonts w:ascii="Courier New" w:hAnsi="Courier New"/>%s<w:sz w:val="18"/>'
+_RUN_PROPS = {
+    "add": "<w:rPr>" + (_RPR_BASE % '<w:color w:val="FF0000"/>') + "</w:rPr>",
+    "del": "<w:rPr>" + (_RPR_BASE % '<w:color w:val="808080"/>') + "</w:rPr>",
+    "ctx": "<w:rPr>" + (_RPR_BASE % "") + "</w:rPr>",
+}
+# characters XML 1.0 cannot carry (python-docx would raise on them)
+_XML_ILLEGAL = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+def _line_kind(line):
+    if line.startswith("+") and not line.startswith("+++"):
+        return "add"
+    if line.startswith("-") and not line.startswith("---"):
+        return "del"
+    return "ctx"
+
+
+def _line_xml(line):
+    parts = _XML_ILLEGAL.sub("?", line).split("\t")
+    out = []
+    for idx, part in enumerate(parts):
+        if idx:
+            out.append("<w:tab/>")
+        if part:
+            out.append('<w:t xml:space="preserve">%s</w:t>' % xml_escape(part))
+    return "".join(out)
+
+
+def _diff_paragraph_xml(lines):
+    chunks = ["<w:p %s>" % nsdecls("w")]
+    kind = None
+    for idx, line in enumerate(lines):
+        line_kind = _line_kind(line)
+        if line_kind != kind:
+            if kind is not None:
+                chunks.append("</w:r>")
+            chunks.append("<w:r>" + _RUN_PROPS[line_kind])
+            kind = line_kind
+        if idx:
+            chunks.append("<w:br/>")
+        chunks.append(_line_xml(line))
+    if kind is not None:
+        chunks.append("</w:r>")
+    chunks.append("</w:p>")
+    return "".join(chunks)
+
+
 def _add_diff_table(doc, file_path, diff_text):
     table = doc.add_table(rows=2, cols=1)
     try:
@@ -369,27 +517,158 @@ def _add_diff_table(doc, file_path, diff_text):
     if header.paragraphs and header.paragraphs[0].runs:
         header.paragraphs[0].runs[0].bold = True
     body = table.cell(1, 0)
-    body.text = ""
-    paragraph = body.paragraphs[0]
     text = diff_text or "No changes in range."
     lines = text.splitlines() or [text]
-    for idx, line in enumerate(lines):
-        run = paragraph.add_run(line)
-        if Pt is not None:
-            run.font.name = "Courier New"
-            run.font.size = Pt(9)
-        if RGBColor is not None:
-            if line.startswith("+") and not line.startswith("+++"):
-                run.font.color.rgb = RGBColor(0xFF, 0x00, 0x00)
-            elif line.startswith("-") and not line.startswith("---"):
-                run.font.color.rgb = RGBColor(0x80, 0x80, 0x80)
-        if idx < len(lines) - 1:
-            run.add_break()
+    old = body.paragraphs[0]._p
+    old.addnext(parse_xml(_diff_paragraph_xml(lines)))
+    old.getparent().remove(old)
     doc.add_paragraph("")
 
 
-def main(argv=None):
+def _review_file(path, repo_root, start_commit, ignore_patterns, cache, start_blobs, head_blobs):
+    """Resolve one listed path and diff it; returns (head_path, diff_text, skip_message)."""
+    if _is_ignored(path, repo_root, ignore_patterns):
+        return None, None, "skip (ignored): %s" % path
+    head_path = path if path in head_blobs else _pick_head_path(repo_root, path)
+    if not head_path:
+        return None, None, "skip (file deleted or untracked in HEAD): %s" % path
+    if _is_ignored(head_path, repo_root, ignore_patterns):
+        return None, None, "skip (ignored): %s" % head_path
+    return head_path, _cached_diff(cache, repo_root, start_commit, head_path, start_blobs, head_blobs), None
+
+
+def _bounded_map(pool, func, items, window):
+    """pool.map() that keeps at most `window` results pending, yielding in input order."""
+    pending = collections.deque()
+    for item in items:
+        pending.append(pool.submit(func, item))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def _truncate_lines(diff_text, max_lines):
+    if not diff_text or not max_lines:
+        return diff_text
+    lines = diff_text.splitlines()
+    if len(lines) <= max_lines:
+        return diff_text
+    kept = lines[:max_lines]
+    kept.append("... truncated: %d more line(s) (--max-lines-per-file %d)" % (len(lines) - max_lines, max_lines))
+    return "\n".join(kept)
+
+
+def _count_lines(diff_text):
+    return len((diff_text or "No changes in range.").splitlines()) or 1
+
+
+class _Volumes(object):
+    """
+    Writes diff tables into one document, or into `<out>-volNNN.docx` volumes of
+    at most max_lines diff lines each (a file is never split across volumes) plus
+    an index at `<out>` when the budget is exceeded. Each volume is saved and
+    dropped as soon as it is full, so memory is bounded by the budget.
+    """
+
+    def __init__(self, out_path, header, max_lines=None):
+        self.out_path = out_path
+        self.header = header
+        self.max_lines = max_lines or None
+        self.saved = []
+        self.doc = None
+        self.lines = 0
+        self.files = []
+
+    def _base(self):
+        return self.out_path[: -len(".docx")] if self.out_path.lower().endswith(".docx") else self.out_path
+
+    def _volume_path(self, number):
+        return "%s-vol%03d.docx" % (self._base(), number)
+
+    def _remove_stale_volumes(self):
+        # volumes left by an earlier, larger export would otherwise look current
+        written = set(path for path, _, _ in self.saved)
+        for path in glob.glob(glob.escape(self._base()) + "-vol[0-9][0-9][0-9].docx"):
+            if path in written:
+                continue
+            try:
+                os.remove(path)
+                print("[export_source_review] removed stale volume %s" % path)
+            except OSError:
+                pass
+
+    def _start(self):
+        self.doc = Document()
+        for line in self.header:
+            self.doc.add_paragraph(line)
+        self.doc.add_paragraph("Volume: %d" % (len(self.saved) + 1))
+        self.doc.add_paragraph("")
+        self.lines = 0
+        self.files = []
+
+    def _flush(self, path):
+        self.doc.save(path)
+        self.saved.append((path, list(self.files), self.lines))
+        print("[export_source_review] wrote %s (files=%d lines=%d)" % (path, len(self.files), self.lines))
+        self.doc = None
+
+    def add(self, file_path, diff_text):
+        count = _count_lines(diff_text)
+        if self.doc is not None and self.max_lines and self.files and self.lines + count > self.max_lines:
+            self._flush(self._volume_path(len(self.saved) + 1))
+        if self.doc is None:
+            self._start()
+        _add_diff_table(self.doc, file_path, diff_text)
+        self.lines += count
+        self.files.append(file_path)
+
+    def close(self):
+        if self.doc is None and not self.saved:
+            self._start()
+        if not self.saved:
+            # everything fit: a single document at the requested path, as before
+            self.doc.save(self.out_path)
+            print("[export_source_review] wrote %s" % self.out_path)
+            self._remove_stale_volumes()
+            return [self.out_path]
+        if self.doc is not None:
+            self._flush(self._volume_path(len(self.saved) + 1))
+        self._write_index()
+        self._remove_stale_volumes()
+        return [path for path, _, _ in self.saved] + [self.out_path]
+
+    def _write_index(self):
+        doc = Document()
+        for line in self.header:
+            doc.add_paragraph(line)
+        doc.add_paragraph("Volumes: %d (max %d lines each)" % (len(self.saved), self.max_lines))
+        doc.add_paragraph("")
+        table = doc.add_table(rows=1, cols=4)
+        try:
+            table.style = "Table Grid"
+        except Exception:
+            pass
+        for cell, title in zip(table.rows[0].cells, ("Volume", "Document", "Lines", "Files")):
+            cell.text = title
+        for number, (path, files, lines) in enumerate(self.saved, 1):
+            row = table.add_row().cells
+            row[0].text = str(number)
+            row[1].text = os.path.basename(path)
+            row[2].text = str(lines)
+            row[3].text = "\n".join(files)
+        doc.save(self.out_path)
+        print("[export_source_review] wrote index %s (volumes=%d)" % (self.out_path, len(self.saved)))
+
+
+def _default_jobs():
+    return min(8, os.cpu_count() or 1)
+
+
+def main(argv=None, context=None):
+    """Entry point; `context` is passed by pkgmgr module actions (cfg, pkg_id, ...)."""
     argv = argv if argv is not None else sys.argv[1:]
+    context = context or {}
     parser = argparse.ArgumentParser(
         description="Export per-file diff history for a keyword into a Word document."
     )
@@ -397,6 +676,29 @@ def main(argv=None):
     parser.add_argument("--pkg-id", required=True, help="pkg id (used to locate latest update JSON)")
     parser.add_argument("--docx", required=True, help="output docx path")
     parser.add_argument("--ignore", action="append", help="glob patterns to ignore")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=_default_jobs(),
+        help="parallel git diff workers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--max-lines-per-file",
+        type=int,
+        default=None,
+        help="truncate each file's diff after N lines (default: unlimited)",
+    )
+    parser.add_argument(
+        "--max-lines-per-doc",
+        type=int,
+        default=100000,
+        help="start a new volume when a document would exceed N diff lines; 0 disables (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-diff-cache",
+        action="store_true",
+        help="always run git diff (skip ~/pkgmgr/cache/source_review)",
+    )
     args = parser.parse_args(argv)
 
     if Document is None:
@@ -416,8 +718,8 @@ def main(argv=None):
         print("[export_source_review] update json not found: %s" % update_path)
         return 1
 
-    data = _read_update_json(update_path)
-    git_info = data.get("git") or {}
+    record = updates.open_update(update_path)
+    git_info = record.git()
     commits = git_info.get("commits") or []
     keyword, multi_keywords = _select_keyword(git_info)
     if not keyword:
@@ -426,7 +728,7 @@ def main(argv=None):
     if multi_keywords:
         print("[export_source_review] multiple keywords found; using %s" % keyword)
 
-    repo_root = _resolve_repo_root(pkg_cfg, pkg_dir, data)
+    repo_root = _resolve_repo_root(pkg_cfg, pkg_dir, record)
     if not repo_root:
         print("[export_source_review] repo root not found for pkg: %s" % args.pkg_id)
         return 1
@@ -444,7 +746,7 @@ def main(argv=None):
     start_commit = _git_parent(repo_root, commit_hash)
     file_list = _collect_files(commits, keyword)
     if not file_list:
-        git_files = list(((data.get("checksums") or {}).get("git_files") or {}).keys())
+        git_files = list((record.checksums().get("git_files") or {}).keys())
         for path in git_files:
             if path.startswith(repo_root):
                 file_list.append(os.path.relpath(path, repo_root))
@@ -456,33 +758,14 @@ def main(argv=None):
 
     ignore_patterns = _parse_ignore_patterns([args.ignore, os.environ.get("PKGMGR_REVIEW_IGNORE")])
 
-    doc = Document()
-    doc.add_paragraph("Source Review Export")
-    doc.add_paragraph("Keyword: %s" % keyword)
-    doc.add_paragraph("Range: %s..HEAD" % start_commit)
-    doc.add_paragraph("Update JSON: %s" % update_path)
-    doc.add_paragraph("")
-
-    for path in file_list:
-        if _is_ignored(path, repo_root, ignore_patterns):
-            print("[export_source_review] skip (ignored): %s" % path)
-            continue
-        head_path = _pick_head_path(repo_root, path)
-        if not head_path:
-            print("[export_source_review] skip (file deleted or untracked in HEAD): %s" % path)
-            continue
-        if _is_ignored(head_path, repo_root, ignore_patterns):
-            print("[export_source_review] skip (ignored): %s" % head_path)
-            continue
-        diff_text = _git_diff(repo_root, start_commit, head_path)
-        _add_diff_table(doc, head_path, diff_text)
-
     out_path = args.docx
     if not out_path.lower().endswith(".docx"):
         out_path = out_path + ".docx"
     config_path = args.config or os.environ.get("PKGMGR_CONFIG")
     if os.sep not in out_path:
-        base_dir = _resolve_pkg_output_dir(args.pkg_id, pkg_cfg, config_path=config_path)
+        base_dir = _resolve_pkg_output_dir(
+            args.pkg_id, pkg_cfg, config_path=config_path, main_cfg=context.get("cfg")
+        )
         if not base_dir:
             base_dir = pkg_dir or os.path.join(config.DEFAULT_STATE_DIR, "pkg", str(args.pkg_id))
         export_dir = os.path.join(base_dir, "export")
@@ -490,8 +773,36 @@ def main(argv=None):
     out_dir = os.path.dirname(os.path.abspath(out_path))
     if out_dir and not os.path.exists(out_dir):
         os.makedirs(out_dir)
-    doc.save(out_path)
-    print("[export_source_review] wrote %s" % out_path)
+
+    cache = None if args.no_diff_cache else DiffCache()
+    start_blobs = _git_tree_blobs(repo_root, start_commit)
+    head_blobs = _git_tree_blobs(repo_root, "HEAD")
+
+    header = [
+        "Source Review Export",
+        "Keyword: %s" % keyword,
+        "Range: %s..HEAD" % start_commit,
+        "Update JSON: %s" % update_path,
+    ]
+    volumes = _Volumes(out_path, header, max_lines=args.max_lines_per_doc)
+
+    def _review(path):
+        head_path, diff_text, skip = _review_file(
+            path, repo_root, start_commit, ignore_patterns, cache, start_blobs, head_blobs
+        )
+        return head_path, _truncate_lines(diff_text, args.max_lines_per_file), skip
+
+    # git runs in subprocesses, so threads overlap the diffs; tables are added in list order
+    # and only a bounded window of diffs is in flight at once
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+        for head_path, diff_text, skip in _bounded_map(pool, _review, file_list, max(1, args.jobs) * 2):
+            if skip:
+                print("[export_source_review] %s" % skip)
+                continue
+            volumes.add(head_path, diff_text)
+    if cache is not None:
+        print("[export_source_review] diff cache hits=%d misses=%d" % (cache.hits, cache.misses))
+    volumes.close()
     return 0
 
 
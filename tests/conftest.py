@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def _no_config_cache(monkeypatch):
+    # keep tests from writing pickled configs into the real ~/pkgmgr/cache
+    monkeypatch.setenv("PKGMGR_NO_CONFIG_CACHE", "1")
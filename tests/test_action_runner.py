@@ -0,0 +1,314 @@
+import io
+import os
+import sys
+import time
+from importlib import import_module, reload
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+config = import_module("pkgmgr.config")
+updates = import_module("pkgmgr.updates")
+action_runner = import_module("pkgmgr.action_runner")
+reload(config)
+reload(updates)
+reload(action_runner)
+
+
+def _cfg(tmp_path, actions, **runner):
+    settings = {"max_workers": 4, "log_dir": str(tmp_path / "logs"), "timeout_sec": None}
+    settings.update(runner)
+    return {"actions": actions, "action_runner": settings}
+
+
+def test_sequential_actions_keep_order_and_result_shape(tmp_path):
+    trace = tmp_path / "trace.txt"
+    cfg = _cfg(
+        tmp_path,
+        {
+            "a": [{"cmd": "echo a1 >> %s" % trace}, {"cmd": "echo a2 >> %s" % trace}],
+            "b": [{"cmd": "echo b >> %s" % trace}],
+        },
+    )
+
+    results = action_runner.run_actions(cfg, ["b", "a", "missing"])
+
+    assert trace.read_text().split() == ["b", "a1", "a2"]
+    assert results == [
+        {"name": "b", "status": "ok", "rc": 0},
+        {"name": "a", "status": "ok", "rc": 0},
+        {"name": "a", "status": "ok", "rc": 0},
+        {"name": "missing", "status": "missing", "rc": None},
+    ]
+
+
+def test_parallel_actions_overlap_and_log_to_files(tmp_path):
+    actions = {
+        name: {"parallel": True, "commands": [{"cmd": "sleep 0.6; echo from-%s" % name}]}
+        for name in ("x", "y", "z")
+    }
+    cfg = _cfg(tmp_path, actions)
+
+    started = time.time()
+    results = action_runner.run_actions(cfg, ["x", "y", "z"])
+    elapsed = time.time() - started
+
+    assert elapsed < 1.5
+    assert [r["name"] for r in results] == ["x", "y", "z"]
+    assert all(r["status"] == "ok" for r in results)
+    logs = sorted((tmp_path / "logs").iterdir())
+    assert len(logs) == 3
+    assert "from-x" in [p for p in logs if p.name.endswith("-x.log")][0].read_text()
+
+
+def test_depends_on_orders_and_skips_after_failure(tmp_path):
+    trace = tmp_path / "trace.txt"
+    cfg = _cfg(
+        tmp_path,
+        {
+            "notify": {"depends_on": ["build"], "commands": [{"cmd": "echo notify >> %s" % trace}]},
+            "build": {"parallel": True, "commands": [{"cmd": "echo build >> %s" % trace}]},
+            "lint": {"parallel": True, "commands": [{"cmd": "exit 3"}]},
+            "report": {"depends_on": ["lint"], "commands": [{"cmd": "echo report >> %s" % trace}]},
+        },
+    )
+
+    results = action_runner.run_actions(cfg, ["notify", "report", "build", "lint"])
+
+    assert trace.read_text().split() == ["build", "notify"]
+    assert results == [
+        {"name": "notify", "status": "ok", "rc": 0},
+        {"name": "report", "status": "skipped", "rc": None},
+        {"name": "build", "status": "ok", "rc": 0},
+        {"name": "lint", "status": "failed", "rc": 3},
+    ]
+
+
+def test_timeout_stops_command(tmp_path):
+    cfg = _cfg(tmp_path, {"slow": {"timeout": 0.3, "commands": [{"cmd": "sleep 5"}]}})
+
+    started = time.time()
+    results = action_runner.run_actions(cfg, ["slow"])
+
+    assert time.time() - started < 4
+    assert results == [{"name": "slow", "status": "timeout", "rc": None}]
+
+
+def test_timeout_stops_relayed_command(tmp_path, monkeypatch):
+    # under `pkgmgr serve` stdout has no fileno and output is relayed through a pipe
+    out = io.StringIO()
+    monkeypatch.setattr(sys, "stdout", out)
+    cfg = _cfg(tmp_path, {"slow": {"timeout": 0.3, "commands": [{"cmd": "echo started; sleep 5"}]}})
+
+    started = time.time()
+    results = action_runner.run_actions(cfg, ["slow"])
+
+    assert time.time() - started < 4
+    assert results == [{"name": "slow", "status": "timeout", "rc": None}]
+    assert "started" in out.getvalue()
+
+
+def test_dependency_cycle_is_rejected(tmp_path):
+    cfg = _cfg(
+        tmp_path,
+        {
+            "a": {"depends_on": ["b"], "commands": [{"cmd": "true"}]},
+            "b": {"depends_on": ["a"], "commands": [{"cmd": "true"}]},
+        },
+    )
+
+    with pytest.raises(RuntimeError, match="cycle"):
+        action_runner.run_actions(cfg, ["a", "b"])
+
+
+def test_config_validates_action_specs(tmp_path):
+    cfg_path = tmp_path / "pkgmgr.yaml"
+    cfg_path.write_text(
+        "pkg_release_root: /tmp/release\n"
+        "actions:\n"
+        "  a:\n"
+        "    parallel: true\n"
+        "    timeout: 30\n"
+        "    depends_on: b\n"
+        "    commands:\n"
+        "      - cmd: echo a\n"
+        "action_runner:\n"
+        "  max_workers: 2\n"
+    )
+
+    data = config.load_main(path=cfg_path, allow_interactive=False)
+
+    assert data["actions"]["a"] == {
+        "commands": [{"cmd": "echo a"}],
+        "depends_on": ["b"],
+        "parallel": True,
+        "timeout": 30.0,
+        "inputs": None,
+    }
+    assert data["action_runner"] == {"max_workers": 2, "log_dir": None, "timeout_sec": None}
+
+
+def test_config_rejects_timeout_on_module_only_action(tmp_path, monkeypatch):
+    monkeypatch.setenv("PKGMGR_NO_CONFIG_CACHE", "1")
+    cfg_path = tmp_path / "pkgmgr.yaml"
+    cfg_path.write_text(
+        "pkg_release_root: /tmp/release\n"
+        "actions:\n"
+        "  a:\n"
+        "    timeout: 30\n"
+        "    commands:\n"
+        "      - module: plugin.export_cksum\n"
+    )
+
+    with pytest.raises(RuntimeError, match="timeout does not apply to module entries"):
+        config.load_main(path=cfg_path, allow_interactive=False)
+
+
+def test_parallel_module_entry_output_goes_to_action_log(tmp_path, capsys):
+    (tmp_path / "chatty_plugin.py").write_text(
+        "import sys\n"
+        "def main(argv=None):\n"
+        "    print('module-out %s' % ' '.join(argv))\n"
+        "    sys.stderr.write('module-err\\n')\n"
+        "    return 0\n"
+    )
+    cfg = _cfg(
+        tmp_path,
+        {
+            "mod": {
+                "parallel": True,
+                "commands": [
+                    {"cmd": "echo shell-out"},
+                    {"module": "chatty_plugin", "path": str(tmp_path), "args": ["x"]},
+                ],
+            },
+            "other": {"parallel": True, "commands": [{"cmd": "true"}]},
+        },
+    )
+
+    results = action_runner.run_actions(cfg, ["mod", "other"])
+
+    assert [r["status"] for r in results] == ["ok", "ok", "ok"]
+    (log,) = (tmp_path / "logs").glob("*-mod.log")
+    text = log.read_text()
+    assert "shell-out" in text and "module-out x" in text and "module-err" in text
+    assert "module-out" not in capsys.readouterr().out
+
+
+def _fingerprint_setup(tmp_path, monkeypatch, cmd, inputs):
+    monkeypatch.setattr(config, "DEFAULT_STATE_DIR", str(tmp_path / "state"))
+    pkg_dir = tmp_path / "rel" / "P1"
+    (pkg_dir / "SYS").mkdir(parents=True)
+    (pkg_dir / "SYS" / "a.bin").write_text("one")
+    (pkg_dir / "pkg.yaml").write_text("pkg:\n  id: P1\ninclude:\n  releases: [SYS]\n")
+    cfg = _cfg(tmp_path, {"export": {"inputs": inputs, "commands": [{"cmd": cmd}]}})
+    cfg["pkg_release_root"] = str(tmp_path / "rel")
+    return cfg, pkg_dir
+
+
+def test_inputs_fingerprint_skips_unchanged_action(tmp_path, monkeypatch):
+    trace = tmp_path / "trace.txt"
+    cfg, pkg_dir = _fingerprint_setup(
+        tmp_path, monkeypatch, "echo run >> %s" % trace, {"releases": True, "update": ["git"]}
+    )
+    updates.write_update("P1", "20240101T000000", {"run_at": "20240101T000000", "git": {"commits": [{"hash": "a"}]}})
+    ctx = {"pkg_id": "P1", "event": "update_pkg"}
+
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "ok"
+    assert action_runner.run_actions(cfg, ["export"], context=ctx) == [
+        {"name": "export", "status": "unchanged", "rc": 0}
+    ]
+    assert (tmp_path / "state" / "pkg" / "P1" / "actions" / "export.json").exists()
+
+    # a new update with another commit invalidates the fingerprint
+    updates.write_update("P1", "20240102T000000", {"run_at": "20240102T000000", "git": {"commits": [{"hash": "b"}]}})
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "ok"
+    # so does a changed release file
+    (pkg_dir / "SYS" / "a.bin").write_text("two!")
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "ok"
+    assert action_runner.run_actions(cfg, ["export"], context=ctx, force=True)[0]["status"] == "ok"
+    assert trace.read_text().split() == ["run"] * 4
+
+
+def test_inputs_fingerprint_tracks_absolute_release_root(tmp_path, monkeypatch):
+    trace = tmp_path / "trace.txt"
+    cfg, pkg_dir = _fingerprint_setup(tmp_path, monkeypatch, "echo run >> %s" % trace, {"releases": ["OUT"]})
+    outside = tmp_path / "elsewhere" / "OUT"
+    outside.mkdir(parents=True)
+    (outside / "b.bin").write_text("one")
+    (pkg_dir / "pkg.yaml").write_text("pkg:\n  id: P1\ninclude:\n  releases: [SYS, %s]\n" % outside)
+    ctx = {"pkg_id": "P1"}
+
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "ok"
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "unchanged"
+    (outside / "b.bin").write_text("two!")
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "ok"
+    # a root that disappears changes the fingerprint too
+    (outside / "b.bin").unlink()
+    outside.rmdir()
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "ok"
+    assert trace.read_text().split() == ["run"] * 3
+
+
+def test_inputs_fingerprint_not_recorded_on_failure(tmp_path, monkeypatch):
+    cfg, _ = _fingerprint_setup(tmp_path, monkeypatch, "exit 2", {"releases": True})
+    ctx = {"pkg_id": "P1"}
+
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "failed"
+    assert action_runner.run_actions(cfg, ["export"], context=ctx)[0]["status"] == "failed"
+    assert not (tmp_path / "state" / "pkg" / "P1" / "actions" / "export.json").exists()
+
+
+def test_shell_command_does_not_inherit_concurrent_module_cwd_or_env(tmp_path, monkeypatch):
+    (tmp_path / "leaky_plugin.py").write_text(
+        "import os, time\n"
+        "def main(argv=None):\n"
+        "    ready, done = argv\n"
+        "    open(ready, 'w').close()\n"
+        "    deadline = time.time() + 5\n"
+        "    while not os.path.exists(done) and time.time() < deadline:\n"
+        "        time.sleep(0.02)\n"
+        "    return 0\n"
+    )
+    module_dir = tmp_path / "module_cwd"
+    module_dir.mkdir()
+    (tmp_path / "sub").mkdir()
+    ready, done, out = tmp_path / "ready", tmp_path / "done", tmp_path / "out.txt"
+    monkeypatch.delenv("LEAK", raising=False)
+    monkeypatch.chdir(tmp_path)
+    cfg = _cfg(
+        tmp_path,
+        {
+            "module": {
+                "parallel": True,
+                "commands": [
+                    {
+                        "module": "leaky_plugin",
+                        "path": str(tmp_path),
+                        "cwd": str(module_dir),
+                        "env": {"LEAK": "module"},
+                        "args": [str(ready), str(done)],
+                    }
+                ],
+            },
+            "shell": {
+                "parallel": True,
+                "commands": [
+                    {
+                        "cmd": "while [ ! -e %s ]; do sleep 0.02; done; pwd > %s; echo \"leak=$LEAK\" >> %s; touch %s"
+                        % (ready, out, out, done),
+                        "cwd": "sub",
+                    }
+                ],
+            },
+        },
+    )
+
+    results = action_runner.run_actions(cfg, ["module", "shell"])
+
+    assert [r["status"] for r in results] == ["ok", "ok"]
+    assert out.read_text().split() == [os.path.realpath(str(tmp_path / "sub")), "leak="]
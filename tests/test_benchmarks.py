@@ -0,0 +1,62 @@
+import os
+import sys
+from importlib import import_module
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+config = import_module("pkgmgr.config")
+common = import_module("benchmarks.common")
+synth = import_module("benchmarks.synth")
+bench = import_module("benchmarks.run")
+git_bench = import_module("benchmarks.git_history")
+
+
+def test_synthetic_tree_is_deterministic(tmp_path):
+    spec = synth.TreeSpec(files=40, sizes="100:1,4k:1", depth=2, fanout=3, seed=7)
+    first = synth.generate_tree(str(tmp_path / "a"), spec)
+    second = synth.generate_tree(str(tmp_path / "b"), spec)
+
+    assert first == second
+    assert all(rel.count("/") == 2 and size in (100, 4096) for rel, size in first)
+    for rel, size in first:
+        data = (tmp_path / "a" / rel).read_bytes()
+        assert len(data) == size and data == (tmp_path / "b" / rel).read_bytes()
+
+    changed = synth.mutate_tree(str(tmp_path / "b"), second, 25, seed=7)
+    assert len(changed) == 10
+    differ = [rel for rel, _ in first if (tmp_path / "a" / rel).read_bytes() != (tmp_path / "b" / rel).read_bytes()]
+    assert sorted(differ) == [rel for rel, _ in changed]
+
+
+def test_bench_run_reports_every_phase(tmp_path):
+    state_dir = config.DEFAULT_STATE_DIR
+    spec = synth.TreeSpec(files=12, sizes="1k:1", depth=1, fanout=2)
+
+    result = bench.run(spec, changed=50, work_dir=str(tmp_path))
+
+    assert config.DEFAULT_STATE_DIR == state_dir
+    assert set(result["phases"]) == set(bench.PHASES)
+    assert result["phases"]["create_baseline"]["files"] == 12
+    assert result["phases"]["update_pkg"]["files"] == 6
+    assert all(phase["peak_rss_kb"] > 0 for phase in result["phases"].values())
+    assert "ratio" in common.compare(result, result)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_git_history_bench_counts_spawns(tmp_path):
+    spec = git_bench.HistorySpec(commits=30, files=12, fanout=3, keyword_density=0.3, rename_every=10, seed=3)
+
+    result = git_bench.run(spec, work_dir=str(tmp_path))
+
+    hits = result["phases"]["collect_git_hits"]
+    assert hits["files"] > 0
+    # one git log per keyword plus one git show per matching commit
+    assert hits["spawns"]["git"] >= hits["files"] + 1
+    assert result["phases"]["update_pkg"]["spawns_total"] >= hits["spawns_total"]
+    if "export_source_review.cold" in result["phases"]:
+        cold = result["phases"]["export_source_review.cold"]["spawns_total"]
+        warm = result["phases"]["export_source_review.warm"]["spawns_total"]
+        assert warm < cold
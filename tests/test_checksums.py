@@ -0,0 +1,54 @@
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+checksums = import_module("pkgmgr.collectors.checksums")
+
+SIZES = (0, 1, 3, 255, 256, 4096, 65539, 1024 * 1024 + 7)
+
+
+def _corpus(base):
+    rnd = random.Random(1234)
+    paths = []
+    for size in SIZES:
+        path = os.path.join(base, "f-%d" % size)
+        with open(path, "wb") as f:
+            f.write(bytes(rnd.getrandbits(8) for _ in range(size)))
+        paths.append(path)
+    return paths
+
+
+def _coreutils_cksum(path):
+    out = subprocess.check_output(["cksum", path]).decode("utf-8").split()
+    return int(out[0]), int(out[1])
+
+
+def test_posix_cksum_known_values():
+    assert checksums.posix_cksum_bytes(b"") == (4294967295, 0)
+    assert checksums.posix_cksum_bytes(b"a") == (1220704766, 1)
+
+
+@pytest.mark.skipif(shutil.which("cksum") is None, reason="cksum binary not available")
+def test_posix_cksum_matches_coreutils():
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in _corpus(tmp):
+            assert checksums.posix_cksum_of_file(path, chunk=4096) == _coreutils_cksum(path), path
+
+
+def test_posix_cksum_table_fallback_matches_zlib(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = _corpus(tmp)
+        fast = [checksums.posix_cksum_of_file(path) for path in paths]
+        monkeypatch.setattr(checksums, "zlib", None)
+        assert [checksums.posix_cksum_of_file(path) for path in paths] == fast
@@ -122,3 +122,43 @@ def test_load_main_requires_pkg_release_root():
             assert "pkg_release_root" in str(e)
         else:
             raise AssertionError("expected validation error for missing pkg_release_root")
+
+
+def _enable_config_cache(monkeypatch, base):
+    monkeypatch.delenv("PKGMGR_NO_CONFIG_CACHE", raising=False)
+    monkeypatch.setattr(config, "DEFAULT_CACHE_DIR", str(base / "cache"))
+
+
+def test_load_main_reuses_cache_until_file_changes(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        _enable_config_cache(monkeypatch, base)
+        cfg_path = base / "pkgmgr.yaml"
+        cfg_path.write_text("pkg_release_root: /tmp/release\n")
+        first = config.load_main(path=cfg_path, allow_interactive=False)
+        real_load = config._safe_load
+
+        def _no_parse(_stream):
+            raise AssertionError("cached config must not be reparsed")
+
+        monkeypatch.setattr(config, "_safe_load", _no_parse)
+        assert config.load_main(path=cfg_path, allow_interactive=False) == first
+        monkeypatch.setattr(config, "_safe_load", real_load)
+
+        cfg_path.write_text("pkg_release_root: /tmp/other-release\n")
+        os.utime(str(cfg_path), ns=(1, 1))
+        assert config.load_main(path=cfg_path, allow_interactive=False)["pkg_release_root"] == "/tmp/other-release"
+
+
+def test_load_pkg_config_cache_ignores_corrupt_entries(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        _enable_config_cache(monkeypatch, base)
+        pkg_path = base / "pkg.yaml"
+        pkg_path.write_text("pkg:\n  id: P\n")
+        assert config.load_pkg_config(str(pkg_path)) == {"pkg": {"id": "P"}}
+
+        for name in os.listdir(str(base / "cache" / "config")):
+            (base / "cache" / "config" / name).write_bytes(b"not a pickle")
+
+        assert config.load_pkg_config(str(pkg_path)) == {"pkg": {"id": "P"}}
@@ -0,0 +1,88 @@
+import hashlib
+import os
+import sys
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+copier = import_module("pkgmgr.copier")
+
+
+def _write(path, size):
+    data = os.urandom(size)
+    path.write_bytes(data)
+    os.utime(str(path), ns=(1700000000 * 10 ** 9, 1700000000 * 10 ** 9))
+    return data
+
+
+def test_engine_copies_whole_chunked_and_hashed_files(tmp_path):
+    small = _write(tmp_path / "small.bin", 1000)
+    big = _write(tmp_path / "big.bin", 3 * 1024 * 1024 + 123)
+    empty = _write(tmp_path / "empty.bin", 0)
+    out = tmp_path / "out"
+
+    with copier.CopyEngine(workers=3, chunk_size=1024 * 1024) as engine:
+        digests = engine.copy_many(
+            [(str(tmp_path / name), str(out / "sub" / name)) for name in ("small.bin", "big.bin", "empty.bin")]
+        )
+        hashed = engine.submit(str(tmp_path / "big.bin"), str(out / "hashed.bin"), with_hash=True).result()
+
+    assert (out / "sub" / "small.bin").read_bytes() == small
+    assert (out / "sub" / "big.bin").read_bytes() == big
+    assert (out / "sub" / "empty.bin").read_bytes() == empty
+    assert set(digests.values()) == {None}
+    assert hashed == hashlib.sha256(big).hexdigest()
+    assert (out / "sub" / "big.bin").stat().st_mtime_ns == 1700000000 * 10 ** 9
+    assert engine.stats.files == 4
+    assert engine.stats.bytes == 1000 + 2 * len(big)
+    # the hashed copy is chunked too; its sha256 is read from the source alongside
+    assert engine.stats.chunks == 4 + 1 + 1 + 4
+    assert "hash" not in engine.stats.methods
+    assert (engine.stats.hashed, engine.stats.hashed_bytes) == (1, len(big))
+    assert [name for name in os.listdir(str(out / "sub")) if ".tmp-" in name] == []
+
+
+def test_copy_range_falls_back_when_kernel_paths_fail(tmp_path, monkeypatch):
+    data = _write(tmp_path / "src.bin", 200000)
+
+    def _unsupported(*_):
+        raise OSError(copier.errno.EXDEV, "cross-device")
+
+    monkeypatch.setattr(
+        copier,
+        "_METHODS",
+        (("copy_file_range", _unsupported, True), ("sendfile", _unsupported, True), ("pread", copier._pread_pwrite, True)),
+    )
+    with open(str(tmp_path / "src.bin"), "rb") as fsrc, open(str(tmp_path / "dst.bin"), "wb") as fdst:
+        assert copier.copy_range(fsrc.fileno(), fdst.fileno(), 0, len(data)) == "pread"
+    assert (tmp_path / "dst.bin").read_bytes() == data
+
+
+def test_chunked_copy_failure_leaves_no_partial_file(tmp_path, monkeypatch):
+    _write(tmp_path / "big.bin", 2 * 1024 * 1024 + 1)
+
+    def _boom(*_):
+        raise OSError(copier.errno.EIO, "disk error")
+
+    monkeypatch.setattr(copier, "_METHODS", (("pread", _boom, True),))
+    with copier.CopyEngine(workers=2, chunk_size=1024 * 1024) as engine:
+        future = engine.submit(str(tmp_path / "big.bin"), str(tmp_path / "out" / "big.bin"))
+        with pytest.raises(OSError):
+            future.result()
+    assert os.listdir(str(tmp_path / "out")) == []
+
+
+def test_hashed_small_file_keeps_kernel_copy_path(tmp_path):
+    data = _write(tmp_path / "small.bin", 5000)
+    with copier.CopyEngine(workers=2, chunk_size=1024 * 1024) as engine:
+        digest = engine.submit(str(tmp_path / "small.bin"), str(tmp_path / "out.bin"), with_hash=True).result()
+
+    assert digest == hashlib.sha256(data).hexdigest()
+    assert (tmp_path / "out.bin").read_bytes() == data
+    assert sum(engine.stats.methods.values()) == 1 and "hash" not in engine.stats.methods
+    assert "hashed=1" in engine.stats.summary()
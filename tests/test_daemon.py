@@ -0,0 +1,132 @@
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from importlib import import_module, reload
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+daemon = import_module("pkgmgr.daemon")
+reload(daemon)
+
+
+def _start_daemon(home, sock_path):
+    env = dict(os.environ, HOME=str(home), PYTHONPATH=str(ROOT))
+    env.pop("PKGMGR_NO_DAEMON", None)
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "pkgmgr", "serve", "--socket", str(sock_path)],
+        cwd=str(ROOT),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        if daemon.ping(str(sock_path)):
+            return proc
+        time.sleep(0.05)
+    proc.kill()
+    raise AssertionError("daemon did not start: %s" % proc.stdout.read())
+
+
+def test_forward_returns_none_without_daemon():
+    with tempfile.TemporaryDirectory() as tmp:
+        assert daemon.forward(["actions"], path=os.path.join(tmp, "missing.sock")) is None
+
+
+def test_should_forward_skips_interactive_commands(monkeypatch):
+    monkeypatch.delenv("PKGMGR_NO_DAEMON", raising=False)
+    monkeypatch.setattr(daemon.sys.stdin, "isatty", lambda: False, raising=False)
+
+    assert daemon.should_forward(["--config", "/x.yaml", "update-pkg", "P"])
+    assert not daemon.should_forward(["update-pkg", "P", "--cancel", "v0.0.1"])
+    assert not daemon.should_forward(["update-pkg", "P", "--release"])
+    assert daemon.should_forward(["update-pkg", "P", "--release", "--root", "SYS"])
+    assert not daemon.should_forward(["create-pkg", "P"])
+    assert not daemon.should_forward(["--version"])
+    assert not daemon.should_forward(["--trace", "/tmp/t.json", "update-pkg", "P"])
+    assert not daemon.should_forward(["--profile=/tmp/p.out", "update-pkg", "P"])
+    monkeypatch.setenv("PKGMGR_NO_DAEMON", "1")
+    assert not daemon.should_forward(["actions"])
+
+
+def test_daemon_runs_forwarded_command_and_streams_output(monkeypatch, capsys):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        sock_path = base / "run" / "pkgmgr.sock"
+        cfg_path = base / "pkgmgr.yaml"
+        cfg_path.write_text(
+            "pkg_release_root: %s\n"
+            "actions:\n"
+            "  hello:\n"
+            "    - cmd: echo hello-$PKGMGR_NO_DAEMON-$CLIENT_MARK\n" % tmp
+        )
+        proc = _start_daemon(base, sock_path)
+        try:
+            monkeypatch.setenv("CLIENT_MARK", "client")
+            rc = daemon.forward(["--config", str(cfg_path), "actions", "hello"], path=str(sock_path))
+            out = capsys.readouterr().out
+
+            assert rc == 0
+            assert "[actions] running hello" in out
+            # child sees the client's env and is told not to call back into the daemon
+            assert "hello-1-client" in out
+
+            rc = daemon.forward(["--config", str(cfg_path), "actions", "nope"], path=str(sock_path))
+            assert rc == 0
+            assert "unknown action: nope" in capsys.readouterr().out
+        finally:
+            daemon.stop(str(sock_path))
+            proc.wait(timeout=10)
+        assert not sock_path.exists()
+
+
+def test_daemon_request_sees_client_timezone(monkeypatch):
+    if not hasattr(time, "tzset"):
+        return
+    cli = import_module("pkgmgr.cli")
+    monkeypatch.setenv("TZ", "UTC")
+    time.tzset()
+    seen = []
+    monkeypatch.setattr(cli, "main", lambda argv: seen.append(time.strftime("%z")) or 0)
+    conn, peer = socket.socketpair()
+    try:
+        server = daemon.Server(path=os.path.join(tempfile.gettempdir(), "unused.sock"))
+        rc = server._run(conn, ["actions"], {"env": dict(os.environ, TZ="KST-9"), "cwd": os.getcwd()})
+        # the daemon's own zone is back once the request is done
+        restored = time.strftime("%z")
+    finally:
+        conn.close()
+        peer.close()
+        monkeypatch.undo()
+        time.tzset()
+
+    assert rc == 0
+    assert seen == ["+0900"]
+    assert restored == "+0000"
+
+
+def test_daemon_socket_is_private_from_bind(tmp_path, monkeypatch):
+    sock_path = tmp_path / "run" / "pkgmgr.sock"
+    seen = []
+    chmod = daemon.os.chmod
+
+    def _record(path, mode):
+        seen.append(os.stat(path).st_mode & 0o777)
+        chmod(path, mode)
+
+    monkeypatch.setattr(daemon.os, "chmod", _record)
+    previous = os.umask(0)
+    try:
+        listener = daemon.Server(path=str(sock_path))._bind()
+        listener.close()
+        assert os.umask(0) == 0
+    finally:
+        os.umask(previous)
+
+    assert seen == [0o600]
@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+openpyxl = pytest.importorskip("openpyxl")
+export_cksum = import_module("plugin.export_cksum")
+
+ROWS = [("%d" % (i * 7919), "%d" % i, "dir/file_%03d.bin" % i) for i in range(30)]
+
+
+def _snapshot(ws):
+    cells = []
+    for row in ws.iter_rows(min_row=1, max_row=4 + len(ROWS), min_col=1, max_col=6):
+        for cell in row:
+            cells.append((cell.coordinate, cell.value, repr(cell.font), repr(cell.border), repr(cell.fill)))
+    return cells, sorted(str(r) for r in ws.merged_cells.ranges), ws.print_area
+
+
+def test_stream_export_matches_classic_layout(tmp_path):
+    classic_path = tmp_path / "classic.xlsx"
+    wb = openpyxl.Workbook()
+    wb.remove(wb.active)
+    ws = wb.create_sheet("SYS")
+    export_cksum._init_sheet(ws, "SYS", "PKG Release 경로 작성 필요", True)
+    export_cksum._write_sheet(ws, ROWS, True)
+    wb.save(str(classic_path))
+
+    stream_path = tmp_path / "stream.xlsx"
+    export_cksum._export_stream(str(stream_path), None, [("SYS", ROWS)])
+    # second pass reuses the first output as a template, like --excel on an existing file
+    templated_path = tmp_path / "templated.xlsx"
+    export_cksum._export_stream(str(templated_path), str(stream_path), [("SYS", ROWS[:5])])
+
+    classic = openpyxl.load_workbook(str(classic_path))["SYS"]
+    stream = openpyxl.load_workbook(str(stream_path))["SYS"]
+    assert _snapshot(stream) == _snapshot(classic)
+
+    templated = openpyxl.load_workbook(str(templated_path))["SYS"]
+    assert templated.max_row == 4 + 5
+    assert templated["D9"].value == ROWS[4][2]
+    assert repr(templated["B6"].border) == repr(stream["B6"].border)
+
+
+def test_collect_roots_yields_sorted_roots_with_shared_pool(tmp_path, capsys):
+    grouped = {}
+    for root, count in (("B", 3), ("A", 5), ("C", 0)):
+        root_dir = tmp_path / root
+        root_dir.mkdir()
+        for i in range(count):
+            (root_dir / ("f%d" % i)).write_bytes(b"x" * (i + 1))
+        grouped[root] = [(str(root_dir), "")]
+
+    results = list(export_cksum._collect_roots(str(tmp_path), grouped, jobs=2))
+
+    assert [root for root, _, _ in results] == ["A", "B", "C"]
+    for root, rows, reused in results:
+        expected, _ = export_cksum._cksum_rows(
+            str(tmp_path / root), export_cksum._collect_files(str(tmp_path / root), grouped[root]), 1
+        )
+        assert rows == expected
+        assert reused == 0
+    assert capsys.readouterr().out.count("[export_cksum] [") == 3
+
+
+def test_collect_roots_bounds_roots_in_flight(tmp_path, monkeypatch, capsys):
+    grouped = {}
+    for root in "ABCDEF":
+        root_dir = tmp_path / root
+        root_dir.mkdir()
+        (root_dir / "f").write_bytes(root.encode("ascii"))
+        grouped[root] = [(str(root_dir), "")]
+    started = []
+    collect_files = export_cksum._collect_files
+
+    def _tracked(root_dir, specs):
+        started.append(os.path.basename(root_dir))
+        return collect_files(root_dir, specs)
+
+    monkeypatch.setattr(export_cksum, "_collect_files", _tracked)
+
+    results = export_cksum._collect_roots(str(tmp_path), grouped, jobs=2, window=2)
+    assert next(results)[0] == "A"
+    time.sleep(0.2)
+    # the yielded root plus a full window behind it, nothing further
+    assert sorted(started) == ["A", "B", "C"]
+    assert [root for root, _, _ in results] == ["B", "C", "D", "E", "F"]
@@ -0,0 +1,228 @@
+import json
+import os
+import stat
+import sys
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+export_pkgstore = import_module("plugin.export_pkgstore")
+
+
+def _make_tree(base):
+    state = base / "state"
+    (state / "pkg" / "P").mkdir(parents=True)
+    (state / "pkg" / "P" / "summary.json").write_text("{}")
+    release_root = base / "rel"
+    (release_root / "P" / "release" / "SYS").mkdir(parents=True)
+    (release_root / "P" / "release" / "SYS" / "release.v0.0.1.tar").write_bytes(b"t" * 100)
+    (release_root / "P" / "export").mkdir()
+    (release_root / "P" / "export" / "cksum.xlsx").write_bytes(b"x")
+    (release_root / "P" / "README.txt").write_text("readme")
+    return state, release_root
+
+
+def test_sync_copies_only_changes_and_removes_deleted(tmp_path):
+    state, release_root = _make_tree(tmp_path)
+    dest = tmp_path / "store"
+
+    first = export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    assert sorted(first["copied"]) == [
+        os.path.join("pkg", "P", "export", "cksum.xlsx"),
+        os.path.join("pkg", "P", "readme", "root", "README.txt"),
+        os.path.join("pkg", "P", "release_artifacts", "SYS", "release.v0.0.1.tar"),
+        os.path.join("pkg", "P", "summary.json"),
+    ]
+    manifest = json.loads((dest / export_pkgstore.MANIFEST_NAME).read_text())["files"]
+    assert manifest[os.path.join("pkg", "P", "summary.json")]["size"] == 2
+
+    second = export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    assert second["copied"] == [] and second["removed"] == [] and second["unchanged"] == 4
+
+    (state / "pkg" / "P" / "summary.json").write_text('{"a": 1}')
+    (release_root / "P" / "release" / "SYS" / "release.v0.0.1.tar").unlink()
+    # a tar left behind by an export that predates the manifest
+    (dest / "pkg" / "P" / "release_artifacts" / "OLD").mkdir()
+    (dest / "pkg" / "P" / "release_artifacts" / "OLD" / "release.v0.0.0.tar").write_bytes(b"o")
+    third = export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+
+    assert third["copied"] == [os.path.join("pkg", "P", "summary.json")]
+    assert sorted(third["removed"]) == [
+        os.path.join("pkg", "P", "release_artifacts", "OLD", "release.v0.0.0.tar"),
+        os.path.join("pkg", "P", "release_artifacts", "SYS", "release.v0.0.1.tar"),
+    ]
+    assert (dest / "pkg" / "P" / "summary.json").read_text() == '{"a": 1}'
+    assert not (dest / "pkg" / "P" / "release_artifacts").exists()
+
+
+def _fake_bin(bin_dir, name, log, rc=0):
+    path = bin_dir / name
+    path.write_text(
+        "#!/bin/sh\n"
+        'echo "%s $*" >> %s\n'
+        'for a in "$@"; do case "$prev" in --files-from) cat "$a" >> %s;; esac; prev="$a"; done\n'
+        "exit %d\n" % (name, log, log, rc)
+    )
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+
+
+def test_push_sends_full_tree_once_then_only_pending_paths(tmp_path, monkeypatch):
+    state, release_root = _make_tree(tmp_path)
+    dest = tmp_path / "store"
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = tmp_path / "calls.log"
+    _fake_bin(bin_dir, "ssh", log)
+    _fake_bin(bin_dir, "rsync", log)
+    monkeypatch.setenv("PATH", "%s%s%s" % (bin_dir, os.pathsep, os.environ.get("PATH", "")))
+
+    export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    export_pkgstore.push(str(dest), "host", "/r/state")
+    assert "--delete" in log.read_text() and "--files-from" not in log.read_text()
+
+    log.write_text("")
+    export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    export_pkgstore.push(str(dest), "host", "/r/state")
+    assert log.read_text() == ""
+
+    (state / "pkg" / "P" / "summary.json").write_text('{"b": 2}')
+    export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    _fake_bin(bin_dir, "rsync", log, rc=3)
+    try:
+        export_pkgstore.push(str(dest), "host", "/r/state")
+    except Exception:
+        pass
+    _fake_bin(bin_dir, "rsync", log)
+    log.write_text("")
+    export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    export_pkgstore.push(str(dest), "host", "/r/state")
+
+    calls = log.read_text()
+    assert "--files-from" in calls and "--delete-missing-args" in calls
+    assert os.path.join("pkg", "P", "summary.json") in calls.splitlines()
+
+
+def test_push_includes_changes_from_syncs_without_push(tmp_path, monkeypatch):
+    state, release_root = _make_tree(tmp_path)
+    dest = tmp_path / "store"
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    log = tmp_path / "calls.log"
+    _fake_bin(bin_dir, "ssh", log)
+    _fake_bin(bin_dir, "rsync", log)
+    monkeypatch.setenv("PATH", "%s%s%s" % (bin_dir, os.pathsep, os.environ.get("PATH", "")))
+
+    export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    export_pkgstore.push(str(dest), "host", "/r/state")
+
+    # a --dest-only sync picks these up; the next push must still send them
+    (state / "pkg" / "P" / "summary.json").write_text('{"d": 4}')
+    (release_root / "P" / "export" / "cksum.xlsx").unlink()
+    export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    log.write_text("")
+    second = export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root))
+    assert second["copied"] == [] and second["removed"] == []
+    export_pkgstore.push(str(dest), "host", "/r/state")
+
+    sent = log.read_text().splitlines()
+    assert os.path.join("pkg", "P", "summary.json") in sent
+    assert os.path.join("pkg", "P", "export", "cksum.xlsx") in sent
+
+
+def test_link_mode_stages_release_tars_without_copying(tmp_path):
+    state, release_root = _make_tree(tmp_path)
+    dest = tmp_path / "store"
+    tar = release_root / "P" / "release" / "SYS" / "release.v0.0.1.tar"
+
+    report = export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root), link_mode="auto")
+
+    staged = dest / "pkg" / "P" / "release_artifacts" / "SYS" / "release.v0.0.1.tar"
+    assert report["linked"] == 1
+    assert staged.read_bytes() == tar.read_bytes()
+    manifest = json.loads((dest / export_pkgstore.MANIFEST_NAME).read_text())["files"]
+    entry = manifest[os.path.join("pkg", "P", "release_artifacts", "SYS", "release.v0.0.1.tar")]
+    assert entry["link"] in ("reflink", "hardlink")
+    if entry["link"] == "hardlink":
+        assert staged.stat().st_ino == tar.stat().st_ino
+    # only finalized tars are linked; other files are real copies
+    assert (dest / "pkg" / "P" / "summary.json").stat().st_ino != (state / "pkg" / "P" / "summary.json").stat().st_ino
+
+    again = export_pkgstore.export_pkgstore(str(state), str(dest), release_root=str(release_root), link_mode="auto")
+    assert again["copied"] == [] and again["unchanged"] == 4
+
+
+def _tree(root):
+    files = {}
+    for base, _, names in os.walk(str(root)):
+        for name in names:
+            if name.startswith(".pkgstore-"):
+                continue
+            path = os.path.join(base, name)
+            files[os.path.relpath(path, str(root))] = Path(path).read_bytes()
+    return files
+
+
+def test_archive_round_trip_applies_changes_in_sequence(tmp_path):
+    state, release_root = _make_tree(tmp_path)
+    staging = tmp_path / "staging"
+    remote = tmp_path / "remote"
+
+    export_pkgstore.export_pkgstore(str(state), str(staging), release_root=str(release_root))
+    first = export_pkgstore.write_archive(str(staging), str(tmp_path / "a1.tar"), system_name="sysA")
+    assert first["full"] and first["seq"] == 1
+    export_pkgstore.apply_archive(str(tmp_path / "a1.tar"), str(remote))
+    target = remote / "state" / "systems" / "sysA"
+    assert _tree(target) == _tree(staging)
+
+    (state / "pkg" / "P" / "summary.json").write_text('{"c": 3}')
+    (release_root / "P" / "export" / "cksum.xlsx").unlink()
+    export_pkgstore.export_pkgstore(str(state), str(staging), release_root=str(release_root))
+    second = export_pkgstore.write_archive(str(staging), str(tmp_path / "a2.tar"), system_name="sysA")
+    assert [entry["path"] for entry in second["files"]] == [os.path.join("pkg", "P", "summary.json")]
+    assert second["deleted"] == [os.path.join("pkg", "P", "export", "cksum.xlsx")]
+
+    # out of order (a2 again after it was applied) is rejected without touching the tree
+    export_pkgstore.apply_archive(str(tmp_path / "a2.tar"), str(remote))
+    assert _tree(target) == _tree(staging)
+    with pytest.raises(RuntimeError):
+        export_pkgstore.apply_archive(str(tmp_path / "a2.tar"), str(remote))
+    assert _tree(target) == _tree(staging)
+
+
+def test_archive_includes_changes_from_syncs_without_archive(tmp_path):
+    state, release_root = _make_tree(tmp_path)
+    staging = tmp_path / "staging"
+    remote = tmp_path / "remote"
+    export_pkgstore.export_pkgstore(str(state), str(staging), release_root=str(release_root))
+    export_pkgstore.write_archive(str(staging), str(tmp_path / "a1.tar"), system_name="sysA")
+    export_pkgstore.apply_archive(str(tmp_path / "a1.tar"), str(remote))
+
+    # picked up by a sync that writes no archive
+    (release_root / "P" / "export" / "b.json").write_text("{}")
+    export_pkgstore.export_pkgstore(str(state), str(staging), release_root=str(release_root))
+    export_pkgstore.export_pkgstore(str(state), str(staging), release_root=str(release_root))
+    second = export_pkgstore.write_archive(str(staging), str(tmp_path / "a2.tar"), system_name="sysA")
+
+    assert second["seq"] == 2 and not second["full"]
+    assert [entry["path"] for entry in second["files"]] == [os.path.join("pkg", "P", "export", "b.json")]
+    export_pkgstore.apply_archive(str(tmp_path / "a2.tar"), str(remote))
+    assert _tree(remote / "state" / "systems" / "sysA") == _tree(staging)
+
+
+def test_truncated_archive_changes_nothing(tmp_path):
+    state, release_root = _make_tree(tmp_path)
+    staging = tmp_path / "staging"
+    export_pkgstore.export_pkgstore(str(state), str(staging), release_root=str(release_root))
+    export_pkgstore.write_archive(str(staging), str(tmp_path / "a1.tar"), system_name="sysA")
+    data = (tmp_path / "a1.tar").read_bytes()
+    # cut the stream just before the index footer
+    (tmp_path / "cut.tar").write_bytes(data[: data.index(export_pkgstore.ARCHIVE_INDEX_NAME.encode("utf-8"))])
+
+    with pytest.raises(Exception):
+        export_pkgstore.apply_archive(str(tmp_path / "cut.tar"), str(tmp_path / "remote"))
+    assert _tree(tmp_path / "remote") == {}
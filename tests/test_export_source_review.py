@@ -0,0 +1,152 @@
+import os
+import subprocess
+import sys
+from importlib import import_module
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+review = import_module("plugin.export_source_review")
+
+
+def _git(repo, *args):
+    return subprocess.check_output(
+        ["git", "-c", "user.name=t", "-c", "user.email=t@t", *args], cwd=str(repo)
+    ).decode().strip()
+
+
+@pytest.fixture
+def repo(tmp_path):
+    root = tmp_path / "repo"
+    root.mkdir()
+    _git(root, "init", "-q")
+    (root / "a.c").write_text("int a;\n")
+    (root / "b.c").write_text("int b;\n")
+    _git(root, "add", ".")
+    _git(root, "commit", "-q", "-m", "base")
+    return root
+
+
+def _diff(cache, repo, start):
+    return review._cached_diff(
+        cache,
+        str(repo),
+        start,
+        "a.c",
+        review._git_tree_blobs(str(repo), start),
+        review._git_tree_blobs(str(repo), "HEAD"),
+    )
+
+
+def test_diff_cache_is_keyed_by_blob_not_head_commit(repo, tmp_path):
+    start = _git(repo, "rev-parse", "HEAD")
+    (repo / "a.c").write_text("int a = 1;\n")
+    _git(repo, "commit", "-q", "-am", "KW-1 change a")
+    cache = review.DiffCache(root=str(tmp_path / "cache"))
+
+    first = _diff(cache, repo, start)
+    assert "+int a = 1;" in first
+    assert (cache.hits, cache.misses) == (0, 1)
+
+    # an unrelated commit moves HEAD but not a.c's blob
+    (repo / "b.c").write_text("int b = 2;\n")
+    _git(repo, "commit", "-q", "-am", "unrelated")
+    assert _diff(cache, repo, start) == first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    (repo / "a.c").write_text("int a = 3;\n")
+    _git(repo, "commit", "-q", "-am", "KW-1 change a again")
+    third = _diff(cache, repo, start)
+    assert "+int a = 3;" in third
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert third == review._git_diff(str(repo), start, "a.c")
+
+
+def test_diff_cache_key_includes_file_mode(repo, tmp_path):
+    start = _git(repo, "rev-parse", "HEAD")
+    (repo / "a.c").write_text("int a = 1;\n")
+    _git(repo, "commit", "-q", "-am", "KW-1 change a")
+    cache = review.DiffCache(root=str(tmp_path / "cache"))
+    _diff(cache, repo, start)
+
+    # same content, now executable: the diff gains a mode change
+    _git(repo, "update-index", "--chmod=+x", "a.c")
+    _git(repo, "commit", "-q", "-m", "KW-1 chmod a")
+    diff = _diff(cache, repo, start)
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert "new mode 100755" in diff
+
+
+def test_diff_table_bulk_xml_keeps_text_and_line_colours(tmp_path):
+    docx = pytest.importorskip("docx")
+    diff = "--- a/x.c\n+++ b/x.c\n@@ -1 +1 @@\n-old\tline\n+new <&> line\n+second\n ctx\x01"
+    doc = docx.Document()
+    review._add_diff_table(doc, "x.c", diff)
+    doc.save(str(tmp_path / "out.docx"))
+
+    cell = docx.Document(str(tmp_path / "out.docx")).tables[0].cell(1, 0)
+    paragraph = cell.paragraphs[0]
+    assert cell.tables == [] and len(cell.paragraphs) == 1
+    assert paragraph.text == diff.replace("\x01", "?")
+    colours = dict((run.text.split("\n")[-1], str(run.font.color.rgb) if run.font.color.type else None) for run in paragraph.runs)
+    assert colours["+second"] == "FF0000"
+    assert colours["-old\tline"] == "808080"
+    assert colours[" ctx?"] is None
+    assert all(run.font.name == "Courier New" and run.font.size.pt == 9 for run in paragraph.runs)
+
+
+def test_volumes_split_on_line_budget_and_write_index(tmp_path):
+    docx = pytest.importorskip("docx")
+    diff = "\n".join("+line %d" % i for i in range(4))
+    out = str(tmp_path / "review.docx")
+
+    volumes = review._Volumes(out, ["Source Review Export"], max_lines=10)
+    for name in ("a.c", "b.c", "c.c"):
+        volumes.add(name, diff)
+    written = volumes.close()
+
+    assert [os.path.basename(path) for path in written] == ["review-vol001.docx", "review-vol002.docx", "review.docx"]
+    assert len(docx.Document(written[0]).tables) == 2
+    assert len(docx.Document(written[1]).tables) == 1
+    index = docx.Document(out).tables[0]
+    assert [row.cells[3].text for row in index.rows[1:]] == ["a.c\nb.c", "c.c"]
+
+    single = str(tmp_path / "small.docx")
+    volumes = review._Volumes(single, ["Source Review Export"], max_lines=100)
+    volumes.add("a.c", diff)
+    assert volumes.close() == [single]
+    assert not (tmp_path / "small-vol001.docx").exists()
+
+
+def test_volumes_remove_stale_volumes_from_a_larger_run(tmp_path):
+    pytest.importorskip("docx")
+    diff = "\n".join("+line %d" % i for i in range(4))
+    out = str(tmp_path / "review.docx")
+
+    volumes = review._Volumes(out, ["Source Review Export"], max_lines=4)
+    for name in ("a.c", "b.c", "c.c"):
+        volumes.add(name, diff)
+    assert len(volumes.close()) == 4
+
+    volumes = review._Volumes(out, ["Source Review Export"], max_lines=8)
+    for name in ("a.c", "b.c", "c.c"):
+        volumes.add(name, diff)
+    volumes.close()
+    assert sorted(os.listdir(str(tmp_path))) == ["review-vol001.docx", "review-vol002.docx", "review.docx"]
+
+    volumes = review._Volumes(out, ["Source Review Export"], max_lines=100)
+    volumes.add("a.c", diff)
+    volumes.close()
+    assert os.listdir(str(tmp_path)) == ["review.docx"]
+
+
+def test_truncate_lines_notes_what_was_dropped():
+    text = "\n".join(str(i) for i in range(10))
+    assert review._truncate_lines(text, None) == text
+    truncated = review._truncate_lines(text, 3).splitlines()
+    assert truncated[:3] == ["0", "1", "2"]
+    assert "7 more line(s)" in truncated[3]
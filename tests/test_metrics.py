@@ -0,0 +1,91 @@
+import json
+import sys
+import time
+from importlib import import_module
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+metrics = import_module("pkgmgr.metrics")
+
+
+def test_phases_are_exclusive_and_noop_without_recorder():
+    with metrics.phase("outside"):
+        metrics.count("outside")
+    assert metrics.active() is None
+
+    with metrics.recording() as recorder:
+        with metrics.phase("outer"):
+            time.sleep(0.02)
+            with metrics.phase("inner"):
+                time.sleep(0.05)
+        metrics.count("files")
+        metrics.count("bytes", 10)
+        metrics.count("bytes", 5)
+    data = recorder.as_dict()
+
+    assert metrics.active() is None
+    assert 0.04 <= data["phases"]["inner"] < 0.5
+    assert 0.01 <= data["phases"]["outer"] < data["phases"]["inner"]
+    assert data["counters"] == {"files": 1, "bytes": 15}
+    assert "outside" not in data["phases"]
+
+
+def test_merge_summary_keeps_running_means():
+    first = metrics.merge_summary(None, {"elapsed_sec": 2.0, "phases": {"git": 1.0}})
+    second = metrics.merge_summary(first, {"elapsed_sec": 1.0, "phases": {"git": 3.0, "hash": 0.5}})
+
+    assert second["runs"] == 2
+    assert second["mean_phases"] == {"git": 2.0, "hash": 0.25}
+    assert second["max_elapsed_sec"] == 2.0
+    assert second["last"]["phases"]["hash"] == 0.5
+
+
+def test_tracing_writes_chrome_trace_events(tmp_path):
+    with metrics.tracing() as tracer:
+        with metrics.phase("outer", root="/x"):
+            with metrics.phase("inner"):
+                pass
+    assert metrics.active() is None
+    out = tmp_path / "trace.json"
+    assert tracer.write(str(out)) == 2
+
+    events = [e for e in json.loads(out.read_text())["traceEvents"] if e["ph"] == "X"]
+    inner, outer = events
+    assert (inner["name"], outer["name"]) == ("inner", "outer")
+    assert outer["args"] == {"root": "/x"}
+    assert outer["ts"] <= inner["ts"] and inner["ts"] + inner["dur"] <= outer["ts"] + outer["dur"]
+
+
+def test_cli_trace_and_profile_flags(tmp_path, monkeypatch):
+    import pstats
+
+    monkeypatch.setenv("PKGMGR_NO_CONFIG_CACHE", "1")
+    cli = import_module("pkgmgr.cli")
+    cfg_path = tmp_path / "pkgmgr.yaml"
+    cfg_path.write_text("pkg_release_root: %s\nactions:\n  hello:\n    - cmd: echo hi\n" % tmp_path)
+    trace_path = tmp_path / "trace.json"
+    profile_path = tmp_path / "profile.out"
+
+    rc = cli.main(["--trace", str(trace_path), "--profile", str(profile_path), "--config", str(cfg_path), "actions"])
+
+    assert rc == 0
+    names = [e["name"] for e in json.loads(trace_path.read_text())["traceEvents"] if e["ph"] == "X"]
+    assert "config" in names and names[-1] == "command"
+    assert pstats.Stats(str(profile_path)).total_calls > 0
+
+
+def test_cli_profile_alone_does_not_trace(tmp_path, monkeypatch):
+    monkeypatch.setenv("PKGMGR_NO_CONFIG_CACHE", "1")
+    cli = import_module("pkgmgr.cli")
+    cfg_path = tmp_path / "pkgmgr.yaml"
+    cfg_path.write_text("pkg_release_root: %s\nactions:\n  hello:\n    - cmd: echo hi\n" % tmp_path)
+    entered = []
+    monkeypatch.setattr(metrics, "tracing", lambda: entered.append(True))
+
+    rc = cli.main(["--profile", str(tmp_path / "profile.out"), "--config", str(cfg_path), "actions"])
+
+    assert rc == 0
+    assert entered == []
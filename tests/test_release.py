@@ -1,4 +1,3 @@
-import json
 import tarfile
 import os
 import sys
@@ -14,9 +13,11 @@ if str(ROOT) not in sys.path:
 config = import_module("pkgmgr.config")
 release = import_module("pkgmgr.release")
 snapshot = import_module("pkgmgr.snapshot")
+updates = import_module("pkgmgr.updates")
 reload(config)
 reload(release)
 reload(snapshot)
+reload(updates)
 
 
 def _setup_state_dir(monkeypatch, base_dir):
@@ -89,7 +90,7 @@ def test_update_pkg_first_release_includes_all_files(monkeypatch):
         cfg = {"pkg_release_root": str(pkg_root)}
 
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
 
         bundles = data["release"]
         assert len(bundles) == 1
@@ -100,6 +101,61 @@ def test_update_pkg_first_release_includes_all_files(monkeypatch):
         assert (release_dir / "b.txt").exists()
 
 
+def test_update_pkg_records_release_cksums(monkeypatch):
+    checksums = import_module("pkgmgr.collectors.checksums")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        _setup_state_dir(monkeypatch, base)
+        pkg_root = base / "pkgs"
+        pkg_id = "20240113"
+        pkg_dir = pkg_root / pkg_id
+        (pkg_dir / "src").mkdir(parents=True)
+        (pkg_dir / "src" / "a.txt").write_text("alpha")
+
+        _write_pkg_yaml(str(pkg_dir), pkg_id, ["src"])
+        out_path = release.update_pkg({"pkg_release_root": str(pkg_root)}, pkg_id)
+        sums = updates.open_update(out_path).checksums()
+
+        path = str(pkg_dir / "src" / "a.txt")
+        entry = sums["release_cksums"][path]
+        assert (entry["cksum"], entry["size"]) == checksums.posix_cksum_of_file(path)
+        assert sums["release_files"][path] == checksums.sha256_of_file(path)
+        assert checksums.stat_matches(path, entry)
+        os.utime(path, ns=(entry["mtime_ns"] + 10 ** 9, entry["mtime_ns"] + 10 ** 9))
+        assert not checksums.stat_matches(path, entry)
+
+
+def test_update_pkg_records_phase_metrics(monkeypatch):
+    summary = import_module("pkgmgr.summary")
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        _setup_state_dir(monkeypatch, base)
+        pkg_root = base / "pkgs"
+        pkg_id = "20240114"
+        pkg_dir = pkg_root / pkg_id
+        (pkg_dir / "src").mkdir(parents=True)
+        (pkg_dir / "src" / "a.txt").write_text("alpha")
+        (pkg_dir / "src" / "b.txt").write_text("bravo")
+
+        _write_pkg_yaml(str(pkg_dir), pkg_id, ["src"])
+        cfg = {"pkg_release_root": str(pkg_root)}
+        out_path = release.update_pkg(cfg, pkg_id)
+        recorded = updates.open_update(out_path).metrics()
+
+        assert {"config", "git", "inventory", "release", "hash", "copy"} <= set(recorded["phases"])
+        assert recorded["counters"]["copy.files"] == 2
+        assert recorded["counters"]["copy.bytes"] == 10
+        assert recorded["counters"]["inventory.files"] == 2
+        # release planning hashes the sources once, the record hashes them again
+        assert recorded["counters"]["hash.files"] == 4
+
+        release.update_pkg(cfg, pkg_id)
+        aggregate = summary.load_fragment(pkg_id)["metrics"]
+        assert aggregate["runs"] == 2
+        assert "write" in aggregate["last"]["phases"]
+        assert set(recorded["phases"]) <= set(aggregate["mean_phases"])
+
+
 def test_update_pkg_skips_release_when_no_changes(monkeypatch):
     with tempfile.TemporaryDirectory() as tmp:
         base = Path(tmp)
@@ -118,7 +174,7 @@ def test_update_pkg_skips_release_when_no_changes(monkeypatch):
 
         release.update_pkg(cfg, pkg_id)
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
 
         assert data["release"] == []
         release_root = pkg_dir / "release" / "src"
@@ -149,7 +205,7 @@ def test_update_pkg_includes_new_and_modified_files(monkeypatch):
         (src_dir / "c.txt").write_text("charlie")
 
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
 
         bundles = data["release"]
         assert len(bundles) == 1
@@ -192,7 +248,7 @@ def test_update_pkg_reuse_active_keeps_unchanged_files(monkeypatch):
         assert (release_dir / "c.txt").exists()
 
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
         assert data["release"] == []
         assert (release_dir / "a.txt").exists()
         assert (release_dir / "b.txt").exists()
@@ -219,24 +275,9 @@ def test_update_pkg_remove_only_keeps_other_files(monkeypatch):
 
         release.update_pkg(cfg, pkg_id)
 
-
-def test_run_actions_exports_pkgmgr_config_env(tmp_path):
-    capture_path = tmp_path / "capture.txt"
-    code = (
-        "import os, pathlib; "
-        "pathlib.Path(r'%s').write_text(os.getenv('PKGMGR_CONFIG', ''))"
-        % capture_path
-    )
-    cmd = "%s -c %s" % (sys.executable, shlex.quote(code))
-    cfg = {"actions": {"capture": [{"cmd": cmd}]}}
-
-    release.run_actions(cfg, ["capture"], config_path="/tmp/pkgmgr.yaml")
-
-    assert capture_path.read_text() == "/tmp/pkgmgr.yaml"
-
         (src_dir / "b.txt").unlink()
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
 
         assert len(data["release"]) == 1
         bundle = data["release"][0]
@@ -251,6 +292,21 @@ def test_run_actions_exports_pkgmgr_config_env(tmp_path):
         assert (release_dir / "c.txt").exists()
 
 
+def test_run_actions_exports_pkgmgr_config_env(tmp_path):
+    capture_path = tmp_path / "capture.txt"
+    code = (
+        "import os, pathlib; "
+        "pathlib.Path(r'%s').write_text(os.getenv('PKGMGR_CONFIG', ''))"
+        % capture_path
+    )
+    cmd = "%s -c %s" % (sys.executable, shlex.quote(code))
+    cfg = {"actions": {"capture": [{"cmd": cmd}]}}
+
+    release.run_actions(cfg, ["capture"], config_path="/tmp/pkgmgr.yaml")
+
+    assert capture_path.read_text() == "/tmp/pkgmgr.yaml"
+
+
 def test_update_pkg_remove_only_then_no_changes(monkeypatch):
     with tempfile.TemporaryDirectory() as tmp:
         base = Path(tmp)
@@ -274,7 +330,7 @@ def test_update_pkg_remove_only_then_no_changes(monkeypatch):
         release.update_pkg(cfg, pkg_id)
 
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
         assert data["release"] == []
 
         release_root = pkg_dir / "release" / "src"
@@ -337,7 +393,7 @@ def test_update_pkg_reuses_active_release_version(monkeypatch):
 
         (src_dir / "a.txt").write_text("alpha2")
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
         release_dir = Path(data["release"][0]["release_dir"])
         assert release_dir.name == "release.v0.0.1"
         release_root = pkg_dir / "release" / "src"
@@ -412,6 +468,79 @@ def test_update_pkg_release_finalizes_and_advances_version(monkeypatch):
 
         (src_dir / "b.txt").write_text("bravo")
         out_path = release.update_pkg(cfg, pkg_id)
-        data = json.loads(Path(out_path).read_text())
+        data = updates.load_update(out_path)
         release_dir = Path(data["release"][0]["release_dir"])
         assert release_dir.name == "release.v0.0.2"
+
+
+def _write_plugin(tmp_path, name, body):
+    (tmp_path / ("%s.py" % name)).write_text(body)
+    sys.modules.pop(name, None)
+
+
+def test_run_actions_module_entry_runs_in_process_with_context(tmp_path, monkeypatch):
+    _write_plugin(
+        tmp_path,
+        "inproc_plugin",
+        "import os\n"
+        "CALLS = []\n"
+        "def main(argv=None, context=None):\n"
+        "    CALLS.append((list(argv), context['cfg']['marker'], context['pkg_id'],\n"
+        "                  os.environ.get('PKGMGR_CONFIG'), os.environ.get('PLUGIN_ENV'), os.getcwd()))\n"
+        "    return 0\n",
+    )
+    work = tmp_path / "work"
+    work.mkdir()
+    monkeypatch.delenv("PLUGIN_ENV", raising=False)
+    cfg = {
+        "marker": "loaded-once",
+        "actions": {
+            "inproc": [
+                {
+                    "module": "inproc_plugin",
+                    "path": str(tmp_path),
+                    "cwd": str(work),
+                    "args": ["--pkg-id", "{pkg_id}"],
+                    "env": {"PLUGIN_ENV": "on"},
+                }
+            ]
+        },
+    }
+    cwd_before = os.getcwd()
+
+    results = release.run_actions(
+        cfg, ["inproc"], extra_args=["--x"], config_path="/tmp/pkgmgr.yaml", context={"pkg_id": "P1"}
+    )
+
+    plugin = sys.modules["inproc_plugin"]
+    assert results == [{"name": "inproc", "status": "ok", "rc": 0}]
+    assert plugin.CALLS == [
+        (["--pkg-id", "P1", "--x"], "loaded-once", "P1", "/tmp/pkgmgr.yaml", "on", os.path.realpath(str(work)))
+    ]
+    assert os.getcwd() == cwd_before
+    assert "PLUGIN_ENV" not in os.environ
+
+
+def test_run_actions_module_entry_reports_failures(tmp_path):
+    _write_plugin(
+        tmp_path,
+        "failing_plugin",
+        "import sys\n"
+        "def main(argv=None):\n"
+        "    if argv == ['exit']:\n"
+        "        sys.exit(3)\n"
+        "    raise ValueError('boom')\n",
+    )
+    cfg = {
+        "actions": {
+            "fail": [
+                {"module": "failing_plugin", "path": str(tmp_path), "args": "exit"},
+                {"module": "failing_plugin", "path": str(tmp_path)},
+            ]
+        }
+    }
+
+    results = release.run_actions(cfg, ["fail"])
+
+    assert [r["rc"] for r in results] == [3, 1]
+    assert [r["status"] for r in results] == ["failed", "failed"]
@@ -0,0 +1,157 @@
+import json
+import os
+import sys
+import tempfile
+import time
+from importlib import import_module, reload
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+config = import_module("pkgmgr.config")
+updates = import_module("pkgmgr.updates")
+points = import_module("pkgmgr.points")
+retention = import_module("pkgmgr.retention")
+reload(config)
+reload(updates)
+reload(points)
+reload(retention)
+
+
+def _setup_state_dir(monkeypatch, base_dir):
+    state_dir = Path(base_dir) / "state"
+    monkeypatch.setattr(config, "DEFAULT_STATE_DIR", str(state_dir))
+    return state_dir
+
+
+def _gc_cfg(updates_policy=None, points_policy=None, history_policy=None, max_delete=None):
+    empty = {"keep_last": None, "keep_daily": None, "keep_weekly": None}
+    return {
+        "gc": {
+            "updates": dict(empty, **(updates_policy or {})),
+            "points": dict(empty, **(points_policy or {})),
+            "history": dict(empty, **(history_policy or {})),
+            "max_delete": max_delete,
+        }
+    }
+
+
+def test_select_keep_last_daily_weekly():
+    runs = [
+        "20240101T090000",
+        "20240101T180000",
+        "20240102T090000",
+        "20240108T090000",
+        "20240109T090000",
+        "20240109T120000",
+    ]
+
+    assert retention.select_keep(runs) == set(runs)
+    assert retention.select_keep(runs, keep_last=2) == {"20240109T120000", "20240109T090000"}
+    assert retention.select_keep(runs, keep_daily=3) == {
+        "20240109T120000",
+        "20240108T090000",
+        "20240102T090000",
+    }
+    assert retention.select_keep(runs, keep_weekly=2) == {"20240109T120000", "20240102T090000"}
+
+
+def test_gc_prunes_updates_but_keeps_latest_and_index(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        stamps = ["202401%02dT000000" % day for day in range(1, 6)]
+        for ts in stamps:
+            updates.write_update("P", ts, {"run_at": ts, "git": {"commits": [{"hash": ts}]}})
+
+        report = retention.run_gc(_gc_cfg(updates_policy={"keep_last": 2}))
+
+        assert report["pkgs"]["P"]["updates"]["removed"] == 3
+        assert report["bytes"] > 0
+        assert [run_at for run_at, _ in updates.list_runs("P")] == stamps[-2:]
+        remaining = sorted(os.listdir(updates.updates_dir("P")))
+        assert "update-20240101T000000.json" not in remaining
+        assert "update-20240101T000000" not in remaining
+        assert updates.latest_update("P")[1] == stamps[-1]
+
+
+def test_gc_keeps_points_referenced_by_release_history(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        state_dir = _setup_state_dir(monkeypatch, tmp)
+        root = state_dir / "pkg" / "P" / "points"
+        for point_id in ("20240101T000000", "20240102T000000", "20240103T000000"):
+            (root / point_id).mkdir(parents=True)
+            (root / point_id / "meta.json").write_text("{}")
+        history = state_dir / "pkg" / "P" / "release"
+        history.mkdir(parents=True)
+        (history / "release-20240101T010000.json").write_text(json.dumps({"point": "20240101T000000"}))
+
+        retention.run_gc(_gc_cfg(points_policy={"keep_last": 1}))
+
+        assert points.list_point_ids("P") == ["20240101T000000", "20240103T000000"]
+
+
+def test_gc_keeps_points_from_oldest_legacy_release_history(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        state_dir = _setup_state_dir(monkeypatch, tmp)
+        root = state_dir / "pkg" / "P" / "points"
+        stamps = ("20240101T000000", "20240102T000000", "20240103T000000", "20240104T000000", "20240105T000000")
+        for point_id in stamps:
+            (root / point_id).mkdir(parents=True)
+            (root / point_id / "meta.json").write_text("{}")
+        history = state_dir / "pkg" / "P" / "release"
+        history.mkdir(parents=True)
+        # written before release history recorded its point
+        (history / "release-20240102T120000.json").write_text(json.dumps({"run_at": "20240102T120000"}))
+        (history / "release-20240104T120000.json").write_text(json.dumps({"run_at": "20240104T120000"}))
+
+        retention.run_gc(_gc_cfg(points_policy={"keep_last": 1}))
+
+        assert points.list_point_ids("P") == list(stamps[1:])
+
+
+def test_gc_respects_max_delete_and_dry_run(monkeypatch, capsys):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        stamps = ["202401%02dT000000" % day for day in range(1, 7)]
+        for ts in stamps:
+            updates.write_update("P", ts, {"run_at": ts})
+        cfg = _gc_cfg(updates_policy={"keep_last": 1}, max_delete=2)
+
+        preview = retention.run_gc(cfg, dry_run=True)
+        assert preview["removed"] == 2 and preview["pending"] == 3
+        assert len(updates.list_runs("P")) == 6
+
+        first = retention.run_gc(cfg)
+        assert first["removed"] == 2 and first["pending"] == 3
+        assert "run gc again" in capsys.readouterr().out
+        assert [run_at for run_at, _ in updates.list_runs("P")] == stamps[2:]
+
+        retention.run_gc(cfg, max_delete=10)
+        assert [run_at for run_at, _ in updates.list_runs("P")] == stamps[-1:]
+
+
+def test_gc_prunes_stale_source_review_cache(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        monkeypatch.setattr(config, "DEFAULT_CACHE_DIR", os.path.join(tmp, "cache"))
+        shard = Path(tmp) / "cache" / "source_review" / "ab"
+        shard.mkdir(parents=True)
+        old = shard / "ab01.diff"
+        fresh = shard / "ab02.diff"
+        old.write_text("old")
+        fresh.write_text("fresh")
+        month_ago = time.time() - 31 * 86400
+        os.utime(str(old), (month_ago, month_ago))
+        cfg = _gc_cfg()
+        cfg["gc"]["cache_max_age_days"] = 30
+
+        report = retention.run_gc(cfg)
+
+        assert report["cache"]["removed"] == 1
+        assert not old.exists() and fresh.exists()
+        # a gc limited to some pkgs leaves the shared cache alone
+        os.utime(str(fresh), (month_ago, month_ago))
+        retention.run_gc(cfg, pkg_ids=["P"])
+        assert fresh.exists()
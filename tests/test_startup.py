@@ -0,0 +1,57 @@
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+# modules the short commands must not pay for
+HEAVY = ("yaml", "tarfile", "subprocess", "pkgmgr.release", "pkgmgr.snapshot", "pkgmgr.watch")
+# generous wall budget for importing pkgmgr.cli (microseconds, cumulative -X importtime)
+CLI_IMPORT_BUDGET_US = 500000
+
+
+def _importtime(argv):
+    code = "import pkgmgr.cli as cli\ntry:\n    cli.main(%r)\nexcept SystemExit:\n    pass\n" % (list(argv),)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=str(ROOT),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+    )
+    imported = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line.split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        imported[parts[2].strip()] = int(parts[1].strip())
+    return proc, imported
+
+
+def test_version_does_not_import_heavy_modules():
+    proc, imported = _importtime(["--version"])
+
+    assert "pkgmgr.cli" in imported, proc.stderr
+    assert [name for name in HEAVY if name in imported] == []
+    assert imported["pkgmgr.cli"] < CLI_IMPORT_BUDGET_US
+
+
+def test_help_does_not_import_heavy_modules():
+    _, imported = _importtime(["--help"])
+
+    assert [name for name in HEAVY if name in imported] == []
+
+
+def test_actions_listing_only_loads_config():
+    with tempfile.TemporaryDirectory() as tmp:
+        cfg_path = Path(tmp) / "pkgmgr.yaml"
+        cfg_path.write_text("pkg_release_root: %s\nactions:\n  hello:\n    - cmd: echo hi\n" % tmp)
+
+        proc, imported = _importtime(["--config", str(cfg_path), "actions"])
+
+        assert "hello" in proc.stdout, proc.stderr
+        assert "yaml" in imported
+        assert [name for name in HEAVY if name != "yaml" and name in imported] == []
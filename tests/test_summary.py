@@ -0,0 +1,115 @@
+import json
+import os
+import sys
+import tempfile
+from importlib import import_module, reload
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+config = import_module("pkgmgr.config")
+summary = import_module("pkgmgr.summary")
+release = import_module("pkgmgr.release")
+snapshot = import_module("pkgmgr.snapshot")
+reload(config)
+reload(summary)
+reload(release)
+reload(snapshot)
+
+
+def _setup_state_dir(monkeypatch, base_dir):
+    state_dir = Path(base_dir) / "state"
+    monkeypatch.setattr(config, "DEFAULT_STATE_DIR", str(state_dir))
+    monkeypatch.setattr(snapshot, "STATE_DIR", str(state_dir))
+    return state_dir
+
+
+def _make_pkg(pkg_root, pkg_id):
+    pkg_dir = pkg_root / pkg_id
+    src_dir = pkg_dir / "src"
+    src_dir.mkdir(parents=True)
+    (src_dir / "a.txt").write_text("alpha")
+    (src_dir / "b.txt").write_text("bravo")
+    config.write_pkg_template(
+        os.path.join(str(pkg_dir), "pkg.yaml"),
+        pkg_id=pkg_id,
+        pkg_root=str(pkg_dir),
+        include_releases=["src"],
+        git_cfg={"keywords": []},
+        collectors_enabled=["checksums"],
+    )
+    return pkg_dir
+
+
+def test_update_pkg_records_fragment_with_counts(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        _setup_state_dir(monkeypatch, base)
+        pkg_root = base / "pkgs"
+        _make_pkg(pkg_root, "P1")
+        cfg = {"pkg_release_root": str(pkg_root)}
+
+        out_path = release.update_pkg(cfg, "P1")
+
+        fragment = summary.load_fragment("P1")
+        assert fragment["last_update_id"] == os.path.basename(out_path)
+        assert fragment["artifacts"]["release_files"] == 2
+        assert fragment["release"]["bundle_count"] == 1
+        assert fragment["release"]["roots"] == ["src"]
+
+
+def test_close_pkg_keeps_update_fields_without_rereading_updates(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        _setup_state_dir(monkeypatch, base)
+        pkg_root = base / "pkgs"
+        _make_pkg(pkg_root, "P2")
+        cfg = {"pkg_release_root": str(pkg_root)}
+        release.update_pkg(cfg, "P2")
+
+        def _fail(_pkg_id):
+            raise AssertionError("close-pkg must not scan update history")
+
+        monkeypatch.setattr(release, "_find_latest_update", _fail)
+        release.close_pkg(cfg, "P2")
+
+        entry = summary.load_fragment("P2")
+        assert entry["status"] == "closed"
+        assert entry["artifacts"]["release_files"] == 2
+
+
+def test_summary_log_is_merged_lazily_and_compacted(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        state_dir = _setup_state_dir(monkeypatch, base)
+        summary.record({"pkg_id": "A", "status": "open", "updated_at": "2024-01-01T00:00:00"})
+        summary.record({"pkg_id": "B", "status": "open", "updated_at": "2024-01-02T00:00:00"})
+        summary.record({"pkg_id": "A", "status": "closed", "updated_at": "2024-01-03T00:00:00"})
+
+        # first record creates pkg-summary.json; later entries wait in the log
+        on_disk = json.loads((state_dir / "pkg-summary.json").read_text())
+        assert [p["pkg_id"] for p in on_disk["pkgs"]] == ["A"]
+        merged = summary.load_summary()
+        assert [p["pkg_id"] for p in merged["pkgs"]] == ["B", "A"]
+        assert merged["pkgs"][1]["status"] == "closed"
+
+        summary.compact()
+
+        assert not (state_dir / "pkg-summary.log").exists()
+        on_disk = json.loads((state_dir / "pkg-summary.json").read_text())
+        assert on_disk["pkgs"] == merged["pkgs"]
+
+
+def test_summary_compacts_when_log_exceeds_threshold(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        base = Path(tmp)
+        state_dir = _setup_state_dir(monkeypatch, base)
+        monkeypatch.setattr(summary, "COMPACT_LOG_BYTES", 1)
+        summary.record({"pkg_id": "A", "status": "open"})
+        summary.record({"pkg_id": "B", "status": "open"})
+
+        assert not (state_dir / "pkg-summary.log").exists()
+        on_disk = json.loads((state_dir / "pkg-summary.json").read_text())
+        assert sorted(p["pkg_id"] for p in on_disk["pkgs"]) == ["A", "B"]
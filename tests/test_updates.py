@@ -0,0 +1,156 @@
+import json
+import os
+import sys
+import tempfile
+from importlib import import_module, reload
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+config = import_module("pkgmgr.config")
+updates = import_module("pkgmgr.updates")
+reload(config)
+reload(updates)
+
+
+def _setup_state_dir(monkeypatch, base_dir):
+    state_dir = Path(base_dir) / "state"
+    monkeypatch.setattr(config, "DEFAULT_STATE_DIR", str(state_dir))
+    return state_dir
+
+
+def test_latest_update_uses_pointer_without_listing(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        for ts in ("20240101T000000", "20240102T000000", "20240103T000000"):
+            updates.write_update("P", ts, {"run_at": ts})
+
+        def _no_listdir(_path):
+            raise AssertionError("latest lookup must not list updates/")
+
+        monkeypatch.setattr(updates.os, "listdir", _no_listdir)
+        path, run_at = updates.latest_update("P")
+
+        assert run_at == "20240103T000000"
+        assert os.path.basename(path) == "update-20240103T000000.json"
+
+
+def test_recent_updates_returns_newest_first(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        stamps = ["202401%02dT000000" % day for day in range(1, 11)]
+        for ts in stamps:
+            updates.write_update("P", ts, {"run_at": ts})
+        updates.write_update("P", stamps[-1], {"run_at": stamps[-1], "again": True})
+
+        recent = updates.recent_updates("P", 3)
+
+        assert [run_at for _, run_at in recent] == stamps[-1:-4:-1]
+        assert [run_at for run_at, _ in updates.list_runs("P")] == stamps
+
+
+def test_latest_update_rebuilds_pointer_for_legacy_dirs(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        state_dir = _setup_state_dir(monkeypatch, tmp)
+        updates_dir = state_dir / "pkg" / "P" / "updates"
+        updates_dir.mkdir(parents=True)
+        for ts in ("20240105T000000", "20231231T235959"):
+            (updates_dir / ("update-%s.json" % ts)).write_text("{}")
+
+        path, run_at = updates.latest_update("P")
+
+        assert run_at == "20240105T000000"
+        assert json.loads((updates_dir / "latest.json").read_text())["name"] == os.path.basename(path)
+        assert (updates_dir / "index.txt").read_text().splitlines() == [
+            "20231231T235959\tupdate-20231231T235959.json",
+            "20240105T000000\tupdate-20240105T000000.json",
+        ]
+
+
+def test_latest_update_missing_pkg_returns_none(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+
+        assert updates.latest_update("nope") == (None, None)
+        assert updates.recent_updates("nope", 5) == []
+
+
+def _sample_record():
+    return {
+        "pkg_id": "P",
+        "run_at": "20240101T000000",
+        "git": {
+            "keywords": ["KW"],
+            "repo_url": "https://example/repo",
+            "commits": [{"hash": "abc", "message": "long message", "files": ["a.c"]}],
+        },
+        "checksums": {"git_files": {"/r/a.c": "11"}, "release_files": {"/p/x": "22", "/p/y": "33"}},
+        "release": [
+            {
+                "root": "SYS",
+                "release_name": "release.v0.0.1",
+                "files": ["x", "y"],
+                "copied": ["x", "y"],
+                "added": ["x", "y"],
+                "updated": [],
+                "removed": [],
+                "skipped": [],
+                "note": "note text",
+            }
+        ],
+    }
+
+
+def test_write_update_keeps_header_compact_and_round_trips(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        data = _sample_record()
+
+        path = updates.write_update("P", data["run_at"], data)
+
+        header = json.loads(Path(path).read_text())
+        assert "commits" not in header["git"]
+        assert "checksums" not in header
+        assert header["git"]["commit_ids"] == ["abc"]
+        assert header["counts"] == {"commits": 1, "bundles": 1, "git_files": 1, "release_files": 2}
+        assert header["release"][0]["counts"]["files"] == 2
+        assert "files" not in header["release"][0]
+        assert updates.load_update(path) == data
+
+
+def test_update_record_loads_sections_on_demand(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        _setup_state_dir(monkeypatch, tmp)
+        data = _sample_record()
+        path = updates.write_update("P", data["run_at"], data)
+        reads = []
+        real_read = updates._read_json
+        monkeypatch.setattr(updates, "_read_json", lambda p: reads.append(os.path.basename(p)) or real_read(p))
+
+        record = updates.open_latest("P")
+        assert record.counts()["release_files"] == 2
+        assert reads == [os.path.basename(path)]
+
+        assert record.commits()[0]["message"] == "long message"
+        record.commits()
+        assert reads == [os.path.basename(path), "commits.json"]
+
+
+def test_update_record_reads_legacy_single_file(monkeypatch):
+    with tempfile.TemporaryDirectory() as tmp:
+        state_dir = _setup_state_dir(monkeypatch, tmp)
+        data = _sample_record()
+        updates_dir = state_dir / "pkg" / "P" / "updates"
+        updates_dir.mkdir(parents=True)
+        legacy_path = updates_dir / "update-20240101T000000.json"
+        legacy_path.write_text(json.dumps(data))
+
+        record = updates.open_latest("P")
+
+        assert record.legacy
+        assert record.counts()["release_files"] == 2
+        assert record.bundles()[0]["counts"]["copied"] == 2
+        assert record.checksums() == data["checksums"]
+        assert record.to_dict() == data